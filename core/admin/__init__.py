@@ -4,6 +4,8 @@ from .user_admin import UserAdmin
 from .region_admin import RegionAdmin
 from .zone_admin import ZoneAdmin
 from .systemlog_admin import SystemLogAdmin
+from .gsheets_outbox_admin import GoogleSheetsOutboxAdmin
+from .scheduler_admin import ScheduledJobRunAdmin
 
 
 __all__ = [
@@ -12,5 +14,7 @@ __all__ = [
     'FuelRecordAdmin',
     'UserAdmin',
     'SystemLogAdmin',
-    'ZoneAdmin'
+    'ZoneAdmin',
+    'GoogleSheetsOutboxAdmin',
+    'ScheduledJobRunAdmin',
 ]
\ No newline at end of file
@@ -5,6 +5,7 @@ from django.utils import timezone
 from django.utils.html import format_html
 
 from core.models import Car
+from core.refuel_bot.utils.validate_state_plate import is_valid_plate, normalize_plate_input
 from core.admin.actions import export_action
 from core.services.car_service import CarService
 from core.services.export_service import ExportService
@@ -175,7 +176,7 @@ class CarAdmin(admin.ModelAdmin):
         if obj.region:
             return format_html(
                 '<a href="{}?id__exact={}"><strong>{}</a>',
-                f"/admin/core/region/",
+                "/admin/core/region/",
                 obj.region.id,
                 obj.region.name
             )
@@ -235,7 +236,8 @@ class CarAdmin(admin.ModelAdmin):
         
         archived_count = CarService.bulk_archive_cars(
             car_ids,
-            reason=f"Архивация из админ-панели пользователем {request.user.username}"
+            reason=f"Архивация из админ-панели пользователем {request.user.username}",
+            user=request.user,
         )
         
         self.message_user(
@@ -247,11 +249,8 @@ class CarAdmin(admin.ModelAdmin):
     @admin.action(description="🔄 Восстановить")    
     def activate_selected(self, request, queryset):
         """Активировать выбранные автомобили"""
-        activated_count = 0
-        for car in queryset:
-            if car.is_archived:
-                car.restore_from_archive()
-                activated_count += 1
+        car_ids = list(queryset.values_list('id', flat=True))
+        activated_count = CarService.bulk_restore_cars(car_ids, user=request.user)
         
         self.message_user(
             request,
@@ -286,7 +285,8 @@ class CarAdmin(admin.ModelAdmin):
             
             archived_count = CarService.bulk_archive_cars(
                 car_ids,
-                reason="Автоматическая архивация старых автомобилей"
+                reason="Автоматическая архивация старых автомобилей",
+                user=request.user,
             )
             
             messages.success(
@@ -364,6 +364,14 @@ class CarAdmin(admin.ModelAdmin):
         return ExportService.export_cars_data('xlsx')    
 
     # Переопределяем queryset для исключения архивных по умолчанию
+    def get_search_results(self, request, queryset, search_term):
+        # Полный госномер в любом написании — точный поиск по индексу normalized_plate
+        # вместо icontains по всем полям
+        plate = normalize_plate_input(search_term)
+        if is_valid_plate(plate):
+            return queryset.filter(normalized_plate=plate), False
+        return super().get_search_results(request, queryset, search_term)
+
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         # Показываем архивные только если явно отфильтровано
@@ -177,7 +177,9 @@ class FuelRecordAdmin(admin.ModelAdmin):
     # Кастомные действия
     @admin.action(description="✅ Подтвердить выбранные")
     def approve_selected(self, request, queryset):
-        updated = queryset.update(approved=True)
+        # update() не выставляет auto_now: без updated_at подтверждение не попадёт
+        # в инкрементальную выгрузку Google Sheets
+        updated = queryset.update(approved=True, updated_at=timezone.now())
         self.message_user(
             request, 
             f"Подтверждено {updated} записей о заправках",
@@ -397,10 +399,7 @@ class FuelRecordAdmin(admin.ModelAdmin):
             
             if result['success']:
                 if result['synced_count'] == result['total_count']:
-                    messages.success(
-                        request, 
-                        f'✅ Успешно синхронизировано {result["synced_count"]} записей с Google Sheets'
-                    )
+                    messages.success(request, f'✅ {result["message"]}')
                 else:
                     messages.warning(
                         request,
@@ -0,0 +1,31 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from core.models import GoogleSheetsOutbox
+
+
+@admin.register(GoogleSheetsOutbox)
+class GoogleSheetsOutboxAdmin(admin.ModelAdmin):
+    list_display = ("id", "fuel_record", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status",)
+    readonly_fields = (
+        "fuel_record", "status", "attempts", "next_attempt_at",
+        "last_error", "created_at", "sent_at",
+    )
+    list_per_page = 50
+    actions = ["retry"]
+
+    @admin.action(description="Повторить выгрузку")
+    def retry(self, request, queryset):
+        updated = queryset.exclude(status=GoogleSheetsOutbox.Status.SENT).update(
+            status=GoogleSheetsOutbox.Status.PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+        )
+        self.message_user(request, f"Поставлено в очередь повторно: {updated}")
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("fuel_record__car")
@@ -0,0 +1,22 @@
+from django.contrib import admin
+
+from core.models import ScheduledJobRun
+
+
+@admin.register(ScheduledJobRun)
+class ScheduledJobRunAdmin(admin.ModelAdmin):
+    list_display = ("started_at", "job_name", "status", "duration", "hostname")
+    list_filter = ("job_name", "status")
+    readonly_fields = (
+        "job_name", "status", "started_at", "finished_at", "duration",
+        "phases", "result", "error", "hostname",
+    )
+    list_per_page = 50
+    date_hierarchy = "started_at"
+
+    # История пишется только планировщиком
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -1,86 +1,279 @@
 import aiohttp
-import logging
+import asyncio
+import codecs
+import hashlib
 import json
-import re
+import logging
+import random
 
 from asgiref.sync import sync_to_async
+from contextlib import aclosing
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, List, Optional, Dict, Any
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
 
 from core.models import Car, Region
+from core.services.car_service import CarService
+from core.utils.json_stream import JsonArrayStreamParser
+from core.refuel_bot.utils.car_index import invalidate_car_index
+from core.refuel_bot.utils.validate_state_plate import normalize_plate_input
 
 
 logger = logging.getLogger(__name__)
 
+# Поля автомобиля, которые сверяются с 1С (регион сверяется отдельно)
+SYNC_FIELDS = (
+    "state_number", "model", "vin", "manufacture_year",
+    "owner_inn", "department", "status", "is_active",
+)
+STRING_SYNC_FIELDS = {"state_number", "model", "vin", "owner_inn", "department", "status"}
+# Размер пакета bulk_create/bulk_update
+SYNC_BATCH_SIZE = settings.ELEMENT_API.get("SYNC_BATCH_SIZE", 500)
+# Версия отпечатка: увеличить при изменении маппинга, чтобы все автомобили сверились заново
+FINGERPRINT_VERSION = 1
+# Размер куска при чтении ответа 1С
+STREAM_CHUNK_SIZE = 64 * 1024
+# Сколько ждать очередной кусок ответа выгрузки, секунд. Общего лимита нет:
+# пакеты пишутся в БД между чтениями, и их время не должно обрывать выгрузку
+REQUEST_TIMEOUT = settings.ELEMENT_API.get("REQUEST_TIMEOUT", 60)
+# Таймаут лёгкой проверки доступности, секунд
+PROBE_TIMEOUT = settings.ELEMENT_API.get("PROBE_TIMEOUT", 15)
+# Госномер, которого заведомо нет в 1С: проверка доступности получает пустой список, а не весь парк
+PROBE_STATE_NUMBER = "000PROBE000"
+# Валидаторы ответа (ETag / Last-Modified) для условных запросов: element_api_validators:<hash>
+VALIDATORS_CACHE_KEY_PREFIX = "element_api_validators:"
+# Сколько хранить валидаторы, секунд: после истечения выгрузка скачивается заново безусловно
+VALIDATORS_TTL = settings.ELEMENT_API.get("CONDITIONAL_TTL_HOURS", 6) * 60 * 60
+# Пауза перед повтором выгрузки по ИНН: 2 с, 4 с, 8 с ... но не больше минуты
+SHARD_RETRY_BASE_DELAY = 2
+SHARD_RETRY_MAX_DELAY = 60
+# ИНН владельцев из последней полной выгрузки 1С — список для выгрузки по частям
+SHARD_INNS_CACHE_KEY = "element_api_shard_inns"
+# Сколько доверять этому списку, секунд: после истечения весь парк выгружается одним запросом,
+# чтобы увидеть новых владельцев и автомобили, сменившие ИНН
+SHARD_INNS_TTL = settings.ELEMENT_API.get("SHARD_FULL_SYNC_HOURS", 24) * 60 * 60
+
 
 class ElementCarClient:
     """Асинхронный клиент для синхронизации данных автомобилей из 1С:Элемент."""
 
-    def __init__(self):
-        self.base_url = settings.ELEMENT_API.get("URL", None)
-        self.auth_user = settings.ELEMENT_API.get("USER", None)
-        self.auth_password = settings.ELEMENT_API.get("PASSWORD", None)
+    def __init__(self, base_url: Optional[str] = None, user: Optional[str] = None, password: Optional[str] = None):
+        # Параметры по умолчанию из ELEMENT_API; явные — для тестового сервера и замеров
+        self.base_url = base_url or settings.ELEMENT_API.get("URL", None)
+        self.auth_user = user or settings.ELEMENT_API.get("USER", None)
+        self.auth_password = password or settings.ELEMENT_API.get("PASSWORD", None)
         self.last_sync: Optional[datetime] = None
+        self.last_fetch_complete = False
         self.session: Optional[aiohttp.ClientSession] = None
 
         if not all([self.base_url, self.auth_user, self.auth_password]):
             raise RuntimeError("Element API: не заданы URL, пользователь или пароль")
 
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        # Одно пуловое соединение на все запросы синхронизации: keep-alive,
+        # кэш DNS, лимит одновременных соединений под выгрузку по ИНН
+        connector = aiohttp.TCPConnector(
+            limit=settings.ELEMENT_API.get("CONNECTION_LIMIT", 8),
+            ttl_dns_cache=settings.ELEMENT_API.get("DNS_CACHE_TTL", 300),
+            keepalive_timeout=settings.ELEMENT_API.get("KEEPALIVE_TIMEOUT", 60),
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            auth=aiohttp.BasicAuth(self.auth_user, self.auth_password),
+            headers={"Accept": "application/json", "Accept-Encoding": "gzip, deflate"},
+        )
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         if self.session:
             await self.session.close()
 
-    async def fetch_cars(
+    async def iter_cars(
         self,
         inn: Optional[str] = None,
         vin: Optional[str] = None,
         sts: Optional[str] = None,
         num: Optional[str] = None,
-    ) -> List[Dict[str, Any]]:
-        """Получает данные о всех автомобилях из 1С:Элемент с фильтрацией."""
-        url = f"{self.base_url}/Car/v1/Get"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Потоково читает выгрузку автомобилей из 1С:Элемент и отдаёт объекты
+        по мере получения. Весь ответ в памяти не держится.
+        После завершения self.last_fetch_complete показывает, пришла ли выгрузка целиком.
+        """
         params = {}
         if inn: params["inn"] = inn
         if vin: params["vin"] = vin
         if sts: params["sts"] = sts
         if num: params["num"] = num
 
-        auth = aiohttp.BasicAuth(self.auth_user, self.auth_password)
-        timeout = aiohttp.ClientTimeout(total=60)
+        self.last_fetch_complete = False
+        outcome = {}
+        async for car in self._read_cars(params, outcome):
+            yield car
+        self.last_fetch_complete = outcome["complete"]
+
+    def _validators_key(self, params: Dict[str, str]) -> str:
+        raw = json.dumps([self.base_url, params], sort_keys=True)
+        return VALIDATORS_CACHE_KEY_PREFIX + hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
+    async def _read_cars(
+        self,
+        params: Dict[str, str],
+        outcome: Dict[str, Any],
+        conditional: bool = False,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Один запрос выгрузки. outcome["complete"] после завершения показывает,
+        пришёл ли ответ целиком (состояние не хранится в клиенте — запросы
+        по разным ИНН идут параллельно).
+
+        conditional=True — запрос с If-None-Match / If-Modified-Since от прошлой
+        выгрузки: при 304 outcome["not_modified"] = True и объекты не отдаются.
+        Валидаторы нового ответа кладутся в outcome["validators"]; сохранять
+        их (save_validators) нужно после того, как данные применены.
+        """
+        url = f"{self.base_url}/Car/v1/Get"
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=PROBE_TIMEOUT, sock_read=REQUEST_TIMEOUT)
+        outcome["complete"] = False
+        outcome["not_modified"] = False
+
+        headers = {}
+        validators_key = None
+        if conditional and VALIDATORS_TTL:
+            validators_key = self._validators_key(params)
+            validators = await cache.aget(validators_key) or {}
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+
+        parser = JsonArrayStreamParser()
+        # utf-8-sig: 1С может добавить BOM в начало ответа
+        decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        received = 0
         try:
-            async with self.session.get(url, params=params, auth=auth, timeout=timeout) as response:
+            async with self.session.get(url, params=params, headers=headers, timeout=timeout) as response:
+                if response.status == 304:
+                    logger.info(f"Выгрузка 1С {params or ''} не изменилась с прошлой синхронизации")
+                    outcome["complete"] = outcome["not_modified"] = True
+                    return
                 if response.status != 200:
                     logger.error(f"Ошибка API {response.status}: {url} с params {params}")
-                    return []
-
-                text = await response.text()
-                text = text.strip()
-
-                try:
-                    return json.loads(text)
-                except json.JSONDecodeError:
-                    # Если JSON обрезан, построчно пытаемся собрать объекты
-                    cars = []
-                    text_clean = re.sub(r"^\[|\]$", "", text).strip()
-                    for line in text_clean.splitlines():
-                        line = line.strip().rstrip(",")
-                        if line.startswith("{") and line.endswith("}"):
-                            try:
-                                cars.append(json.loads(line))
-                            except Exception:
-                                continue
-                    logger.warning(f"⚠️ JSON был некорректным, получено объектов: {len(cars)}")
-                    return cars
+                    return
+
+                async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                    for car in parser.feed(decoder.decode(chunk)):
+                        received += 1
+                        yield car
+                for car in parser.feed(decoder.decode(b"", final=True)):
+                    received += 1
+                    yield car
+
+                if validators_key and parser.complete and not parser.errors:
+                    validators = {
+                        "etag": response.headers.get("ETag", ""),
+                        "last_modified": response.headers.get("Last-Modified", ""),
+                    }
+                    if any(validators.values()):
+                        outcome.setdefault("validators", {})[validators_key] = validators
 
         except Exception as e:
-            logger.error(f"Ошибка запроса к API: {e}")
-            return []
+            logger.error(f"Ошибка запроса к API ({params}): {e!r}")
+
+        outcome["complete"] = parser.complete and not parser.errors
+        if not outcome["complete"]:
+            logger.warning(
+                f"⚠️ Выгрузка 1С {params or ''} получена не полностью или с ошибками, "
+                f"получено объектов: {received}, пропущено: {parser.errors}"
+            )
+
+    @staticmethod
+    async def save_validators(validators: Dict[str, Dict[str, str]]) -> None:
+        """Запоминает ETag / Last-Modified применённых выгрузок для следующих условных запросов."""
+        if validators and VALIDATORS_TTL:
+            await cache.aset_many(validators, timeout=VALIDATORS_TTL)
+
+    async def _fetch_shard(self, inn: str, retries: int, conditional: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Выгрузка автомобилей одного ИНН с повторами.
+        Возвращает outcome запроса с автомобилями в outcome["cars"]
+        или None, если полный ответ так и не получен.
+        """
+        for attempt in range(retries + 1):
+            outcome = {}
+            outcome["cars"] = [car async for car in self._read_cars({"inn": inn}, outcome, conditional)]
+            if outcome["complete"]:
+                return outcome
+            if attempt < retries:
+                delay = min(SHARD_RETRY_BASE_DELAY * 2 ** attempt, SHARD_RETRY_MAX_DELAY)
+                delay *= random.uniform(0.8, 1.2)
+                logger.warning(f"🔁 ИНН {inn}: повтор {attempt + 1}/{retries} через {delay:.1f} с")
+                await asyncio.sleep(delay)
+        return None
+
+    async def iter_cars_sharded(
+        self,
+        inns: List[str],
+        outcome: Dict[str, List[str]],
+        concurrency: Optional[int] = None,
+        retries: Optional[int] = None,
+        conditional: bool = False,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Выгрузка по ИНН владельцев: не более concurrency запросов одновременно
+        в одной сессии, автомобили ИНН отдаются, как только его выгрузка пришла целиком.
+        После завершения outcome["succeeded"], outcome["not_modified"] и outcome["failed"] —
+        ИНН, выгруженные полностью, не изменившиеся (304) и не выгруженные после всех повторов.
+        """
+        concurrency = concurrency or settings.ELEMENT_API.get("SHARD_CONCURRENCY", 4)
+        if retries is None:
+            retries = settings.ELEMENT_API.get("SHARD_RETRIES", 3)
+        outcome["succeeded"], outcome["not_modified"], outcome["failed"] = [], [], []
+        outcome["validators"] = {}
+
+        semaphore = asyncio.Semaphore(concurrency)
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def run_shard(inn: str) -> None:
+            try:
+                async with semaphore:
+                    shard = await self._fetch_shard(inn, retries, conditional)
+            except Exception as e:
+                logger.exception(f"Ошибка выгрузки ИНН {inn}: {e}")
+                shard = None
+            await queue.put((inn, shard))
+
+        tasks = [asyncio.create_task(run_shard(inn)) for inn in inns]
+        try:
+            for _ in tasks:
+                inn, shard = await queue.get()
+                if shard is None:
+                    outcome["failed"].append(inn)
+                    continue
+                if shard["not_modified"]:
+                    outcome["not_modified"].append(inn)
+                    continue
+                outcome["succeeded"].append(inn)
+                outcome["validators"].update(shard.get("validators", {}))
+                for car in shard["cars"]:
+                    yield car
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def fetch_cars(
+        self,
+        inn: Optional[str] = None,
+        vin: Optional[str] = None,
+        sts: Optional[str] = None,
+        num: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Получает данные о всех автомобилях из 1С:Элемент с фильтрацией."""
+        return [car async for car in self.iter_cars(inn=inn, vin=vin, sts=sts, num=num)]
 
     # --------------------- Вспомогательные методы ---------------------
     def _is_archived_car(self, car_data: Dict) -> bool:
@@ -136,10 +329,34 @@ class ElementCarClient:
             logger.exception(f"Ошибка маппинга данных для {data.get('Code', 'N/A')}: {e}")
             return None
 
+    @staticmethod
+    def _fingerprint(car_data: Dict) -> str:
+        """Отпечаток данных автомобиля из 1С (после маппинга)."""
+        payload = json.dumps(
+            [FINGERPRINT_VERSION, car_data],
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
     # --------------------- Работа с БД ---------------------
-    async def sync_with_database(self) -> Dict[str, int]:
+    async def sync_with_database(self, sharded: Optional[bool] = None, force: bool = False) -> Dict[str, int]:
+        """
+        Синхронизация справочника автомобилей с 1С.
+        sharded=True — выгрузка по ИНН владельцев параллельными запросами
+        (по умолчанию ELEMENT_API["SHARDED"]). Список ИНН берётся из настроек
+        или из последней полной выгрузки; когда он устарел, весь парк
+        выгружается одним запросом. При выгрузке по частям отсутствующие
+        автомобили архивируются, только если список ИНН задан в настройках
+        и выгружены все его ИНН; иначе автомобиль мог перейти к новому
+        владельцу, и архивацию выполнит следующая полная выгрузка.
+        Выгрузка запрашивается условно (ETag / If-Modified-Since): если 1С
+        ответил 304, данные не изменились и сверять нечего. force=True — без условий.
+        """
+        if sharded is None:
+            sharded = settings.ELEMENT_API.get("SHARDED", False)
         try:
-            external_cars = await self.fetch_cars()
             stats = {
                 "created": 0,
                 "updated": 0,
@@ -147,59 +364,107 @@ class ElementCarClient:
                 "errors": 0,
                 "regions_created": 0,
                 "regions_updated": 0,
-                "total_processed": len(external_cars),
+                "total_processed": 0,
                 "archived_skipped": 0,
                 "restored": 0,
+                "skipped": 0,
+                "failed_shards": 0,
+                "not_modified": 0,
                 "finished_at": datetime.now().isoformat(),
             }
 
-            if not external_cars:
-                logger.warning("⚠️ Нет данных для синхронизации")
-                return stats
+            # Отпечатки последней синхронизации: совпавшие автомобили не сверяются
+            fingerprints = await self._get_fingerprints()
+
+            # Выгрузка обрабатывается пакетами по мере чтения ответа;
+            # на всю синхронизацию в памяти остаются только коды автомобилей
+            inns = await self._get_shard_inns() if sharded else []
+            fetch: Dict[str, Any] = {}
+            if inns:
+                source = self.iter_cars_sharded(inns, fetch, conditional=not force)
+            else:
+                if sharded:
+                    # Безусловно: 304 не даст нового списка ИНН
+                    logger.info("Список ИНН из 1С устарел — выгружаю весь парк одним запросом")
+                source = self._read_cars({}, fetch, conditional=not (force or sharded))
 
-            # Получаем ВСЕ автомобили (включая архивные) для обновления
-            existing_cars = await self._get_all_cars_map()
             external_codes = set()
-
-            for item in external_cars:
-                try:
-                    if self._is_archived_car(item):
-                        stats["archived_skipped"] += 1
-                        continue
-
-                    car_data = self._map_external_to_internal(item)
-                    if not car_data:
-                        stats["errors"] += 1
-                        continue
-
-                    external_codes.add(car_data["code"])
-
-                    # Обработка региона
-                    if car_data.get("region_name"):
-                        region_stats = await self._process_region(car_data["region_name"])
-                        stats["regions_created"] += region_stats["created"]
-                        stats["regions_updated"] += region_stats["updated"]
-
-                    # Обновление или создание автомобиля
-                    if car_data["code"] in existing_cars:
-                        update_result = await self._update_car(existing_cars[car_data["code"]], car_data)
-                        stats["updated"] += update_result
-                        # Если автомобиль был восстановлен из архива
-                        if update_result == 1 and existing_cars[car_data["code"]].is_archived and car_data.get("is_active", True):
-                            stats["restored"] += 1
-                    else:
-                        stats["created"] += await self._create_car(car_data)
-
-                except Exception as e:
+            owner_inns = set()
+            region_names = set()
+            batch: Dict[str, Dict] = {}
+            async for item in source:
+                stats["total_processed"] += 1
+                if self._is_archived_car(item):
+                    stats["archived_skipped"] += 1
+                    continue
+
+                car_data = self._map_external_to_internal(item)
+                if not car_data:
                     stats["errors"] += 1
-                    logger.exception(f"Ошибка обработки автомобиля {item.get('Code', 'N/A')}: {e}")
+                    continue
+                external_codes.add(car_data["code"])
+                if car_data["owner_inn"].strip():
+                    owner_inns.add(car_data["owner_inn"].strip())
+                if car_data["region_name"]:
+                    region_names.add(car_data["region_name"])
+                car_data["fingerprint"] = self._fingerprint(car_data)
+                if fingerprints.get(car_data["code"]) == car_data["fingerprint"]:
+                    stats["skipped"] += 1
+                    continue
+                # При повторе кода в пакете побеждает последняя запись
+                batch[car_data["code"]] = car_data
+
+                if len(batch) >= SYNC_BATCH_SIZE:
+                    self._add_stats(stats, await self._apply_changes(list(batch.values())))
+                    batch = {}
+
+            if batch:
+                self._add_stats(stats, await self._apply_changes(list(batch.values())))
+            stats["regions_updated"] = len(region_names) - stats["regions_created"]
+
+            if inns:
+                stats["not_modified"] = len(fetch["not_modified"])
+            elif fetch["not_modified"]:
+                stats["not_modified"] = 1
+                logger.info("📊 Синхронизация завершена: выгрузка 1С не изменилась")
+                return stats
 
-            stats["archived"] += await self._archive_missing_cars(external_codes)
+            if not stats["total_processed"]:
+                logger.warning("⚠️ Нет данных для синхронизации")
+                return stats
+
+            if inns:
+                stats["failed_shards"] = len(fetch["failed"])
+                if fetch["failed"]:
+                    # Автомобиль, пропавший из выгруженного ИНН, мог перейти к невыгруженному
+                    logger.warning(
+                        f"⚠️ Не выгружены ИНН {fetch['failed']} — архивация отсутствующих автомобилей пропущена"
+                    )
+                elif not settings.ELEMENT_API.get("SHARD_INNS"):
+                    logger.info("Список ИНН взят из прошлой полной выгрузки — архивация отложена до следующей")
+                else:
+                    # Отсутствие автомобиля что-то значит только в выгрузке его ИНН
+                    stats["archived"] += await self._archive_missing_cars(
+                        external_codes, owner_inns=fetch["succeeded"]
+                    )
+            elif fetch["complete"]:
+                stats["archived"] += await self._archive_missing_cars(external_codes)
+                await cache.aset(SHARD_INNS_CACHE_KEY, sorted(owner_inns), timeout=SHARD_INNS_TTL)
+            else:
+                # По неполной выгрузке нельзя судить, каких автомобилей нет в 1С
+                logger.warning("⚠️ Выгрузка неполная — архивация отсутствующих автомобилей пропущена")
+            # Данные применены — следующая синхронизация может спросить 1С «изменилось ли»
+            await self.save_validators(fetch.get("validators", {}))
+            self.last_fetch_complete = not fetch["failed"] if inns else fetch["complete"]
             self.last_sync = datetime.now()
+
+            # Бот перестроит индекс госномеров по новым данным, когда они будут закоммичены
+            await sync_to_async(transaction.on_commit)(invalidate_car_index)
             
             # Логируем итоги
             logger.info(f"📊 Синхронизация завершена: "
-                       f"создано: {stats["created"]}, "
+                       f"без изменений: {stats['skipped']}, "
+                       f"создано: {stats['created']}, "
                        f"обновлено: {stats['updated']}, "
                        f"восстановлено: {stats['restored']}, "
                        f"архивировано: {stats['archived']}")
@@ -209,139 +474,199 @@ class ElementCarClient:
         except Exception as e:
             raise RuntimeError(f"Ошибка синхронизации: {e}")
 
-    @sync_to_async
-    def _get_existing_cars_map(self) -> Dict[str, Car]:
-        cars = Car.objects.available_for_sync()
-        return {car.code: car for car in cars}
+    async def _get_shard_inns(self) -> List[str]:
+        """
+        ИНН для выгрузки по частям: ELEMENT_API["SHARD_INNS"], а если список
+        не задан — ИНН владельцев из последней полной выгрузки 1С.
+        Пустой список — пора выгрузить весь парк одним запросом.
+        """
+        inns = settings.ELEMENT_API.get("SHARD_INNS") or await cache.aget(SHARD_INNS_CACHE_KEY) or []
+        return sorted({inn.strip() for inn in inns if inn.strip()})
 
     @sync_to_async
-    def _get_all_cars_map(self) -> Dict[str, Car]:
-        """Получает все автомобили (включая архивные) для обновления"""
-        cars = Car.objects.all()  # Все автомобили, не только активные
-        return {car.code: car for car in cars}
+    def _get_fingerprints(self) -> Dict[str, str]:
+        """Отпечатки всех автомобилей, сохранённые синхронизацией: {код: отпечаток}."""
+        return dict(
+            Car.objects.exclude(sync_fingerprint="").values_list("code", "sync_fingerprint").iterator()
+        )
 
-    @sync_to_async
-    def _process_region(self, name: str) -> Dict[str, int]:
-        region, created = Region.objects.get_or_create(name=name)
-        return {"created": int(created), "updated": int(not created)}
+    @staticmethod
+    def _add_stats(stats: Dict[str, int], batch_stats: Dict[str, int]) -> None:
+        for key, value in batch_stats.items():
+            stats[key] += value
 
-    @sync_to_async
-    def _create_car(self, data: Dict) -> int:
-        try:
-            region = Region.objects.filter(name=data["region_name"]).first() if data.get("region_name") else None
-            
-            # Проверяем, существует ли автомобиль с таким кодом (включая архивные)
-            existing_car = Car.objects.filter(code=data["code"]).first()
-            if existing_car:
-                logger.info(f"🔄 Автомобиль с кодом {data['code']} уже существует, обновляем...")
-                # Вызываем синхронный метод обновления
-                return self._update_car_sync(existing_car, data)
-            
-            # Подготавливаем данные
-            car_data = {
-                "code": data["code"],
-                "state_number": data["state_number"],
-                "model": data["model"],
-                "vin": data.get("vin") or "",
-                "manufacture_year": data["manufacture_year"],
-                "owner_inn": data.get("owner_inn") or "",
-                "department": data.get("department") or "",
-                "region": region,
-                "is_active": data.get("is_active", True),
-                "status": data.get("status") or "",
-            }
-            
-            # Создаем автомобиль
-            Car.objects.create(**car_data)
-            logger.info(f"✅ Создан автомобиль: {data['state_number']} ({data['code']})")
-            return 1
-            
-        except Exception as e:
-            logger.exception(f"Ошибка создания автомобиля {data.get('code', 'N/A')}: {e}")
-            return 0
+    @staticmethod
+    def _resolve_regions_sync(names: set[str]) -> tuple[Dict[str, Region], int]:
+        """
+        Загружает регионы по именам одним запросом и создаёт недостающие.
+        Возвращает {имя: регион} и количество созданных.
+        """
+        regions = {region.name: region for region in Region.objects.filter(name__in=names)}
+        missing = [Region(name=name) for name in sorted(names - regions.keys())]
+        if missing:
+            Region.objects.bulk_create(missing, batch_size=SYNC_BATCH_SIZE, ignore_conflicts=True)
+            # ignore_conflicts не возвращает id — перечитываем созданные
+            regions.update(
+                (region.name, region)
+                for region in Region.objects.filter(name__in=[r.name for r in missing])
+            )
+        return regions, len(missing)
+
+    @staticmethod
+    def _diff_car(car: Car, data: Dict, region: Optional[Region]) -> List[str]:
+        """Сравнивает автомобиль с данными 1С в памяти, применяет изменения к объекту."""
+        changed = []
+        for field in SYNC_FIELDS:
+            new_value = data.get(field, getattr(car, field))
+            if field in STRING_SYNC_FIELDS:
+                new_value = new_value or ""
+            if getattr(car, field) != new_value:
+                setattr(car, field, new_value)
+                changed.append(field)
+
+        # Пустой регион в выгрузке не сбрасывает текущий
+        if region is not None and car.region_id != region.id:
+            car.region = region
+            changed.append("region")
+        return changed
+
+    @staticmethod
+    def _assign_plate(car: Car, plates: Dict[str, int], claimed: set, released: List[int]) -> bool:
+        """
+        Выставляет normalized_plate (bulk_create/bulk_update не вызывают save()),
+        True — если значение изменилось.
+
+        Госномер уникален среди активных автомобилей: автомобиль из выгрузки
+        забирает номер у активного автомобиля вне выгрузки (тот обычно
+        архивируется следом), повтор номера внутри выгрузки остаётся без
+        нормализованного номера.
+        """
+        plate = normalize_plate_input(car.state_number) or None
+        if plate and not car.is_archived:
+            holder = plates.get(plate)
+            if plate in claimed:
+                logger.warning(f"⚠️ Госномер {plate} повторяется в выгрузке 1С, автомобиль {car.code} без поиска по номеру")
+                plate = None
+            elif holder is not None and holder != car.id:
+                logger.warning(f"⚠️ Госномер {plate} передан автомобилю {car.code} от автомобиля id={holder}")
+                released.append(holder)
+            if plate:
+                claimed.add(plate)
+                plates[plate] = car.id
+
+        if car.normalized_plate == plate:
+            return False
+        car.normalized_plate = plate
+        return True
+
+    def _apply_changes_sync(self, cars_data: List[Dict]) -> Dict[str, int]:
+        """
+        Diff-and-apply: регионы и автомобили загружаются одним запросом каждый,
+        изменения считаются в памяти и записываются пакетами в одной транзакции.
+        """
+        stats = {"created": 0, "updated": 0, "restored": 0, "regions_created": 0}
+        now = timezone.now()
+
+        with transaction.atomic():
+            region_names = {data["region_name"] for data in cars_data if data.get("region_name")}
+            regions, stats["regions_created"] = self._resolve_regions_sync(region_names)
+
+            # Все автомобили, включая архивные: архивный из выгрузки восстанавливается
+            existing = Car.objects.in_bulk([data["code"] for data in cars_data], field_name="code")
+
+            # Нормализованные госномера активных автомобилей: номер -> id
+            plates = dict(
+                Car.objects.active().exclude(normalized_plate=None).values_list("normalized_plate", "id").iterator()
+            )
+            claimed, released = set(), []
+
+            to_create, to_update, to_refingerprint, updated_fields = [], [], [], set()
+            for data in cars_data:
+                region = regions.get(data.get("region_name") or "")
+                car = existing.get(data["code"])
+
+                if car is None:
+                    car = Car(
+                        code=data["code"],
+                        state_number=data["state_number"],
+                        model=data["model"],
+                        vin=data.get("vin") or "",
+                        manufacture_year=data["manufacture_year"],
+                        owner_inn=data.get("owner_inn") or "",
+                        department=data.get("department") or "",
+                        region=region,
+                        is_active=data.get("is_active", True),
+                        status=data.get("status") or "",
+                        sync_fingerprint=data["fingerprint"],
+                    )
+                    self._assign_plate(car, plates, claimed, released)
+                    to_create.append(car)
+                    continue
+
+                was_archived = car.is_archived
+                changed = self._diff_car(car, data, region)
+                if self._assign_plate(car, plates, claimed, released):
+                    changed.append("normalized_plate")
+                car.sync_fingerprint = data["fingerprint"]
+                if not changed:
+                    # Данные совпали, но отпечатка не было (новое поле или локальная правка)
+                    to_refingerprint.append(car)
+                    continue
+
+                if was_archived and not car.is_archived:
+                    stats["restored"] += 1
+                    logger.info(f"🔄 Автомобиль {car.code} восстановлен из архива")
+                car.updated_at = now
+                to_update.append(car)
+                updated_fields.update(changed)
+
+            if released:
+                # Освобождаем номера до записи: иначе сработает уникальный индекс
+                Car.objects.filter(id__in=released).update(normalized_plate=None)
+            if to_create:
+                Car.objects.bulk_create(to_create, batch_size=SYNC_BATCH_SIZE)
+            if to_update:
+                # bulk_update не выставляет auto_now — updated_at задан явно
+                Car.objects.bulk_update(
+                    to_update,
+                    sorted(updated_fields | {"updated_at", "sync_fingerprint"}),
+                    batch_size=SYNC_BATCH_SIZE,
+                )
+            if to_refingerprint:
+                Car.objects.bulk_update(to_refingerprint, ["sync_fingerprint"], batch_size=SYNC_BATCH_SIZE)
+
+        stats["created"] = len(to_create)
+        stats["updated"] = len(to_update)
+        return stats
 
-    def _update_car_sync(self, car: Car, data: Dict) -> int:
-        """Синхронная версия метода обновления для использования в _create_car"""
-        try:
-            # Проверяем, нужно ли архивировать автомобиль
-            if not data.get("is_active", True) or (data.get("status") or "").upper() == "АРХИВ":
-                if not car.is_archived:
-                    car.archive("Стал архивным в 1С")
-                    logger.info(f"📦 Автомобиль {car.code} перемещен в архив")
-                return 0
-
-            # Восстанавливаем из архива, если нужно
-            if car.is_archived and data.get("is_active", True) and (data.get("status") or "").upper() != "АРХИВ":
-                car.restore_from_archive()
-                logger.info(f"🔄 Автомобиль {car.code} восстановлен из архива")
-
-            updated = False
-            update_fields = []
-            
-            # Сравниваем и обновляем поля
-            fields_to_check = ["state_number", "model", "vin", "manufacture_year", "owner_inn", "department", "status", "is_active"]
-            
-            for field in fields_to_check:
-                new_value = data.get(field, getattr(car, field))
-                
-                # Обработка None значений для строковых полей
-                if field in ["vin", "owner_inn", "department", "status", "state_number", "model"]:
-                    new_value = new_value or ""
-                
-                current_value = getattr(car, field)
-                
-                if current_value != new_value:
-                    setattr(car, field, new_value)
-                    updated = True
-                    update_fields.append(field)
-
-            # Обновление региона
-            if data.get("region_name"):
-                region = Region.objects.filter(name=data["region_name"]).first()
-                if car.region != region:
-                    car.region = region
-                    updated = True
-                    update_fields.append("region")
-
-            if updated:
-                car.save(update_fields=update_fields)
-                logger.info(f"🔄 Обновлен автомобиль {car.state_number}: {', '.join(update_fields)}")
-                return 1
-            
-            return 0
-            
-        except Exception as e:
-            logger.exception(f"Ошибка обновления автомобиля {data.get('code', 'N/A')}: {e}")
-            return 0
-    
     @sync_to_async
-    def _update_car(self, car: Car, data: Dict) -> int:
-        """Асинхронная версия метода обновления"""
-        return self._update_car_sync(car, data)
+    def _apply_changes(self, cars_data: List[Dict]) -> Dict[str, int]:
+        return self._apply_changes_sync(cars_data)
 
     @sync_to_async
-    def _archive_missing_cars(self, external_codes: set) -> int:
+    def _archive_missing_cars(self, external_codes: set, owner_inns: Optional[List[str]] = None) -> int:
         try:
             # Архивируем только активные автомобили, которых нет в выгрузке
-            missing = Car.objects.active().exclude(code__in=external_codes)
-            count = missing.count()
-            
-            for car in missing:
-                car.archive("Отсутствует в выгрузке 1С")
-                
-            if count:
-                logger.warning(f"🔴 Архивировано {count} автомобилей, отсутствующих в 1С")
-            
-            return count
+            codes = CarService.archive_missing_cars(
+                external_codes, reason="Отсутствует в выгрузке 1С", owner_inns=owner_inns
+            )
+            if codes:
+                logger.warning(f"🔴 Архивировано {len(codes)} автомобилей, отсутствующих в 1С")
+            return len(codes)
         except Exception as e:
             logger.exception(f"Ошибка архивации автомобилей: {e}")
             return 0
 
     async def check_availability(self) -> bool:
+        """
+        Лёгкая проверка доступности: запрос с фильтром по несуществующему
+        госномеру возвращает пустой список вместо выгрузки всего парка.
+        """
         try:
             url = f"{self.base_url}/Car/v1/Get"
-            auth = aiohttp.BasicAuth(self.auth_user, self.auth_password)
-            async with self.session.get(url, auth=auth, timeout=30) as resp:
+            timeout = aiohttp.ClientTimeout(total=PROBE_TIMEOUT)
+            async with self.session.get(url, params={"num": PROBE_STATE_NUMBER}, timeout=timeout) as resp:
+                await resp.read()
                 return resp.status == 200
         except Exception as e:
             logger.error(f"❌ API недоступно: {e}")
@@ -349,8 +674,14 @@ class ElementCarClient:
 
     async def get_sample_data(self, limit: int = 3) -> List[Dict[str, Any]]:
         try:
-            cars = await self.fetch_cars()
-            return cars[:limit]
+            cars = []
+            # Читаем только начало выгрузки
+            async with aclosing(self.iter_cars()) as stream:
+                async for car in stream:
+                    cars.append(car)
+                    if len(cars) >= limit:
+                        break
+            return cars
         except Exception as e:
             logger.exception(f"Ошибка получения примеров: {e}")
             return []
@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+
+logger = logging.getLogger(__name__)
+
+LETTERS = "АВЕКМНОРСТУХ"
+MODELS = [
+    "LADA Largus", "LADA Vesta", "Renault Logan", "Hyundai Solaris", "Kia Rio",
+    "Skoda Octavia", "Volkswagen Polo", "ГАЗ Газель Next", "УАЗ Патриот", "Toyota Camry",
+]
+REGIONS = [
+    "Москва", "Московская область", "Санкт-Петербург", "Татарстан", "Краснодарский край",
+    "Свердловская область", "Новосибирская область", "Нижегородская область",
+]
+DEPARTMENTS = ["Такси", "Каршеринг", "Доставка", "Аренда", "Служебный"]
+# Размер куска ответа при потоковой отдаче
+RESPONSE_CHUNK_SIZE = 64 * 1024
+
+
+class FakeElementServer:
+    """
+    Локальная замена 1С:Элемент (GET /Car/v1/Get) для проверки и замеров
+    синхронизации без доступа к настоящему API.
+
+    Генерирует cars синтетических автомобилей (детерминированно по seed),
+    churn() вносит изменения как между реальными выгрузками: смена госномера,
+    перенос в другой регион, архивация и возврат из архива.
+    Ответ отдаётся потоком, со сжатием gzip по Accept-Encoding и ETag
+    (If-None-Match -> 304, пока данные не менялись); можно испортить часть объектов (malformed),
+    оборвать ответ (truncate) и замедлить отдачу (delay, chunk_delay).
+    """
+
+    def __init__(
+        self,
+        cars: int = 1000,
+        seed: int = 42,
+        inns: int = 10,
+        archived_share: float = 0.02,
+        malformed: int = 0,
+        truncate: Optional[float] = None,
+        delay: float = 0,
+        chunk_delay: float = 0,
+        failing_inns: Optional[List[str]] = None,
+    ):
+        self.random = random.Random(seed)
+        self.inns = [f"77{index:08d}" for index in range(1, inns + 1)]
+        self.cars: List[Dict[str, Any]] = [self._make_car(index) for index in range(1, cars + 1)]
+        for car in self.random.sample(self.cars, int(cars * archived_share)):
+            self._set_archived(car, True)
+
+        self.malformed = malformed
+        # Доля ответа, после которой соединение обрывается (0.5 — на середине)
+        self.truncate = truncate
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        self.failing_inns = set(failing_inns or ())
+        self.requests = 0
+        self.not_modified = 0
+        # Версия данных для ETag: увеличивается при каждом churn()
+        self.version = 1
+
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    # --------------------- Данные ---------------------
+    def _state_number(self) -> str:
+        letters = "".join(self.random.choice(LETTERS) for _ in range(3))
+        return f"{letters[0]}{self.random.randint(1, 999):03d}{letters[1:]}{self.random.choice([77, 97, 177, 199, 50, 78])}"
+
+    def _make_car(self, index: int) -> Dict[str, Any]:
+        return {
+            "Code": f"00-{index:07d}",
+            "Number": self._state_number(),
+            "Model": self.random.choice(MODELS),
+            "VIN": "".join(self.random.choice("0123456789ABCDEFGHJKLMNPRSTUVWXYZ") for _ in range(17)),
+            "YearCar": f"{self.random.randint(2012, 2025)}-01-01T00:00:00",
+            "INN": self.random.choice(self.inns),
+            "Department": self.random.choice(DEPARTMENTS),
+            "Region": self.random.choice(REGIONS),
+            "Activity": True,
+            "Status": "АКТИВЕН",
+        }
+
+    @staticmethod
+    def _set_archived(car: Dict[str, Any], archived: bool) -> None:
+        car["Activity"] = not archived
+        car["Status"] = "АРХИВ" if archived else "АКТИВЕН"
+
+    def churn(self, share: float = 0.05) -> Dict[str, int]:
+        """Изменяет долю share автомобилей; возвращает количество изменений по видам."""
+        self.version += 1
+        changes = {"renamed": 0, "moved": 0, "archived": 0, "restored": 0}
+        for car in self.random.sample(self.cars, int(len(self.cars) * share)):
+            kind = self.random.choice(["renamed", "moved", "moved", "archive_flip"])
+            if kind == "renamed":
+                car["Number"] = self._state_number()
+            elif kind == "moved":
+                car["Region"] = self.random.choice([r for r in REGIONS if r != car["Region"]])
+                car["Department"] = self.random.choice(DEPARTMENTS)
+            else:
+                archived = car["Activity"]
+                self._set_archived(car, archived)
+                kind = "archived" if archived else "restored"
+            changes[kind] += 1
+        return changes
+
+    def _select(self, query) -> List[Dict[str, Any]]:
+        filters = {"inn": "INN", "vin": "VIN", "num": "Number"}
+        cars = self.cars
+        for param, field in filters.items():
+            if query.get(param):
+                cars = [car for car in cars if car[field] == query[param]]
+        return cars
+
+    def _render(self, cars: List[Dict[str, Any]]) -> bytes:
+        broken = set(self.random.sample(range(len(cars)), min(self.malformed, len(cars))))
+        parts = [
+            # Объект без значения — парсер клиента должен его пропустить и отметить ошибку
+            '{"Code": "' + car["Code"] + '", "Number": }' if index in broken
+            else json.dumps(car, ensure_ascii=False)
+            for index, car in enumerate(cars)
+        ]
+        return ("[" + ",\n".join(parts) + "]").encode("utf-8")
+
+    # --------------------- HTTP ---------------------
+    async def handle_get(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if request.query.get("inn") in self.failing_inns:
+            return web.Response(status=503, text="Сервис временно недоступен")
+
+        query = sorted(request.query.items())
+        etag = '"' + hashlib.md5(f"{self.version}:{query}".encode("utf-8")).hexdigest() + '"'
+        # Испорченные и оборванные ответы каждый раз разные — для них ETag не отдаётся
+        use_etag = not self.malformed and self.truncate is None
+        if use_etag and request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers={"ETag": etag})
+
+        body = self._render(self._select(request.query))
+        if self.truncate is not None:
+            body = body[:int(len(body) * self.truncate)]
+
+        response = web.StreamResponse(headers={"Content-Type": "application/json; charset=utf-8"})
+        if use_etag:
+            response.headers["ETag"] = etag
+        response.enable_compression()
+        await response.prepare(request)
+        for start in range(0, len(body), RESPONSE_CHUNK_SIZE):
+            await response.write(body[start:start + RESPONSE_CHUNK_SIZE])
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+        if self.truncate is not None:
+            # Обрыв соединения вместо корректного завершения ответа
+            request.transport.close()
+            return response
+        await response.write_eof()
+        return response
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/Car/v1/Get", self.handle_get)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Запускает сервер; port=0 — свободный порт. Возвращает базовый URL для клиента."""
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{host}:{port}"
+        logger.info("Fake 1C:Element: %s (%s автомобилей)", self.url, len(self.cars))
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
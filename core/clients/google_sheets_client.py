@@ -1,29 +1,89 @@
+import asyncio
+import logging
+import re
+import threading
+import time
 import pytz
 import gspread
 
-from collections.abc import Sequence
+from collections.abc import Callable, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
+from functools import partial
+from typing import Any
 from django.conf import settings
 from google.oauth2.service_account import Credentials
-from gspread import Worksheet
-from gspread.exceptions import APIError
+from gspread import Spreadsheet, Worksheet
+from gspread.exceptions import APIError, WorksheetNotFound
+from requests.exceptions import ConnectionError, Timeout
+
+from core.clients.google_sheets_limiter import (
+    GoogleSheetsError,
+    backoff_delay,
+    sheets_limiter,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Блокирующие вызовы gspread выполняются в отдельном пуле, а не в event loop
+_executor = ThreadPoolExecutor(
+    max_workers=settings.GSHEET.get("EXECUTOR_WORKERS", 4),
+    thread_name_prefix="gsheets",
+)
+
+# Коды ответа, после которых открытые дескрипторы считаются недействительными:
+# истёк токен / отозван доступ / лист удалён или переименован
+STALE_HANDLE_CODES = {401, 403, 404}
+# Временные ошибки: превышение квоты и сбои на стороне Google
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+# Запрос отклонён до выполнения — повтор безопасен даже для добавления строк
+REJECTED_CODES = {429}
+
+# Первая строка диапазона из ответа append: "'Заправки'!A15:L20" -> 15
+UPDATED_RANGE_RE = re.compile(r"![A-Z]+(\d+)")
+
+
+def _appended_row_numbers(response: dict, count: int) -> list[int]:
+    """Номера строк, в которые API записал добавленные строки."""
+    updated_range = (response or {}).get("updates", {}).get("updatedRange", "")
+    match = UPDATED_RANGE_RE.search(updated_range)
+    if not match:
+        return []
+    first_row = int(match.group(1))
+    return list(range(first_row, first_row + count))
 
 
 class GoogleSheetsClient:
-    """Клиент для работы с Google Sheets"""
+    """
+    Клиент для работы с Google Sheets.
+    Авторизация, таблица и листы открываются один раз и переиспользуются
+    до истечения HANDLE_TTL.
+    """
 
     def __init__(self):
         self._creds_path = settings.GSHEET["CREDENTIALS_JSON_PATH"]
         self.spreadsheet_id = settings.GSHEET["SPREADSHEET_ID"]
+        self.handle_ttl = settings.GSHEET.get("HANDLE_TTL", 600)
         self._client = None
+        self._spreadsheet: Spreadsheet | None = None
+        self._worksheets: dict[str, Worksheet] = {}
+        self._opened_at = 0.0
+        # Дескрипторы общие для потоков пула. Блокировка защищает только
+        # словари: квота и сетевые вызовы — вне её
+        self._lock = threading.Lock()
+        # Листы, которые сейчас открываются: остальные потоки ждут тот же результат
+        self._opening: dict[str, Future] = {}
+        # Растёт при сбросе: дескриптор, открытый до сброса, в кэш не попадает
+        self._generation = 0
         
         # Московское время
         self.MOSCOW_TZ = pytz.timezone("Europe/Moscow")
 
         if not self._creds_path:
-            raise RuntimeError("Google Sheets credentials not configured")
+            raise GoogleSheetsError("Google Sheets credentials not configured")
         if not self.spreadsheet_id:
-            raise RuntimeError("Google Sheets spreadsheet id not configured")
+            raise GoogleSheetsError("Google Sheets spreadsheet id not configured")
 
     def _authorize(self) -> None:
         """Авторизация в Google Sheets"""
@@ -35,25 +95,143 @@ class GoogleSheetsClient:
             creds = Credentials.from_service_account_file(self._creds_path, scopes=scopes)
             self._client = gspread.authorize(creds)
         except Exception as e:
-            raise RuntimeError(f"Ошибка авторизации Google Sheets: {e}")
+            raise GoogleSheetsError(f"Ошибка авторизации Google Sheets: {e}")
+
+    def _reset(self) -> None:
+        """Сбрасывает авторизацию и открытые дескрипторы."""
+        with self._lock:
+            self._client = None
+            self._spreadsheet = None
+            self._worksheets = {}
+            self._opened_at = 0.0
+            self._generation += 1
+
+    def _get_spreadsheet(self, generation: int) -> Spreadsheet:
+        """Открытая таблица; открывается вне блокировки, в кэш попадает первая открытая."""
+        with self._lock:
+            if self._spreadsheet is not None:
+                return self._spreadsheet
+            self._authorize()
+            client = self._client
+
+        sheets_limiter.acquire()
+        spreadsheet = client.open_by_key(self.spreadsheet_id)
+        with self._lock:
+            if generation != self._generation:
+                return spreadsheet
+            if self._spreadsheet is None:
+                self._spreadsheet = spreadsheet
+                self._opened_at = time.monotonic()
+            return self._spreadsheet
 
     def _get_worksheet(self, sheet_name: str) -> Worksheet:
-        """Получение рабочего листа"""
-        self._authorize()
+        """
+        Получение рабочего листа (из кэша дескрипторов, если он не устарел).
+        Лист открывает один поток, остальные ждут его результат.
+        """
+        with self._lock:
+            if self._opened_at and time.monotonic() - self._opened_at > self.handle_ttl:
+                self._spreadsheet = None
+                self._worksheets = {}
+                self._opened_at = 0.0
+                self._generation += 1
+
+            worksheet = self._worksheets.get(sheet_name)
+            if worksheet is not None:
+                return worksheet
+
+            future = self._opening.get(sheet_name)
+            if future is None:
+                future = self._opening[sheet_name] = Future()
+                generation = self._generation
+            else:
+                generation = None
+
+        if generation is None:
+            return future.result()
+
         try:
-            spreadsheet = self._client.open_by_key(self.spreadsheet_id)
-            return spreadsheet.worksheet(sheet_name)
-        except APIError as e:
-            raise RuntimeError(f"Ошибка доступа к таблице: {e}")
+            spreadsheet = self._get_spreadsheet(generation)
+            sheets_limiter.acquire()
+            worksheet = spreadsheet.worksheet(sheet_name)
+        except WorksheetNotFound as e:
+            error = GoogleSheetsError(f"Ошибка доступа к таблице: {e}")
+        except BaseException as e:
+            error = e
+        else:
+            error = None
+
+        with self._lock:
+            self._opening.pop(sheet_name, None)
+            if error is None and generation == self._generation:
+                self._worksheets[sheet_name] = worksheet
+        if error is not None:
+            future.set_exception(error)
+            raise error
+        future.set_result(worksheet)
+        return worksheet
+
+    def _call(self, sheet_name: str, func: Callable[[Worksheet], Any], idempotent: bool = True) -> Any:
+        """
+        Выполняет func(worksheet) в потоке пула с учётом квоты.
+        При ошибке авторизации/доступа сбрасывает дескрипторы и повторяет один раз,
+        429/5xx и сетевые ошибки повторяет с экспоненциальной паузой.
+        idempotent=False (добавление строк): после 5xx и сетевой ошибки строки
+        могли уже попасть в лист, поэтому повторяется только 429.
+        """
+        max_retries = settings.GSHEET.get("MAX_RETRIES", 5)
+        handles_reset = False
+        attempt = 0
+        while True:
+            try:
+                worksheet = self._get_worksheet(sheet_name)
+                sheets_limiter.acquire()
+                return func(worksheet)
+            except APIError as e:
+                if e.code in STALE_HANDLE_CODES and not handles_reset:
+                    logger.warning("Google Sheets: дескрипторы устарели (%s), переоткрываем", e.code)
+                    self._reset()
+                    handles_reset = True
+                    continue
+                if e.code not in (RETRYABLE_CODES if idempotent else REJECTED_CODES):
+                    raise GoogleSheetsError(f"Ошибка Google Sheets API: {e}")
+                error = e
+            except (ConnectionError, Timeout) as e:
+                if not idempotent:
+                    raise GoogleSheetsError(f"Google Sheets: результат запроса неизвестен: {e}")
+                error = e
+
+            if attempt >= max_retries:
+                sheets_limiter.count("dropped")
+                raise GoogleSheetsError(f"Google Sheets недоступен после {attempt + 1} попыток: {error}")
+            delay = backoff_delay(attempt)
+            attempt += 1
+            sheets_limiter.count("retried")
+            logger.warning(
+                "Google Sheets: %s, повтор %s/%s через %.1f с", error, attempt, max_retries, delay
+            )
+            time.sleep(delay)
 
-    def _format_datetime_msk(self, dt: datetime) -> str:
+    async def _run(self, sheet_name: str, func: Callable[[Worksheet], Any], idempotent: bool = True) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, partial(self._call, sheet_name, func, idempotent))
+
+    def _prepare_rows(self, rows: list[Sequence]) -> list[list]:
         """
-        Конвертирует любую datetime в московское время и форматирует как 'ДД.ММ.ГГГГ ЧЧ:ММ'
+        Готовит пакет строк к отправке: даты в первой колонке переводятся в МСК.
+        Часовой пояс и формат применяются один раз на весь пакет.
         """
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=timezone.utc)
-        dt_msk = dt.astimezone(self.MOSCOW_TZ)
-        return dt_msk.strftime("%d.%m.%Y %H:%M")
+        moscow_tz = self.MOSCOW_TZ
+        prepared = []
+        for row in rows:
+            processed_row = list(row)
+            if processed_row and isinstance(processed_row[0], datetime):
+                dt = processed_row[0]
+                if dt.tzinfo is None:
+                    dt = dt.replace(tzinfo=timezone.utc)
+                processed_row[0] = dt.astimezone(moscow_tz).strftime("%d.%m.%Y %H:%M")
+            prepared.append(processed_row)
+        return prepared
 
     async def append_row(self, sheet_name: str, row: Sequence, **kwargs) -> None:
         """
@@ -61,41 +239,124 @@ class GoogleSheetsClient:
         Если первый элемент — datetime, он автоматически преобразуется в МСК и форматируется.
         """
         try:
-            # Преобразуем дату, если она есть (предполагаем, что первая колонка — дата)
-            processed_row = list(row)
-            if len(processed_row) > 0 and isinstance(processed_row[0], datetime):
-                processed_row[0] = self._format_datetime_msk(processed_row[0])
-
-            worksheet = self._get_worksheet(sheet_name)
-            worksheet.append_row(processed_row, **kwargs)
+            processed_row = self._prepare_rows([row])[0]
+            await self._run(
+                sheet_name, lambda ws: ws.append_row(processed_row, **kwargs), idempotent=False
+            )
+        except GoogleSheetsError:
+            raise
+        except Exception as e:
+            raise GoogleSheetsError(f"Ошибка добавления строки: {e}")
 
+    async def batch_append_rows(self, sheet_name: str, rows: list[Sequence]) -> list[int]:
+        """
+        Пакетное добавление строк с форматированием дат.
+        Строки отправляются кусками по APPEND_CHUNK_SIZE — один запрос на кусок.
+        Возвращает номера строк листа, в которые попали добавленные строки.
+        """
+        if not rows:
+            return []
+        try:
+            prepared = self._prepare_rows(rows)
+            chunk_size = settings.GSHEET.get("APPEND_CHUNK_SIZE", 5000)
+            row_numbers = []
+            for start in range(0, len(prepared), chunk_size):
+                chunk = prepared[start:start + chunk_size]
+                response = await self._run(
+                    sheet_name, lambda ws, chunk=chunk: ws.append_rows(chunk), idempotent=False
+                )
+                row_numbers.extend(_appended_row_numbers(response, len(chunk)))
+            return row_numbers
+        except GoogleSheetsError:
+            raise
         except Exception as e:
-            raise RuntimeError(f"Ошибка добавления строки: {e}")
+            raise GoogleSheetsError(f"Ошибка пакетного добавления строк: {e}")
 
-    async def batch_append_rows(self, sheet_name: str, rows: list[Sequence]) -> None:
-        """Пакетное добавление строк с форматированием дат"""
+    async def batch_update_rows(self, sheet_name: str, rows: dict[int, Sequence]) -> None:
+        """
+        Перезапись строк по номерам {номер строки: значения}.
+        Отправляется кусками по APPEND_CHUNK_SIZE строк — один запрос на кусок.
+        """
+        if not rows:
+            return
         try:
-            worksheet = self._get_worksheet(sheet_name)
-            for row in rows:
-                processed_row = list(row)
-                if len(processed_row) > 0 and isinstance(processed_row[0], datetime):
-                    processed_row[0] = self._format_datetime_msk(processed_row[0])
-                worksheet.append_row(processed_row)
+            data = [
+                {"range": f"A{row_number}", "values": self._prepare_rows([row])}
+                for row_number, row in sorted(rows.items())
+            ]
+            chunk_size = settings.GSHEET.get("APPEND_CHUNK_SIZE", 5000)
+            for start in range(0, len(data), chunk_size):
+                chunk = data[start:start + chunk_size]
+                await self._run(sheet_name, lambda ws, chunk=chunk: ws.batch_update(chunk))
+        except GoogleSheetsError:
+            raise
         except Exception as e:
-            raise RuntimeError(f"Ошибка пакетного добавления строк: {e}")
+            raise GoogleSheetsError(f"Ошибка обновления строк: {e}")
 
     async def clear_sheet(self, sheet_name: str) -> None:
         """Очистка листа"""
         try:
-            worksheet = self._get_worksheet(sheet_name)
-            worksheet.clear()
+            await self._run(sheet_name, lambda ws: ws.clear())
+        except GoogleSheetsError:
+            raise
         except Exception as e:
-            raise RuntimeError(f"Ошибка очистки листа: {e}")
+            raise GoogleSheetsError(f"Ошибка очистки листа: {e}")
 
     async def get_all_records(self, sheet_name: str) -> list[dict]:
         """Получение всех записей с листа"""
         try:
-            worksheet = self._get_worksheet(sheet_name)
-            return worksheet.get_all_records()
+            return await self._run(sheet_name, lambda ws: ws.get_all_records())
+        except GoogleSheetsError:
+            raise
         except Exception as e:
-            raise RuntimeError(f"Ошибка получения записей: {e}")
+            raise GoogleSheetsError(f"Ошибка получения записей: {e}")
+
+
+_shared_client: GoogleSheetsClient | None = None
+_shared_client_lock = threading.Lock()
+
+
+def get_google_sheets_client() -> GoogleSheetsClient:
+    """Общий клиент процесса: авторизация и дескрипторы листов переиспользуются."""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = GoogleSheetsClient()
+        return _shared_client
+
+
+class InMemoryGoogleSheetsClient:
+    """
+    Клиент-заглушка с тем же интерфейсом, что у GoogleSheetsClient:
+    хранит строки в памяти. Для проверки выгрузки без доступа к Google.
+    """
+
+    def __init__(self):
+        self.sheets: dict[str, list[list]] = {}
+        self.calls = 0
+
+    async def append_row(self, sheet_name: str, row: Sequence, **kwargs) -> None:
+        await self.batch_append_rows(sheet_name, [row])
+
+    async def batch_append_rows(self, sheet_name: str, rows: list[Sequence]) -> list[int]:
+        self.calls += 1
+        sheet = self.sheets.setdefault(sheet_name, [])
+        first_row = len(sheet) + 1
+        sheet.extend(list(row) for row in rows)
+        return list(range(first_row, first_row + len(rows)))
+
+    async def batch_update_rows(self, sheet_name: str, rows: dict[int, Sequence]) -> None:
+        self.calls += 1
+        sheet = self.sheets.setdefault(sheet_name, [])
+        for row_number, row in rows.items():
+            sheet[row_number - 1] = list(row)
+
+    async def clear_sheet(self, sheet_name: str) -> None:
+        self.sheets[sheet_name] = []
+
+    async def get_all_records(self, sheet_name: str) -> list[dict]:
+        rows = self.sheets.get(sheet_name, [])
+        if not rows:
+            return []
+        headers, *values = rows
+        return [dict(zip(headers, row)) for row in values]
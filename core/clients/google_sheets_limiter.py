@@ -0,0 +1,111 @@
+import logging
+import random
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+logger = logging.getLogger(__name__)
+
+# Счётчик запросов всех процессов за текущую минуту: gsheets_quota:<номер минуты>
+QUOTA_CACHE_KEY_PREFIX = "gsheets_quota:"
+
+
+class GoogleSheetsError(RuntimeError):
+    """Ошибка обращения к Google Sheets"""
+
+
+class GoogleSheetsQuotaError(GoogleSheetsError):
+    """Запрос не отправлен: квота исчерпана, а ожидание превысило допустимое"""
+
+
+class SheetsRateLimiter:
+    """
+    Ограничитель запросов к Google Sheets под поминутную квоту API.
+
+    Внутри процесса — token bucket (запросы равномерно распределяются по минуте,
+    потоки пула ждут своей очереди). Между процессами (бот, воркер очереди,
+    админка, команды) — общий счётчик запросов за минуту в кэше.
+    """
+
+    def __init__(self, per_minute: int, max_wait: float):
+        self.per_minute = per_minute
+        self.max_wait = max_wait
+        self.rate = per_minute / 60
+        self.stats = Counter()
+        self._tokens = float(per_minute)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        # stats меняют потоки пула: читать через get_stats()
+        self._stats_lock = threading.Lock()
+
+    def count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def get_stats(self) -> dict[str, int]:
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def _take_local_token(self) -> float:
+        """Берёт токен; возвращает, сколько секунд нужно подождать (0 — токен взят)."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.per_minute, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def _take_shared_slot(self) -> float:
+        """Учитывает запрос в общем счётчике; возвращает паузу до следующей минуты, если квота занята."""
+        now = time.time()
+        key = f"{QUOTA_CACHE_KEY_PREFIX}{int(now // 60)}"
+        try:
+            cache.add(key, 0, timeout=120)
+            used = cache.incr(key)
+        except Exception as e:
+            # Кэш недоступен — остаётся только ограничение процесса
+            logger.warning("Cache INCR failed for %s: %s", key, e)
+            return 0
+        if used <= self.per_minute:
+            return 0
+        return 60 - now % 60
+
+    def acquire(self) -> None:
+        """
+        Блокирует поток до разрешения на запрос или бросает GoogleSheetsQuotaError.
+        Сначала резервируется общий слот минуты, потом берётся токен процесса:
+        иначе токен тратится на запрос, который всё равно ждёт следующей минуты.
+        """
+        self.count("requests")
+        deadline = time.monotonic() + self.max_wait
+        waited = False
+        for take in (self._take_shared_slot, self._take_local_token):
+            while delay := take():
+                if not waited:
+                    self.count("queued")
+                    waited = True
+                if time.monotonic() + delay > deadline:
+                    self.count("dropped")
+                    raise GoogleSheetsQuotaError(
+                        f"Квота Google Sheets исчерпана, ожидание превысило {self.max_wait} с"
+                    )
+                time.sleep(delay)
+        if waited:
+            self.count("throttled")
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 64.0) -> float:
+    """Экспоненциальная пауза с полным случайным разбросом (full jitter)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+sheets_limiter = SheetsRateLimiter(
+    per_minute=settings.GSHEET.get("RATE_LIMIT_PER_MINUTE", 60),
+    max_wait=settings.GSHEET.get("RATE_LIMIT_MAX_WAIT", 120),
+)
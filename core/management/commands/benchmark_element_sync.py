@@ -0,0 +1,136 @@
+import asyncio
+import resource
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from core.clients.element_car_client import ElementCarClient
+from core.clients.element_fake_server import FakeElementServer
+
+
+class QueryCounter:
+    """Считает SQL-запросы во всех соединениях процесса (включая потоки sync_to_async)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+def peak_rss_mb() -> float:
+    """Пиковый RSS процесса, МБ (ru_maxrss: КБ в Linux, байты в macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class Command(BaseCommand):
+    help = (
+        "Замер синхронизации с 1С:Элемент на локальном тестовом сервере. "
+        "Работает во временной тестовой БД (как manage.py test), рабочие данные не затрагиваются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=str,
+            default="1000,10000,100000",
+            help="Размеры парка через запятую",
+        )
+        parser.add_argument("--churn", type=float, default=0.05, help="Доля изменённых автомобилей перед повторной синхронизацией")
+        parser.add_argument("--malformed", type=int, default=0, help="Испорченных объектов в ответе")
+        parser.add_argument("--truncate", type=float, default=None, help="Обрывать ответ на этой доле")
+        parser.add_argument("--chunk-delay", type=float, default=0, help="Задержка между кусками ответа, секунд")
+        parser.add_argument("--sharded", action="store_true", help="Выгрузка по ИНН владельцев")
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Без условных запросов (ETag): повторные прогоны скачивают выгрузку целиком",
+        )
+        parser.add_argument("--keepdb", action="store_true", help="Не удалять тестовую БД после замера")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(int(size) for size in options["sizes"].split(","))
+        except ValueError:
+            raise CommandError("--sizes: ожидаются числа через запятую")
+
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options["keepdb"])
+        counter = QueryCounter()
+        connection_created.connect(counter.install)
+        try:
+            # Размеры по возрастанию: пиковый RSS процесса только растёт
+            results = [
+                row for size in sizes for row in asyncio.run(self.run_size(size, counter, options))
+            ]
+        finally:
+            connection_created.disconnect(counter.install)
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+
+        self.print_results(results)
+
+    async def run_size(self, size: int, counter: QueryCounter, options) -> list[dict]:
+        from asgiref.sync import sync_to_async
+        from core.models import Car, Region
+
+        await sync_to_async(lambda: (Car.objects.all().delete(), Region.objects.all().delete()))()
+
+        server = FakeElementServer(
+            cars=size,
+            malformed=options["malformed"],
+            truncate=options["truncate"],
+            chunk_delay=options["chunk_delay"],
+        )
+        url = await server.start()
+        self.stdout.write(f"🚗 {size} автомобилей: {url}")
+
+        rounds = [("первичная", None), ("без изменений", None), (f"изменено {options['churn']:.0%}", options["churn"])]
+        results = []
+        try:
+            for name, churn in rounds:
+                if churn:
+                    server.churn(churn)
+                async with ElementCarClient(base_url=url, user="bench", password="bench") as client:
+                    queries_before = counter.count
+                    started = time.perf_counter()
+                    stats = await client.sync_with_database(
+                        sharded=options["sharded"], force=options["force"]
+                    )
+                    elapsed = time.perf_counter() - started
+                results.append({
+                    "size": size,
+                    "round": name,
+                    "seconds": elapsed,
+                    "queries": counter.count - queries_before,
+                    "rss_mb": peak_rss_mb(),
+                    "stats": stats,
+                })
+                self.stdout.write(f"   {name}: {elapsed:.2f} с")
+        finally:
+            await server.stop()
+        return results
+
+    def print_results(self, results: list[dict]):
+        self.stdout.write("\n📊 Результаты:")
+        header = (
+            f"{'Авто':>7} | {'Прогон':<15} | {'Время, с':>8} | {'Запросов':>8} | {'Пик RSS, МБ':>11} | "
+            f"{'созд.':>6} | {'обн.':>6} | {'арх.':>6} | {'без изм.':>8} | {'304':>4} | {'ошибок':>6}"
+        )
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for row in results:
+            stats = row["stats"]
+            self.stdout.write(
+                f"{row['size']:>7} | {row['round']:<15} | {row['seconds']:>8.2f} | {row['queries']:>8} | "
+                f"{row['rss_mb']:>11.1f} | {stats['created']:>6} | {stats['updated']:>6} | "
+                f"{stats['archived']:>6} | {stats['skipped']:>8} | {stats['not_modified']:>4} | {stats['errors']:>6}"
+            )
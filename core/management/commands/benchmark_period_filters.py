@@ -0,0 +1,144 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+# Размер пакета вставки синтетических заправок
+INSERT_BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнение фильтров по периоду: filled_at__date (приведение каждой строки к дате) "
+        "и полуоткрытого интервала filled_at >= начало AND filled_at < конец. "
+        "Работает во временной тестовой БД, рабочие данные не затрагиваются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=500000, help="Сколько заправок сгенерировать")
+        parser.add_argument("--cars", type=int, default=2000, help="Сколько автомобилей")
+        parser.add_argument("--days", type=int, default=730, help="Глубина истории, дней")
+        parser.add_argument("--repeat", type=int, default=5, help="Повторов каждого запроса")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--keepdb", action="store_true", help="Не удалять тестовую БД после замера")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options["keepdb"])
+        try:
+            cars = self.generate(options)
+            results = self.run_queries(cars, options["repeat"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+        self.print_results(results)
+
+    # --------------------- Данные ---------------------
+    def generate(self, options):
+        from core.models import Car, FuelRecord
+
+        rng = random.Random(options["seed"])
+        self.stdout.write(f"🧪 Генерация {options['rows']} заправок ({options['cars']} автомобилей)...")
+        cars = Car.objects.bulk_create(
+            [Car(code=f"B-{index:07d}", state_number=f"Б{index:06d}") for index in range(options["cars"])],
+            batch_size=INSERT_BATCH_SIZE,
+        )
+        now = timezone.now()
+        span = options["days"] * 24 * 3600
+        fuel_types = [choice for choice, _ in FuelRecord.FuelType.choices]
+        sources = [choice for choice, _ in FuelRecord.SourceFuel.choices]
+
+        started = time.perf_counter()
+        for offset in range(0, options["rows"], INSERT_BATCH_SIZE):
+            size = min(INSERT_BATCH_SIZE, options["rows"] - offset)
+            # bulk_create не вызывает сигналы: очередь Google Sheets и дневные итоги не нужны
+            FuelRecord.objects.bulk_create([
+                FuelRecord(
+                    car=rng.choice(cars),
+                    liters=Decimal(rng.randint(1000, 9000)) / 100,
+                    fuel_type=rng.choice(fuel_types),
+                    source=rng.choice(sources),
+                    filled_at=now - timedelta(seconds=rng.randrange(span)),
+                )
+                for _ in range(size)
+            ])
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.stdout.write(f"   готово за {time.perf_counter() - started:.1f} с")
+        return cars
+
+    # --------------------- Замер ---------------------
+    def run_queries(self, cars, repeat):
+        from core.models import FuelRecord
+        from core.utils.periods import date_range, resolve_period
+
+        today = timezone.localdate()
+        month_start, month_end = today - timedelta(days=30), today
+        car = cars[len(cars) // 2]
+        records = FuelRecord.objects.order_by()
+        cases = [
+            (
+                "Сегодня",
+                records.filter(filled_at__date=today),
+                records.filter(**resolve_period("today").as_filter()),
+            ),
+            (
+                "30 дней",
+                records.filter(filled_at__date__range=[month_start, month_end]),
+                records.filter(**date_range(month_start, month_end).as_filter()),
+            ),
+            (
+                "Машина, 30 дней",
+                records.filter(car=car, filled_at__date__range=[month_start, month_end]),
+                records.filter(car=car, **date_range(month_start, month_end).as_filter()),
+            ),
+        ]
+
+        results = []
+        for name, by_date, by_range in cases:
+            row = {"name": name}
+            for kind, queryset in (("date", by_date), ("range", by_range)):
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    totals = queryset.aggregate(total=Sum("liters"), cnt=Count("id"))
+                    timings.append(time.perf_counter() - started)
+                row[kind] = {
+                    "ms": statistics.median(timings) * 1000,
+                    "cnt": totals["cnt"],
+                    "plan": self.explain(queryset),
+                }
+            results.append(row)
+        return results
+
+    @staticmethod
+    def explain(queryset) -> str:
+        # Агрегат explain() не поддерживает — объясняем выборку тех же строк
+        queryset = queryset.values("liters")
+        if connection.vendor == "postgresql":
+            return queryset.explain(analyze=True, buffers=True)
+        return queryset.explain()
+
+    def print_results(self, results):
+        self.stdout.write("\n📊 Результаты (медиана):")
+        header = f"{'Запрос':<16} | {'__date, мс':>10} | {'[start, end), мс':>16} | {'Строк':>7}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for row in results:
+            mismatch = "" if row["date"]["cnt"] == row["range"]["cnt"] else "  ❌ разное число строк"
+            self.stdout.write(
+                f"{row['name']:<16} | {row['date']['ms']:>10.1f} | {row['range']['ms']:>16.1f} | "
+                f"{row['range']['cnt']:>7}{mismatch}"
+            )
+
+        self.stdout.write("\n🔎 Планы запросов:")
+        for row in results:
+            for kind, title in (("date", "filled_at__date"), ("range", "[start, end)")):
+                self.stdout.write(f"\n{row['name']} — {title}:")
+                for line in row[kind]["plan"].splitlines():
+                    self.stdout.write(f"   {line}")
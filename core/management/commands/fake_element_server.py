@@ -0,0 +1,66 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from core.clients.element_fake_server import FakeElementServer
+
+
+class Command(BaseCommand):
+    help = "Локальная замена API 1С:Элемент с синтетическими автомобилями"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", type=str, default="127.0.0.1", help="Адрес")
+        parser.add_argument("--port", type=int, default=8765, help="Порт")
+        parser.add_argument("--cars", type=int, default=1000, help="Количество автомобилей")
+        parser.add_argument("--seed", type=int, default=42, help="Seed генератора данных")
+        parser.add_argument(
+            "--churn",
+            type=float,
+            default=0,
+            help="Доля автомобилей, изменяемых каждые --churn-interval секунд",
+        )
+        parser.add_argument("--churn-interval", type=int, default=60, help="Интервал изменений, секунд")
+        parser.add_argument("--malformed", type=int, default=0, help="Испорченных объектов в каждом ответе")
+        parser.add_argument(
+            "--truncate",
+            type=float,
+            default=None,
+            help="Обрывать ответ на этой доле (например 0.5)",
+        )
+        parser.add_argument("--delay", type=float, default=0, help="Задержка перед ответом, секунд")
+        parser.add_argument("--chunk-delay", type=float, default=0, help="Задержка между кусками ответа, секунд")
+        parser.add_argument(
+            "--failing-inns",
+            type=str,
+            default="",
+            help="ИНН, по которым отвечать 503 (через запятую)",
+        )
+
+    def handle(self, *args, **options):
+        server = FakeElementServer(
+            cars=options["cars"],
+            seed=options["seed"],
+            malformed=options["malformed"],
+            truncate=options["truncate"],
+            delay=options["delay"],
+            chunk_delay=options["chunk_delay"],
+            failing_inns=[inn for inn in options["failing_inns"].split(",") if inn],
+        )
+        try:
+            asyncio.run(self.serve(server, options))
+        except KeyboardInterrupt:
+            self.stdout.write("⏹ Остановлено")
+
+    async def serve(self, server: FakeElementServer, options):
+        url = await server.start(options["host"], options["port"])
+        self.stdout.write(f"🧪 Тестовый 1С:Элемент: {url}/Car/v1/Get ({len(server.cars)} автомобилей)")
+        self.stdout.write(f"   ИНН: {', '.join(server.inns)}")
+        self.stdout.write(f"   Для синхронизации: ELEMENT_API_URL={url}")
+        try:
+            while True:
+                await asyncio.sleep(options["churn_interval"])
+                if options["churn"]:
+                    changes = server.churn(options["churn"])
+                    self.stdout.write(f"🔀 Изменения данных: {changes}")
+        finally:
+            await server.stop()
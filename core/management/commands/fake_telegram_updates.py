@@ -0,0 +1,105 @@
+import asyncio
+import itertools
+import time
+
+import aiohttp
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.refuel_bot.webhook import SECRET_HEADER
+
+
+class Command(BaseCommand):
+    help = "Отправка синтетических обновлений Telegram на локальный вебхук"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            type=str,
+            default="http://localhost:8000/telegram/webhook/",
+            help="Адрес вебхука",
+        )
+        parser.add_argument(
+            "--secret",
+            type=str,
+            default=None,
+            help="Секретный токен (по умолчанию TELEGRAM_WEBHOOK_SECRET)",
+        )
+        parser.add_argument(
+            "--user-ids",
+            type=str,
+            default="1",
+            help="Telegram ID отправителей (через запятую)",
+        )
+        parser.add_argument(
+            "--text",
+            type=str,
+            default="/start",
+            help="Текст сообщения",
+        )
+        parser.add_argument(
+            "--count",
+            type=int,
+            default=1,
+            help="Количество обновлений",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=10,
+            help="Количество одновременных запросов",
+        )
+
+    def handle(self, *args, **options):
+        asyncio.run(self.async_handle(*args, **options))
+
+    async def async_handle(self, *args, **options):
+        secret = options["secret"]
+        if secret is None:
+            secret = settings.TELEGRAM.get("WEBHOOK_SECRET", "")
+        # Имя заголовка в HTTP-виде: HTTP_X_TELEGRAM_... -> X-Telegram-...
+        header = SECRET_HEADER.removeprefix("HTTP_").replace("_", "-").title()
+        user_ids = [int(uid) for uid in options["user_ids"].split(",")]
+
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        statuses = {}
+        latencies = []
+        update_ids = itertools.count(int(time.time()))
+
+        async def post(session, user_id):
+            update_id = next(update_ids)
+            payload = {
+                "update_id": update_id,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+                    "text": options["text"],
+                },
+            }
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    async with session.post(options["url"], json=payload, headers={header: secret}) as resp:
+                        status = resp.status
+                except aiohttp.ClientError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        self.stdout.write(f"📨 Отправка {options['count']} обновлений на {options['url']}...")
+        started = time.perf_counter()
+        async with aiohttp.ClientSession() as session:
+            await asyncio.gather(*(
+                post(session, user_ids[i % len(user_ids)])
+                for i in range(options["count"])
+            ))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0
+        self.stdout.write(f"⏱ Время: {elapsed:.2f} с, p50: {p50:.1f} мс, p95: {p95:.1f} мс")
+        for status, count in sorted(statuses.items(), key=lambda item: str(item[0])):
+            self.stdout.write(f"   {status}: {count}")
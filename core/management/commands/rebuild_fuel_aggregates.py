@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Sum
+
+from core.models import FuelDailyAggregate, FuelRecord
+from core.refuel_bot.utils.report_cache import invalidate_all_reports
+from core.services.fuel_aggregate_service import FuelAggregateService
+from core.utils.periods import start_of_day
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт дневных итогов заправок (FuelDailyAggregate) по исходным записям'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            metavar='ДД.ММ.ГГГГ',
+            help='Пересчитать только начиная с этой даты (по умолчанию — всё)'
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить итоги с исходными записями, ничего не меняя'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%d.%m.%Y').date()
+            except ValueError:
+                raise CommandError('--since: ожидается дата в формате ДД.ММ.ГГГГ')
+
+        if options['check']:
+            self.check_totals(since)
+            return
+
+        self.stdout.write('🔄 Пересчёт дневных итогов заправок...')
+        result = FuelAggregateService.rebuild(since=since)
+        # Кэшированные отчёты бота считались по прежним итогам
+        invalidate_all_reports()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Готово: удалено строк {result['deleted']}, создано {result['created']}; "
+            f"заправок {result['records']}, литров {result['liters']:.2f}"
+        ))
+
+    def check_totals(self, since):
+        records = FuelRecord.objects.all()
+        aggregates = FuelDailyAggregate.objects.all()
+        if since:
+            records = records.filter(filled_at__gte=start_of_day(since))
+            aggregates = aggregates.filter(day__gte=since)
+
+        expected = records.aggregate(total=Sum('liters'), cnt=Count('id'))
+        actual = aggregates.totals()
+        expected_total = expected['total'] or 0
+        self.stdout.write(f"📋 Записи: {expected['cnt']} заправок, {expected_total:.2f} л")
+        self.stdout.write(f"📊 Итоги: {actual['cnt']} заправок, {actual['total']:.2f} л")
+        if expected['cnt'] == actual['cnt'] and expected_total == actual['total']:
+            self.stdout.write(self.style.SUCCESS('✅ Итоги совпадают с записями'))
+        else:
+            self.stdout.write(self.style.ERROR('❌ Расхождение: выполните команду без --check'))
@@ -0,0 +1,54 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from core.clients.google_sheets_client import InMemoryGoogleSheetsClient
+from core.services.google_sheets_outbox_service import GoogleSheetsOutboxWorker
+
+
+class Command(BaseCommand):
+    help = 'Фоновая выгрузка очереди заправок в Google Sheets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выгрузить всё, что готово к отправке, и завершиться'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Не обращаться к Google и не менять очередь в БД: строки пишутся в память (проверка очереди)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Максимум записей в одном пакете'
+        )
+        parser.add_argument(
+            '--flush-interval',
+            type=int,
+            help='Максимальная задержка неполного пакета, секунд'
+        )
+
+    def handle(self, *args, **options):
+        client = InMemoryGoogleSheetsClient() if options['dry_run'] else None
+        worker = GoogleSheetsOutboxWorker(
+            client=client,
+            batch_size=options['batch_size'],
+            flush_interval=options['flush_interval'],
+            dry_run=options['dry_run'],
+        )
+
+        if not options['once']:
+            self.stdout.write("🔄 Выгрузка очереди в Google Sheets запущена...")
+            try:
+                asyncio.run(worker.run_forever())
+            except KeyboardInterrupt:
+                self.stdout.write("⏹ Остановлено")
+            return
+
+        sent = asyncio.run(worker.drain())
+        self.stdout.write(self.style.SUCCESS(f"✅ Выгружено записей: {sent}"))
+        if client is not None:
+            self.stdout.write(f"📊 Запросов к таблице: {client.calls}")
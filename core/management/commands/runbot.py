@@ -1,4 +1,5 @@
-# core/management/commands/runbot.py
+import asyncio
+
 from django.core.management.base import BaseCommand
 
 from core.refuel_bot.main import run_bot
@@ -7,6 +8,20 @@ from core.refuel_bot.main import run_bot
 class Command(BaseCommand):
     help = "Run Telegram bot"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--delete-webhook",
+            action="store_true",
+            help="Снять вебхук в Telegram (возврат к long polling)",
+        )
+
     def handle(self, *args, **options):
+        if options["delete_webhook"]:
+            from core.refuel_bot.webhook import delete_webhook
+
+            asyncio.run(delete_webhook())
+            self.stdout.write("Telegram webhook deleted")
+            return
+
         self.stdout.write("Starting Telegram bot...")
         run_bot()
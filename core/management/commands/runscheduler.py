@@ -0,0 +1,63 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import ScheduledJobRun
+from core.services.scheduler_service import JobScheduler, get_default_jobs
+
+
+class Command(BaseCommand):
+    help = 'Планировщик фоновых задач: синхронизация с 1С и Google Sheets, архивация регионов, отчёты'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='Показать зарегистрированные задачи и их последние запуски'
+        )
+        parser.add_argument(
+            '--run',
+            metavar='JOB',
+            help='Выполнить одну задачу сейчас (под блокировкой, с записью в историю) и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        scheduler = JobScheduler(get_default_jobs())
+
+        if options['list']:
+            self.list_jobs(scheduler)
+            return
+
+        if options['run']:
+            job = scheduler.jobs.get(options['run'])
+            if job is None:
+                raise CommandError(
+                    f"Неизвестная задача {options['run']}, доступны: {', '.join(scheduler.jobs)}"
+                )
+            run = asyncio.run(scheduler.run_job(job))
+            style = self.style.SUCCESS if run.status == ScheduledJobRun.Status.SUCCESS else self.style.ERROR
+            self.stdout.write(style(f"{job.name}: {run.get_status_display()} за {run.duration} с"))
+            if run.phases:
+                self.stdout.write(f"⏱ Этапы: {run.phases}")
+            if run.error:
+                self.stdout.write(f"❌ {run.error}")
+            return
+
+        self.stdout.write(f"⏰ Планировщик запущен, задачи: {', '.join(scheduler.jobs)}")
+        try:
+            asyncio.run(scheduler.run_forever())
+        except KeyboardInterrupt:
+            self.stdout.write("⏹ Остановлено")
+
+    def list_jobs(self, scheduler):
+        self.stdout.write("📋 Задачи планировщика:")
+        for job in scheduler.jobs.values():
+            last_run = ScheduledJobRun.objects.for_job(job.name).first()
+            last = (
+                f"{last_run.started_at:%d.%m.%Y %H:%M} — {last_run.get_status_display()}"
+                if last_run else "не запускалась"
+            )
+            self.stdout.write(
+                f"  • {job.name}: каждые {job.interval // 60} мин, таймаут {job.timeout // 60} мин; "
+                f"последний запуск: {last}"
+            )
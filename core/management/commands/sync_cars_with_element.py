@@ -13,7 +13,7 @@ class Command(BaseCommand):
         parser.add_argument(
             "--force",
             action="store_true",
-            help="Принудительная синхронизация независимо от расписания",
+            help="Принудительная синхронизация: выгрузка скачивается целиком, даже если 1С отвечает «не изменилась»",
         )
         parser.add_argument(
             "--check-only",
@@ -25,6 +25,11 @@ class Command(BaseCommand):
             action="store_true",
             help="Показать пример данных без синхронизации",
         )
+        parser.add_argument(
+            "--sharded",
+            action="store_true",
+            help="Выгружать автомобили по ИНН владельцев параллельными запросами",
+        )
 
     def handle(self, *args, **options):
         asyncio.run(self.async_handle(*args, **options))
@@ -94,7 +99,9 @@ class Command(BaseCommand):
                     return
 
                 # =================== СИНХРОНИЗАЦИЯ ===================
-                stats = await client.sync_with_database()
+                stats = await client.sync_with_database(
+                    sharded=options["sharded"] or None, force=options["force"]
+                )
                 message = self._format_stats_message(stats)
                 self.stdout.write(self.style.SUCCESS(f"✅ {message}"))
                 await log_sync_success(message, stats)
@@ -121,6 +128,12 @@ class Command(BaseCommand):
             parts.append(f"регионов обновлено: {stats['regions_updated']}")
         if stats.get("errors", 0) > 0:
             parts.append(f"ошибок: {stats['errors']}")
+        if stats.get("failed_shards", 0) > 0:
+            parts.append(f"не выгружено ИНН: {stats['failed_shards']}")
+        if stats.get("not_modified", 0) > 0:
+            parts.append(f"выгрузок без изменений в 1С: {stats['not_modified']}")
+        if stats.get("skipped", 0) > 0:
+            parts.append(f"без изменений: {stats['skipped']}")
 
         parts.append(f"всего обработано: {stats['total_processed']}")
 
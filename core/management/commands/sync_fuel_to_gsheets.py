@@ -2,6 +2,7 @@ import asyncio
 
 from django.core.management.base import BaseCommand
 
+from core.clients.google_sheets_limiter import sheets_limiter
 from core.services.google_sheets_service import FuelRecordGoogleSheetsService
 
 
@@ -14,6 +15,11 @@ class Command(BaseCommand):
             action='store_true',
             help='Полная синхронизация всех записей'
         )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Обновить изменённые записи с прошлой синхронизации (новые — через очередь выгрузки)'
+        )
         parser.add_argument(
             '--record-ids',
             type=str,
@@ -32,6 +38,9 @@ class Command(BaseCommand):
             if options['full_sync']:
                 # Полная синхронизация
                 result = await service.sync_all_records()
+            elif options['incremental']:
+                # Изменённые записи; новые ставятся в очередь выгрузки
+                result = await service.sync_incremental()
             elif options['record_ids']:
                 # Синхронизация конкретных записей
                 record_ids = [int(id.strip()) for id in options['record_ids'].split(',')]
@@ -53,3 +62,10 @@ class Command(BaseCommand):
                 
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"❌ Ошибка синхронизации: {e}"))
+
+        stats = sheets_limiter.get_stats()
+        if stats:
+            self.stdout.write(
+                "📈 Запросы к API: "
+                + ", ".join(f"{name}={value}" for name, value in sorted(stats.items()))
+            )
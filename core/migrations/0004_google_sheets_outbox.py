@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_user_phone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoogleSheetsOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'Ожидает выгрузки'), ('SENT', 'Выгружено'), ('FAILED', 'Ошибка')], default='PENDING', max_length=20, verbose_name='Статус')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Следующая попытка')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Выгружено')),
+                ('fuel_record', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gsheets_outbox', to='core.fuelrecord', verbose_name='Запись о заправке')),
+            ],
+            options={
+                'verbose_name': 'Выгрузка в Google Sheets',
+                'verbose_name_plural': 'Очередь выгрузки в Google Sheets',
+                'db_table': 'google_sheets_outbox',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='google_shee_status_e71963_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_google_sheets_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoogleSheetsSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sheet_name', models.CharField(max_length=200, unique=True, verbose_name='Лист')),
+                ('last_record_id', models.BigIntegerField(default=0, verbose_name='Последняя выгруженная запись')),
+                ('last_updated_at', models.DateTimeField(blank=True, null=True, verbose_name='Изменения учтены по')),
+                ('synced_at', models.DateTimeField(auto_now=True, verbose_name='Синхронизировано')),
+            ],
+            options={
+                'verbose_name': 'Состояние синхронизации Google Sheets',
+                'verbose_name_plural': 'Состояния синхронизации Google Sheets',
+                'db_table': 'google_sheets_sync_state',
+            },
+        ),
+        migrations.CreateModel(
+            name='GoogleSheetsRowMapping',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sheet_name', models.CharField(max_length=200, verbose_name='Лист')),
+                ('row_number', models.PositiveIntegerField(verbose_name='Номер строки')),
+                ('synced_at', models.DateTimeField(auto_now=True, verbose_name='Синхронизировано')),
+                ('fuel_record', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gsheets_rows', to='core.fuelrecord', verbose_name='Запись о заправке')),
+            ],
+            options={
+                'verbose_name': 'Строка Google Sheets',
+                'verbose_name_plural': 'Строки Google Sheets',
+                'db_table': 'google_sheets_row_mapping',
+                'constraints': [models.UniqueConstraint(fields=('sheet_name', 'fuel_record'), name='unique_gsheets_row_per_record')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_google_sheets_sync_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='sync_fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='Отпечаток данных 1С'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:32
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_car_sync_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledJobRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_name', models.CharField(max_length=100, verbose_name='Задача')),
+                ('status', models.CharField(choices=[('RUNNING', 'Выполняется'), ('SUCCESS', 'Успешно'), ('FAILED', 'Ошибка'), ('TIMEOUT', 'Превышено время'), ('SKIPPED', 'Пропущено (выполняется в другом процессе)')], default='RUNNING', max_length=20, verbose_name='Статус')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Начало')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Окончание')),
+                ('duration', models.FloatField(blank=True, null=True, verbose_name='Длительность, с')),
+                ('phases', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Этапы')),
+                ('result', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Итог')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('hostname', models.CharField(blank=True, max_length=255, verbose_name='Хост')),
+            ],
+            options={
+                'verbose_name': 'Запуск задачи',
+                'verbose_name_plural': 'История запусков задач',
+                'db_table': 'scheduled_job_run',
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['job_name', '-started_at'], name='scheduled_j_job_nam_fbb8ee_idx')],
+            },
+        ),
+    ]
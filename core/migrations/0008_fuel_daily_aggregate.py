@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_fuel_daily_aggregates(apps, schema_editor):
+    """Начальное заполнение итогов по уже внесённым заправкам"""
+    FuelRecord = apps.get_model('core', 'FuelRecord')
+    FuelDailyAggregate = apps.get_model('core', 'FuelDailyAggregate')
+    rows = (
+        FuelRecord.objects.order_by()
+        .annotate(bucket_day=TruncDate('filled_at'), bucket_zone=F('employee__zone'))
+        .values('bucket_day', 'car_id', 'employee_id', 'historical_region_id', 'bucket_zone', 'fuel_type', 'source')
+        .annotate(liters_sum=Sum('liters'), records=Count('id'))
+    )
+    FuelDailyAggregate.objects.bulk_create(
+        (
+            FuelDailyAggregate(
+                day=row['bucket_day'],
+                car_id=row['car_id'],
+                employee_id=row['employee_id'],
+                historical_region_id=row['historical_region_id'],
+                zone_id=row['bucket_zone'],
+                fuel_type=row['fuel_type'],
+                source=row['source'],
+                total_liters=row['liters_sum'],
+                record_count=row['records'],
+            )
+            for row in rows.iterator(chunk_size=1000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_scheduled_job_run'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FuelDailyAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('fuel_type', models.CharField(max_length=20, verbose_name='Тип топлива')),
+                ('source', models.CharField(max_length=50, verbose_name='Способ заправки')),
+                ('total_liters', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Литров')),
+                ('record_count', models.PositiveIntegerField(default=0, verbose_name='Заправок')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('car', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fuel_aggregates', to='core.car', verbose_name='Автомобиль')),
+                ('employee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fuel_aggregates', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник (заправщик)')),
+                ('historical_region', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.region', verbose_name='Регион (на момент заправки)')),
+                ('zone', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.zone', verbose_name='Зона')),
+            ],
+            options={
+                'verbose_name': 'Дневной итог заправок',
+                'verbose_name_plural': 'Дневные итоги заправок',
+                'db_table': 'fuel_daily_aggregates',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['day'], name='fuel_daily__day_43d921_idx'), models.Index(fields=['car', 'day'], name='fuel_daily__car_id_558c4f_idx'), models.Index(fields=['employee', 'day'], name='fuel_daily__employe_ed3369_idx'), models.Index(fields=['historical_region', 'day'], name='fuel_daily__histori_76a089_idx'), models.Index(fields=['zone', 'day'], name='fuel_daily__zone_id_35a0e3_idx')],
+            },
+        ),
+        migrations.RunPython(fill_fuel_daily_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:55
+
+import logging
+
+from django.db import migrations, models
+
+from core.refuel_bot.utils.validate_state_plate import normalize_plate_input
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def fill_normalized_plates(apps, schema_editor):
+    """
+    Заполняет normalized_plate. Если у нескольких активных автомобилей один
+    госномер, он достаётся последнему обновлённому, у остальных остаётся
+    пустым (как при сохранении дубликата) — их статус не меняется.
+    """
+    Car = apps.get_model('core', 'Car')
+    active_plates = set()
+    to_update = []
+    cars = Car.objects.order_by('-updated_at', '-id').only('id', 'code', 'state_number', 'is_active', 'status')
+    for car in cars.iterator(chunk_size=BATCH_SIZE):
+        plate = normalize_plate_input(car.state_number) or None
+        if plate and car.is_active and car.status != 'АРХИВ':
+            if plate in active_plates:
+                logger.warning(
+                    "Дубликат госномера %s: у автомобиля %s (id=%s) нормализованный госномер не заполнен",
+                    plate, car.code, car.id
+                )
+                plate = None
+            else:
+                active_plates.add(plate)
+        car.normalized_plate = plate
+        to_update.append(car)
+    Car.objects.bulk_update(to_update, ['normalized_plate'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_fuel_daily_aggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='normalized_plate',
+            field=models.CharField(blank=True, editable=False, null=True, max_length=20, verbose_name='Госномер для поиска'),
+        ),
+        migrations.RunPython(fill_normalized_plates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['normalized_plate'], name='cars_normali_2f5ead_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='car',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True), models.Q(('status', 'АРХИВ'), _negated=True)), fields=('normalized_plate',), include=('id', 'model', 'region'), name='cars_active_plate_uniq', violation_error_message='Активный автомобиль с таким госномером уже существует'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:03
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_buckets(apps, schema_editor):
+    """Сливает строки итогов с одинаковым ключом в одну (с наименьшим id)"""
+    FuelDailyAggregate = apps.get_model('core', 'FuelDailyAggregate')
+    duplicates = (
+        FuelDailyAggregate.objects.order_by()
+        .values('day', 'car_id', 'employee_id', 'historical_region_id', 'zone_id', 'fuel_type', 'source')
+        .annotate(rows=Count('id'), keep_id=Min('id'), liters=Sum('total_liters'), records=Sum('record_count'))
+        .filter(rows__gt=1)
+    )
+    for group in list(duplicates):
+        keep_id = group.pop('keep_id')
+        liters, records = group.pop('liters'), group.pop('records')
+        group.pop('rows')
+        FuelDailyAggregate.objects.filter(**group).exclude(id=keep_id).delete()
+        FuelDailyAggregate.objects.filter(id=keep_id).update(total_liters=liters, record_count=records)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_car_normalized_plate'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fueldailyaggregate',
+            name='record_count',
+            field=models.IntegerField(default=0, verbose_name='Заправок'),
+        ),
+        migrations.RunPython(merge_duplicate_buckets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='fueldailyaggregate',
+            constraint=models.UniqueConstraint(models.F('day'), models.F('car'), django.db.models.functions.comparison.Coalesce('employee', 0), django.db.models.functions.comparison.Coalesce('historical_region', 0), django.db.models.functions.comparison.Coalesce('zone', 0), models.F('fuel_type'), models.F('source'), name='fuel_daily_aggregates_bucket_uniq'),
+        ),
+    ]
@@ -3,7 +3,14 @@ from .region import Region
 from .zone import Zone
 from .car import Car
 from .fuel import FuelRecord
+from .fuel_aggregate import FuelDailyAggregate
 from .system_log import SystemLog
+from .google_sheets import GoogleSheetsOutbox, GoogleSheetsRowMapping, GoogleSheetsSyncState
+from .scheduler import ScheduledJobRun
 
 
-__all__ = ["User", "Region", "Zone", "Car", "FuelRecord", "SystemLog"]
+__all__ = [
+    "User", "Region", "Zone", "Car", "FuelRecord", "FuelDailyAggregate", "SystemLog",
+    "GoogleSheetsOutbox", "GoogleSheetsRowMapping", "GoogleSheetsSyncState",
+    "ScheduledJobRun",
+]
@@ -1,16 +1,30 @@
+import logging
+
 from datetime import timedelta
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.db.models import Q, Count, Avg, Sum, QuerySet, ExpressionWrapper, FloatField, Max, Min
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from core.refuel_bot.utils.validate_state_plate import normalize_plate_input
+
+
+logger = logging.getLogger(__name__)
+
+# Сколько автомобилей архивировать/восстанавливать одним UPDATE
+ARCHIVE_BATCH_SIZE = 1000
+# Условие активного автомобиля: то же, что в CarQuerySet.active(), — иначе
+# планировщик не применит частичный индекс по госномеру
+ACTIVE_CAR_CONDITION = Q(is_active=True) & ~Q(status="АРХИВ")
+
 
 class CarQuerySet(QuerySet):
     """Кастомный QuerySet для модели Car"""
     
     def active(self):
         """Только активные автомобили (не архивные и Activity=True)"""
-        return self.filter(is_active=True).exclude(status="АРХИВ")
+        return self.filter(ACTIVE_CAR_CONDITION)
     
     def archived(self):
         """Архивные автомобили"""
@@ -49,6 +63,32 @@ class CarQuerySet(QuerySet):
         """Поиск по госномеру (точное совпадение)"""
         return self.filter(state_number=state_number)
     
+    def by_plate(self, plate):
+        """
+        Активный автомобиль по госномеру в любом написании (пробелы, регистр,
+        латиница) — поиск по уникальному частичному индексу cars_active_plate_uniq.
+        """
+        return self.active().filter(normalized_plate=normalize_plate_input(plate))
+
+    def find_by_plate(self, plate, fields=("id", "normalized_plate", "model", "region_id"), with_archived=False):
+        """
+        Первый (единственный) активный автомобиль по госномеру или None.
+        Поля по умолчанию есть в индексе: в PostgreSQL — index-only scan.
+        Без сортировки first(): ORDER BY не нужен для уникального ключа.
+        with_archived=True — если активного нет, последний обновлённый архивный.
+        """
+        car = next(iter(self.by_plate(plate).order_by().only(*fields)[:1]), None)
+        if car is None and with_archived:
+            # Среди архивных номер не уникален
+            car = (
+                self.archived()
+                .filter(normalized_plate=normalize_plate_input(plate))
+                .order_by("-updated_at", "-id")
+                .only(*fields)
+                .first()
+            )
+        return car
+
     def search_by_state_number(self, state_number_part):
         """Поиск по части госномера"""
         return self.filter(state_number__icontains=state_number_part)
@@ -239,6 +279,67 @@ class CarQuerySet(QuerySet):
             'vin_duplicates': list(vin_duplicates)
         }
     
+    def _set_archived_by_ids(self, rows, archived: bool, batch_size: int) -> list[str]:
+        """
+        Меняет архивность автомобилей по списку (id, code): один UPDATE на пакет.
+        Возвращает коды только тех автомобилей, которые действительно изменены.
+        """
+        now = timezone.now()
+        # Условие выборки проверяется заново — автомобиль мог измениться после неё
+        target = self.model.objects.active() if archived else self.model.objects.archived()
+        changed = []
+        for start in range(0, len(rows), batch_size):
+            batch_ids = [car_id for car_id, code in rows[start:start + batch_size]]
+            with transaction.atomic():
+                # Строки под условием блокируются до UPDATE: изменятся ровно они
+                locked = list(target.filter(id__in=batch_ids).select_for_update().values_list("id", "code"))
+                if not locked:
+                    continue
+                self.model.objects.filter(id__in=[car_id for car_id, code in locked]).update(
+                    status="АРХИВ" if archived else "АКТИВЕН",
+                    is_active=not archived,
+                    sync_fingerprint="",
+                    updated_at=now,
+                )
+            changed.extend(code for car_id, code in locked)
+        return changed
+
+    def archive_all(self, batch_size=ARCHIVE_BATCH_SIZE) -> list[str]:
+        """Переводит активные автомобили выборки в архив. Возвращает их коды."""
+        rows = list(self.active().order_by().values_list("id", "code"))
+        return self._set_archived_by_ids(rows, archived=True, batch_size=batch_size)
+
+    def restore_all(self, batch_size=ARCHIVE_BATCH_SIZE) -> list[str]:
+        """
+        Восстанавливает архивные автомобили выборки. Возвращает их коды.
+        Автомобиль, госномер которого уже у активного, не восстанавливается.
+        """
+        taken = set(
+            self.model.objects.active().exclude(normalized_plate=None).values_list("normalized_plate", flat=True)
+        )
+        rows = []
+        for car_id, code, plate in self.archived().order_by().values_list("id", "code", "normalized_plate"):
+            if plate in taken:
+                continue
+            if plate:
+                taken.add(plate)
+            rows.append((car_id, code))
+        return self._set_archived_by_ids(rows, archived=False, batch_size=batch_size)
+
+    def archive_missing(self, codes, batch_size=ARCHIVE_BATCH_SIZE) -> list[str]:
+        """
+        Архивирует активные автомобили, коды которых отсутствуют в codes.
+        Вместо exclude(code__in=<десятки тысяч кодов>) — anti-join в памяти
+        по списку (id, code) активных автомобилей.
+        """
+        codes = set(codes)
+        rows = [
+            (car_id, code)
+            for car_id, code in self.active().order_by().values_list("id", "code").iterator()
+            if code not in codes
+        ]
+        return self._set_archived_by_ids(rows, archived=True, batch_size=batch_size)
+
     def create_car(self, code, state_number, model, **extra_fields):
         """
         Создание автомобиля с проверкой на архивность и дубликаты.
@@ -256,7 +357,7 @@ class CarQuerySet(QuerySet):
         if self.active().filter(code=code).exists():
             raise ValueError(f"Активный автомобиль с кодом {code} уже существует")
         
-        if self.active().filter(state_number=state_number).exists():
+        if self.active().filter(normalized_plate=normalize_plate_input(state_number)).exists():
             raise ValueError(f"Активный автомобиль с госномером {state_number} уже существует")
         
         # Проверяем уникальность VIN среди активных
@@ -289,6 +390,12 @@ class Car(models.Model):
     state_number = models.CharField(
         max_length=20,
         verbose_name="Гос. номер")
+    normalized_plate = models.CharField(
+        max_length=20,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Госномер для поиска")
     model = models.CharField(
         max_length=100,
         verbose_name="Марка, модель")
@@ -319,6 +426,12 @@ class Car(models.Model):
         default="",
         verbose_name="Статус"        
     )
+    sync_fingerprint = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        editable=False,
+        verbose_name="Отпечаток данных 1С")
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name="Дата создания")
@@ -333,8 +446,21 @@ class Car(models.Model):
         indexes = [
             models.Index(fields=["code"]),
             models.Index(fields=["state_number"]),
+            models.Index(fields=["normalized_plate"]),
             models.Index(fields=["is_active", "status"])                        
         ]
+        constraints = [
+            # Поиск автомобиля ботом и отчётами: id, model, region_id берутся
+            # из самого индекса. Индексы с INCLUDE есть только в PostgreSQL —
+            # в SQLite (dev) Django это ограничение не создаёт
+            models.UniqueConstraint(
+                fields=["normalized_plate"],
+                condition=ACTIVE_CAR_CONDITION,
+                include=["id", "model", "region"],
+                name="cars_active_plate_uniq",
+                violation_error_message="Активный автомобиль с таким госномером уже существует",
+            ),
+        ]
         verbose_name = "Автомобиль"
         verbose_name_plural = "Автомобили"
         ordering = ["code"]
@@ -342,6 +468,39 @@ class Car(models.Model):
     def __str__(self):
         return f"{self.code} ({self.state_number})"
 
+    def save(self, *args, **kwargs):
+        """
+        Синхронизация с 1С пишет через bulk_create/bulk_update, поэтому любое
+        сохранение через save() — локальное изменение: сбрасываем отпечаток,
+        чтобы следующая синхронизация сверила автомобиль заново.
+
+        Если госномер уже у другого активного автомобиля, номер для поиска
+        остаётся пустым, как при повторе номера в выгрузке 1С, — иначе
+        сработает уникальный индекс cars_active_plate_uniq.
+        """
+        self.sync_fingerprint = ""
+        plate = normalize_plate_input(self.state_number) or None
+        if plate and not self.is_archived and Car.objects.by_plate(plate).exclude(pk=self.pk).exists():
+            logger.warning(f"⚠️ Госномер {plate} уже у активного автомобиля, {self.code} без поиска по номеру")
+            plate = None
+        self.normalized_plate = plate
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "sync_fingerprint", "normalized_plate"}
+        super().save(*args, **kwargs)
+
+    def clean(self):
+        """
+        Госномер уникален среди активных автомобилей. Поле normalized_plate
+        не редактируется в форме, поэтому ограничение проверяется здесь.
+        """
+        super().clean()
+        if self.is_archived:
+            return
+        plate = normalize_plate_input(self.state_number)
+        if plate and Car.objects.by_plate(plate).exclude(pk=self.pk).exists():
+            raise ValidationError({"state_number": "Активный автомобиль с таким госномером уже существует"})
+
     @property
     def is_archived(self):
         """Является ли автомобиль архивным"""
@@ -1,9 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Count, Sum, Avg, Max, Min
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from datetime import timedelta
 
+from core.utils.periods import date_range, resolve_period
+
 
 class FuelRecordQuerySet(models.QuerySet):
     """Кастомный QuerySet для модели FuelRecord"""
@@ -55,20 +57,15 @@ class FuelRecordQuerySet(models.QuerySet):
     
     def today(self):
         """Записи за сегодня"""
-        today = timezone.now().date()
-        return self.filter(filled_at__date=today)
+        return self.filter(**resolve_period("today").as_filter())
     
     def this_week(self):
         """Записи за текущую неделю"""
-        today = timezone.now().date()
-        start_of_week = today - timedelta(days=today.weekday())
-        return self.filter(filled_at__date__gte=start_of_week)
+        return self.filter(**resolve_period("this_week").as_filter())
     
     def this_month(self):
         """Записи за текущий месяц"""
-        today = timezone.now().date()
-        start_of_month = today.replace(day=1)
-        return self.filter(filled_at__date__gte=start_of_month)
+        return self.filter(**resolve_period("this_month").as_filter())
     
     def with_related_data(self):
         """Оптимизация запросов с подгрузкой связанных данных"""
@@ -95,15 +92,28 @@ class FuelRecordQuerySet(models.QuerySet):
         )
     
     def by_period(self, start_date, end_date):
-        """Записи за указанный период"""
-        return self.filter(filled_at__date__range=[start_date, end_date])
+        """Записи за указанный период (даты включительно)"""
+        return self.filter(**date_range(start_date, end_date).as_filter())
     
     def find_suspicious_records(self, threshold_liters=400):
         """Поиск подозрительных записей (слишком большие объёмы)"""
         return self.filter(liters__gt=threshold_liters)
     
+    def _daily_aggregates(self):
+        """
+        Дневные итоги вместо исходных записей — только для выборки без фильтров,
+        иначе итоги не совпали бы с отфильтрованными записями
+        """
+        if self.query.has_filters():
+            return None
+        from core.models.fuel_aggregate import FuelDailyAggregate
+        return FuelDailyAggregate.objects.all()
+
     def group_by_car(self):
         """Группировка по автомобилям с агрегацией"""
+        aggregates = self._daily_aggregates()
+        if aggregates is not None:
+            return aggregates.group_by_car()
         return self.values('car__state_number', 'car__model').annotate(
             total_liters=Sum('liters'),
             record_count=Count('id'),
@@ -113,6 +123,9 @@ class FuelRecordQuerySet(models.QuerySet):
     
     def group_by_employee(self):
         """Группировка по сотрудникам с агрегацией"""
+        aggregates = self._daily_aggregates()
+        if aggregates is not None:
+            return aggregates.group_by_employee()
         return self.values('employee__username', 'employee__first_name', 'employee__last_name').annotate(
             total_liters=Sum('liters'),
             record_count=Count('id'),
@@ -121,6 +134,9 @@ class FuelRecordQuerySet(models.QuerySet):
     
     def group_by_region(self):
         """Группировка по регионам с агрегацией"""
+        aggregates = self._daily_aggregates()
+        if aggregates is not None:
+            return aggregates.group_by_region()
         return self.values('car__region__name').annotate(
             total_liters=Sum('liters'),
             record_count=Count('id'),
@@ -175,12 +191,14 @@ class FuelRecordQuerySet(models.QuerySet):
         if extra_fields.get('source') == 'CARD':
             extra_fields.setdefault('approved', True)
         
-        return self.create(
-            car=car,
-            employee=employee,
-            liters=liters_decimal,
-            **extra_fields
-        )
+        # Запись и её очередь выгрузки в Google Sheets (сигнал post_save) — одна транзакция
+        with transaction.atomic():
+            return self.create(
+                car=car,
+                employee=employee,
+                liters=liters_decimal,
+                **extra_fields
+            )
 
 
 class FuelRecord(models.Model):
@@ -329,4 +347,6 @@ class FuelRecord(models.Model):
                 self.historical_region = self.car.region
                 self.historical_department = self.car.department
         
-        super().save(*args, **kwargs)
+        # Запись и дневные итоги (сигналы post_save) — одна транзакция
+        with transaction.atomic():
+            super().save(*args, **kwargs)
@@ -0,0 +1,144 @@
+from django.db import models
+from django.db.models import Count, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, NullIf
+
+
+# Ключ строки итогов. Пустые связи сравниваются как 0: в уникальном индексе
+# NULL не равен NULL, и строки без заправщика или зоны дублировались бы
+BUCKET_FIELDS = ("day", "car", "employee", "historical_region", "zone", "fuel_type", "source")
+NULLABLE_BUCKET_FIELDS = ("employee", "historical_region", "zone")
+
+
+class FuelDailyAggregateQuerySet(models.QuerySet):
+    """Кастомный QuerySet для дневных итогов заправок"""
+
+    def by_period(self, start_date, end_date):
+        """Итоги за период (даты включительно)"""
+        return self.filter(day__range=[start_date, end_date])
+
+    def totals(self):
+        """Литры и число заправок в выборке: {'total': Decimal, 'cnt': int}"""
+        return self.aggregate(
+            total=Coalesce(Sum("total_liters"), 0, output_field=models.DecimalField()),
+            cnt=Coalesce(Sum("record_count"), 0),
+        )
+
+    def _grouped(self, *fields, **extra):
+        return self.values(*fields).annotate(
+            total_liters=Sum("total_liters"),
+            record_count=Sum("record_count"),
+            **extra,
+        ).annotate(
+            avg_liters=ExpressionWrapper(
+                F("total_liters") / NullIf(F("record_count"), 0), output_field=models.DecimalField()
+            ),
+        ).order_by("-total_liters")
+
+    def group_by_car(self):
+        """
+        Группировка по автомобилям (как FuelRecordQuerySet.group_by_car).
+        В итогах только дни, поэтому last_refuel (дата и время) берётся из заправок
+        """
+        from core.models.fuel import FuelRecord
+
+        last_refuel = FuelRecord.objects.filter(
+            car__state_number=OuterRef("car__state_number"), car__model=OuterRef("car__model")
+        ).order_by("-filled_at").values("filled_at")[:1]
+        return self._grouped("car__state_number", "car__model", last_refuel=Subquery(last_refuel))
+
+    def group_by_employee(self):
+        """Группировка по сотрудникам (как FuelRecordQuerySet.group_by_employee)"""
+        return self._grouped("employee__username", "employee__first_name", "employee__last_name")
+
+    def group_by_region(self):
+        """Группировка по текущим регионам автомобилей (как FuelRecordQuerySet.group_by_region)"""
+        return self.values("car__region__name").annotate(
+            total_liters=Sum("total_liters"),
+            record_count=Sum("record_count"),
+            car_count=Count("car", distinct=True),
+        ).order_by("-total_liters")
+
+
+class FuelDailyAggregate(models.Model):
+    """
+    Дневные итоги заправок: литры и число записей за день в разрезе
+    автомобиля, заправщика, региона (на момент заправки), зоны заправщика,
+    типа топлива и способа заправки.
+
+    Обновляется в той же транзакции, что и FuelRecord (core/signals.py),
+    пересчитывается командой rebuild_fuel_aggregates. Отчёты суммируют эти
+    строки вместо исходных заправок. Ключ уникален (fuel_daily_aggregates_bucket_uniq),
+    изменения применяются через INSERT ... ON CONFLICT DO UPDATE.
+    """
+
+    day = models.DateField(verbose_name="День")
+    car = models.ForeignKey(
+        "core.Car",
+        on_delete=models.CASCADE,
+        related_name="fuel_aggregates",
+        verbose_name="Автомобиль"
+    )
+    employee = models.ForeignKey(
+        "core.User",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="fuel_aggregates",
+        verbose_name="Сотрудник (заправщик)"
+    )
+    historical_region = models.ForeignKey(
+        "core.Region",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Регион (на момент заправки)"
+    )
+    # Текущая зона заправщика: при её смене строки переносятся (core/signals.py)
+    zone = models.ForeignKey(
+        "core.Zone",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Зона"
+    )
+    fuel_type = models.CharField(max_length=20, verbose_name="Тип топлива")
+    source = models.CharField(max_length=50, verbose_name="Способ заправки")
+    total_liters = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="Литров"
+    )
+    # Не Positive: приращение не должно теряться, даже если строка уже разошлась
+    # с заправками (исправляется rebuild_fuel_aggregates)
+    record_count = models.IntegerField(default=0, verbose_name="Заправок")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    objects = FuelDailyAggregateQuerySet.as_manager()
+
+    class Meta:
+        db_table = "fuel_daily_aggregates"
+        verbose_name = "Дневной итог заправок"
+        verbose_name_plural = "Дневные итоги заправок"
+        ordering = ["-day"]
+        indexes = [
+            models.Index(fields=["day"]),
+            models.Index(fields=["car", "day"]),
+            models.Index(fields=["employee", "day"]),
+            models.Index(fields=["historical_region", "day"]),
+            models.Index(fields=["zone", "day"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                *(
+                    Coalesce(field, 0) if field in NULLABLE_BUCKET_FIELDS else F(field)
+                    for field in BUCKET_FIELDS
+                ),
+                name="fuel_daily_aggregates_bucket_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day:%d.%m.%Y} — {self.total_liters} л ({self.record_count})"
@@ -0,0 +1,122 @@
+from datetime import timedelta
+
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class GoogleSheetsOutboxQuerySet(models.QuerySet):
+    """Кастомный QuerySet для очереди выгрузки в Google Sheets"""
+
+    def pending(self):
+        """Записи, ожидающие выгрузки"""
+        return self.filter(status=GoogleSheetsOutbox.Status.PENDING)
+
+    def ready(self):
+        """Записи, которые можно выгружать сейчас (с учётом паузы после ошибки)"""
+        return self.pending().filter(next_attempt_at__lte=timezone.now())
+
+    def purge_sent(self, days=7):
+        """Удаляет выгруженные записи старше N дней"""
+        cutoff = timezone.now() - timedelta(days=days)
+        return self.filter(status=GoogleSheetsOutbox.Status.SENT, sent_at__lt=cutoff).delete()
+
+
+class GoogleSheetsOutbox(models.Model):
+    """
+    Очередь выгрузки записей о заправках в Google Sheets.
+    Пишется в той же транзакции, что и FuelRecord; выгружается фоновым
+    воркером (manage.py run_gsheets_outbox) пакетами.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", _("Ожидает выгрузки")
+        SENT = "SENT", _("Выгружено")
+        FAILED = "FAILED", _("Ошибка")
+
+    fuel_record = models.ForeignKey(
+        "core.FuelRecord",
+        on_delete=models.CASCADE,
+        related_name="gsheets_outbox",
+        verbose_name="Запись о заправке"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name="Статус"
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Следующая попытка"
+    )
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Выгружено")
+
+    objects = GoogleSheetsOutboxQuerySet.as_manager()
+
+    class Meta:
+        db_table = "google_sheets_outbox"
+        verbose_name = "Выгрузка в Google Sheets"
+        verbose_name_plural = "Очередь выгрузки в Google Sheets"
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.fuel_record_id} — {self.get_status_display()}"
+
+
+class GoogleSheetsSyncState(models.Model):
+    """
+    Отметка последней синхронизации листа Google Sheets (high-watermark)
+    для инкрементального режима sync_fuel_to_gsheets.
+    """
+
+    sheet_name = models.CharField(max_length=200, unique=True, verbose_name="Лист")
+    last_record_id = models.BigIntegerField(default=0, verbose_name="Последняя выгруженная запись")
+    last_updated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Изменения учтены по"
+    )
+    synced_at = models.DateTimeField(auto_now=True, verbose_name="Синхронизировано")
+
+    class Meta:
+        db_table = "google_sheets_sync_state"
+        verbose_name = "Состояние синхронизации Google Sheets"
+        verbose_name_plural = "Состояния синхронизации Google Sheets"
+
+    def __str__(self):
+        return f"{self.sheet_name}: до #{self.last_record_id}"
+
+
+class GoogleSheetsRowMapping(models.Model):
+    """Номер строки листа, в которую выгружена запись о заправке."""
+
+    fuel_record = models.ForeignKey(
+        "core.FuelRecord",
+        on_delete=models.CASCADE,
+        related_name="gsheets_rows",
+        verbose_name="Запись о заправке"
+    )
+    sheet_name = models.CharField(max_length=200, verbose_name="Лист")
+    row_number = models.PositiveIntegerField(verbose_name="Номер строки")
+    synced_at = models.DateTimeField(auto_now=True, verbose_name="Синхронизировано")
+
+    class Meta:
+        db_table = "google_sheets_row_mapping"
+        verbose_name = "Строка Google Sheets"
+        verbose_name_plural = "Строки Google Sheets"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["sheet_name", "fuel_record"],
+                name="unique_gsheets_row_per_record"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.sheet_name}!{self.row_number} — {self.fuel_record_id}"
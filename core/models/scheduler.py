@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class ScheduledJobRunQuerySet(models.QuerySet):
+    """Кастомный QuerySet для истории запусков задач планировщика"""
+
+    def for_job(self, job_name):
+        return self.filter(job_name=job_name)
+
+    def failed(self):
+        return self.filter(
+            status__in=[ScheduledJobRun.Status.FAILED, ScheduledJobRun.Status.TIMEOUT]
+        )
+
+    def purge_older_than(self, days=30):
+        """Удаляет историю запусков старше N дней"""
+        cutoff = timezone.now() - timedelta(days=days)
+        return self.filter(started_at__lt=cutoff).delete()
+
+
+class ScheduledJobRun(models.Model):
+    """
+    Запуск задачи планировщика (manage.py runscheduler):
+    статус, длительность всего запуска и его этапов, итог задачи.
+    """
+
+    class Status(models.TextChoices):
+        RUNNING = "RUNNING", _("Выполняется")
+        SUCCESS = "SUCCESS", _("Успешно")
+        FAILED = "FAILED", _("Ошибка")
+        TIMEOUT = "TIMEOUT", _("Превышено время")
+        SKIPPED = "SKIPPED", _("Пропущено (выполняется в другом процессе)")
+
+    job_name = models.CharField(max_length=100, verbose_name="Задача")
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.RUNNING,
+        verbose_name="Статус"
+    )
+    started_at = models.DateTimeField(default=timezone.now, verbose_name="Начало")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Окончание")
+    duration = models.FloatField(null=True, blank=True, verbose_name="Длительность, с")
+    # {этап: длительность в секундах}
+    phases = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder, verbose_name="Этапы")
+    result = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder, verbose_name="Итог")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    hostname = models.CharField(max_length=255, blank=True, verbose_name="Хост")
+
+    objects = ScheduledJobRunQuerySet.as_manager()
+
+    class Meta:
+        db_table = "scheduled_job_run"
+        verbose_name = "Запуск задачи"
+        verbose_name_plural = "История запусков задач"
+        ordering = ["-started_at"]
+        indexes = [
+            models.Index(fields=["job_name", "-started_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.job_name} [{self.started_at:%d.%m %H:%M}] — {self.get_status_display()}"
@@ -1,7 +1,6 @@
 # core/bot/handlers/fuel_input.py
 from decimal import Decimal, InvalidOperation
 import logging
-from asgiref.sync import sync_to_async
 from django.utils import timezone as dj_tz
 from telegram import Update
 from telegram.ext import (
@@ -19,6 +18,10 @@ from core.refuel_bot.keyboards.cancel_keyboard import CancelKeyboard
 from core.refuel_bot.keyboards.main_keyboard import MainKeyboard
 from core.refuel_bot.keyboards.refuel_method_keyboard import RefuelMethodKeyboard
 from core.refuel_bot.keyboards.fuel_type_keyboard import FuelTypeKeyboard
+from core.refuel_bot.utils.car_index import car_index
+from core.refuel_bot.utils.db import db_sync_to_async
+from core.refuel_bot.utils.message_cleanup import message_cleaner
+from core.refuel_bot.utils.persistence import SharedConversationHandler, is_persistence_enabled
 from core.refuel_bot.utils.validate_state_plate import is_valid_plate, normalize_plate_input
 from core.models import Car, FuelRecord
 
@@ -38,20 +41,17 @@ main_kb = MainKeyboard()
 
 
 # --- DB helpers ---
-@sync_to_async
-def find_car_by_state_number(state_number: str):
-    return Car.objects.filter(
-        state_number__iexact=state_number,
-        is_active=True
-    ).first()
+async def find_car_by_state_number(state_number: str):
+    """Поиск активного автомобиля по индексу госномеров в памяти."""
+    return await car_index.find(state_number)
 
 
-@sync_to_async
+@db_sync_to_async
 def get_car_by_id(cid: int):
     return Car.objects.filter(id=cid).first()
 
 
-@sync_to_async
+@db_sync_to_async
 def create_fuel_record(
     *, car_id: int, user_id: int, liters: Decimal, fuel_type: str,
     source: str, filled_at, approved: bool, notes: str = ""):
@@ -60,7 +60,8 @@ def create_fuel_record(
     User = get_user_model()
 
     try:
-        car = Car.objects.get(id=car_id)
+        # region нужен для исторических данных записи
+        car = Car.objects.select_related("region").get(id=car_id)
         employee = User.objects.get(id=user_id)
     except (Car.DoesNotExist, User.DoesNotExist) as e:
         logger.error(f"Car or User not found: {e}")
@@ -78,9 +79,9 @@ def create_fuel_record(
     )
 
 
-@sync_to_async
 def user_in_group(user, group_name: str) -> bool:
-    return user and user.groups.filter(name=group_name).exists()
+    """Группы уже загружены в context.user (access_middleware), БД не нужна."""
+    return bool(user) and user.has_group(group_name)
 
 
 # Helper for state stack ("Back" functionality)
@@ -99,22 +100,22 @@ def pop_state(context: ContextTypes.DEFAULT_TYPE):
 
 
 # --- Удаление сообщений ---
+# Удаление идёт в фоне (message_cleaner): обработчик отвечает пользователю сразу,
+# удаления одного чата объединяются в один запрос deleteMessages
+def delete_message_later(context: ContextTypes.DEFAULT_TYPE, message):
+    if message:
+        message_cleaner.schedule(context.bot, message.chat_id, message.message_id)
+
+
 async def delete_last_bot_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     mid = context.user_data.pop("last_bot_mid", None)
-    if not mid:
-        return
-    try:
-        await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=mid)
-    except Exception:
-        pass  # Сообщение уже удалено или недоступно
+    if mid and update.effective_chat:
+        message_cleaner.schedule(context.bot, update.effective_chat.id, mid)
 
 
-async def try_delete_user_message(update: Update):
-    try:
-        if update and update.message:
-            await update.message.delete()
-    except Exception:
-        pass  # В личных чатах бот не может удалять сообщения пользователей
+async def try_delete_user_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update and update.message:
+        delete_message_later(context, update.message)
 
 
 def remember_bot_message(context: ContextTypes.DEFAULT_TYPE, msg):
@@ -148,22 +149,33 @@ async def process_car_number(update: Update, context: ContextTypes.DEFAULT_TYPE)
     raw_text = update.effective_message.text or ""
     plate = normalize_plate_input(raw_text)
 
-    if not is_valid_plate(plate):
-        msg = await update.message.reply_text(
-            "Неверный формат госномера.\n"
-            "Допустимые примеры: АА12345, А123ВС45, А123ВС456.\n"
-            "Используйте только кирилицу и цифры.",
-            reply_markup=cancel_kb.get()
-        )
-        remember_bot_message(context, msg)
-        return WAITING_CAR
-
     car = await find_car_by_state_number(plate)
     if not car:
-        msg = await update.message.reply_text(
-            "Автомобиль с таким госномером не найден или не активен. Попробуйте ещё раз:",
-            reply_markup=cancel_kb.get()
-        )
+        valid = is_valid_plate(plate)
+        if valid:
+            text = "Автомобиль с таким госномером не найден или не активен."
+        else:
+            text = (
+                "Неверный формат госномера.\n"
+                "Допустимые примеры: АА12345, А123ВС45, А123ВС456.\n"
+                "Используйте только кирилицу и цифры."
+            )
+
+        # Предлагаем похожие номера, чтобы опечатку можно было исправить одним нажатием
+        suggestions = await car_index.suggest(plate)
+        if suggestions:
+            variants = "\n".join(
+                f"• {s.state_number} — {s.model or '—'}" + (f" ({s.region_name})" if s.region_name else "")
+                for s in suggestions
+            )
+            text += f"\n\nВозможно, вы имели в виду:\n{variants}\n\nВыберите вариант или введите госномер ещё раз:"
+            reply_markup = cancel_kb.get_with_options([s.state_number for s in suggestions])
+        else:
+            if valid:
+                text += " Попробуйте ещё раз:"
+            reply_markup = cancel_kb.get()
+
+        msg = await update.message.reply_text(text, reply_markup=reply_markup)
         remember_bot_message(context, msg)
         return WAITING_CAR
 
@@ -226,12 +238,9 @@ async def process_refuel_method(update: Update, context: ContextTypes.DEFAULT_TY
     # ----- Отмена -----
     if (is_cb and data.endswith(":cancel")) or (not is_cb and data == "❌ отмена"):
         if is_cb:
-            try:
-                await query.message.delete()
-            except Exception:
-                pass
+            delete_message_later(context, query.message)
         else:
-            await try_delete_user_message(update)
+            await try_delete_user_message(update, context)
             await delete_last_bot_message(update, context)
 
         context.user_data.clear()
@@ -244,12 +253,9 @@ async def process_refuel_method(update: Update, context: ContextTypes.DEFAULT_TY
     # ----- Назад -----
     if (is_cb and data.endswith(":back")) or (not is_cb and data == "🔙 назад"):
         if is_cb:
-            try:
-                await query.message.delete()
-            except Exception:
-                pass
+            delete_message_later(context, query.message)
         else:
-            await try_delete_user_message(update)
+            await try_delete_user_message(update, context)
             await delete_last_bot_message(update, context)
 
         prev = pop_state(context)
@@ -312,10 +318,7 @@ async def process_refuel_method(update: Update, context: ContextTypes.DEFAULT_TY
 
     # ----- УДАЛЯЕМ сообщение с выбором способа -----
     if is_cb:
-        try:
-            await query.message.delete()
-        except Exception as e:
-            logger.warning("Не удалось удалить сообщение с выбором способа: %s", e)
+        delete_message_later(context, query.message)
 
     # Переход к выбору типа топлива
     msg = await update.effective_chat.send_message(
@@ -346,13 +349,9 @@ async def process_fuel_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # ----- Отмена -----
     if (is_cb and data.endswith(":cancel")) or (not is_cb and data == "❌ отмена"):
         if is_cb:
-            try:
-                if query and query.message:
-                    await query.message.delete()
-            except Exception:
-                pass
+            delete_message_later(context, query.message)
         else:
-            await try_delete_user_message(update)
+            await try_delete_user_message(update, context)
             await delete_last_bot_message(update, context)
 
         context.user_data.clear()
@@ -365,12 +364,9 @@ async def process_fuel_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # ----- Назад -----
     if (is_cb and data.endswith(":back")) or (not is_cb and data == "🔙 назад"):
         if is_cb:
-            try:
-                await query.message.delete()
-            except Exception:
-                pass
+            delete_message_later(context, query.message)
         else:
-            await try_delete_user_message(update)
+            await try_delete_user_message(update, context)
             await delete_last_bot_message(update, context)
 
         prev = pop_state(context)
@@ -486,7 +482,7 @@ async def process_fuel_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # --- Обработчики "Отмена" и "Назад" ---
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = getattr(context, "user", None)
-    await try_delete_user_message(update)
+    await try_delete_user_message(update, context)
     await delete_last_bot_message(update, context)
     context.user_data.clear()
     await update.effective_chat.send_message(
@@ -498,7 +494,7 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def back_from_car(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = getattr(context, "user", None)
-    await try_delete_user_message(update)
+    await try_delete_user_message(update, context)
     await delete_last_bot_message(update, context)
     context.user_data.clear()
     await update.effective_chat.send_message(
@@ -509,7 +505,7 @@ async def back_from_car(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def back_from_liters(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await try_delete_user_message(update)
+    await try_delete_user_message(update, context)
     await delete_last_bot_message(update, context)
     msg = await update.effective_chat.send_message(
         "Возврат к вводу госномера. Введите госномер:",
@@ -521,7 +517,7 @@ async def back_from_liters(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def back_from_refuel_method(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка кнопки 'Назад' при выборе типа топлива"""
-    await try_delete_user_message(update)
+    await try_delete_user_message(update, context)
     await delete_last_bot_message(update, context)
 
     msg = await update.effective_chat.send_message(
@@ -533,7 +529,7 @@ async def back_from_refuel_method(update: Update, context: ContextTypes.DEFAULT_
 
 
 # --- Conversation Handler ---
-fuel_conv_handler = ConversationHandler(
+fuel_conv_handler = SharedConversationHandler(
     entry_points=[MessageHandler(filters.Regex("^⛽ Добавить$"), start_fuel_input)],
     states={
         WAITING_CAR: [
@@ -563,7 +559,8 @@ fuel_conv_handler = ConversationHandler(
     per_user=True,
     per_chat=True,
     per_message=False,
-    name="fuel_conversation"
+    name="fuel_conversation",
+    persistent=is_persistence_enabled(),
 )
 
 
@@ -573,7 +570,7 @@ async def fuel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not user:
         await update.effective_chat.send_message("⛔ Сессия истекла.")
         return ConversationHandler.END
-    if not await user_in_group(user, "Заправщик"):
+    if not user_in_group(user, "Заправщик"):
         await update.message.reply_text("⛔ Доступ запрещён.")
         return
 
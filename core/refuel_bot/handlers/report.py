@@ -1,11 +1,16 @@
 # core/bot/handlers/report.py
-from datetime import date, timedelta, datetime
-from asgiref.sync import sync_to_async
+from datetime import datetime
 from telegram import Update, ReplyKeyboardMarkup
+from telegram.constants import ChatAction
 from telegram.ext import MessageHandler, filters, ConversationHandler, ContextTypes
-from django.db.models import Sum, Count, Q
-
-from core.models import FuelRecord, Car, Region, Zone, User
+from django.db.models import Q
+
+from core.models import FuelDailyAggregate, Car, Region, Zone, User
+from core.refuel_bot.utils.db import db_sync_to_async
+from core.refuel_bot.utils.persistence import SharedConversationHandler, is_persistence_enabled
+from core.refuel_bot.utils.report_cache import period_dependencies, report_cache
+from core.refuel_bot.utils.report_files import build_report_files
+from core.utils.periods import date_range, resolve_period
 from core.refuel_bot.utils.validate_state_plate import normalize_plate_input, is_valid_plate
 
 
@@ -26,6 +31,7 @@ def kb_reports_period():
             ["📅 Сегодня", "📅 Вчера"],
             ["📅 Неделя", "📅 Месяц"],
             ["📅 Произвольная дата"],
+            ["📥 Excel", "📥 CSV"],
             ["🔙 Назад", "❌ Отмена"],
         ],
         resize_keyboard=True
@@ -37,67 +43,91 @@ def kb_reports_filters():
         [
             ["🚗 По машине", "👤 По заправщику"],
             ["🗺️ По региону", "📍 По зоне"],
+            ["📥 Excel", "📥 CSV"],
             ["🔙 Назад", "❌ Отмена"],
         ],
         resize_keyboard=True
     )
 
 
+# Кнопки периодов -> именованные периоды core.utils.periods
+PERIOD_BUTTONS = {
+    "📅 Сегодня": "today",
+    "📅 Вчера": "yesterday",
+    "📅 Неделя": "week",
+    "📅 Месяц": "month",
+}
+# Кнопки выгрузки последнего отчёта файлом
+FILE_BUTTONS = {
+    "📥 Excel": "xlsx",
+    "📥 CSV": "csv",
+}
+# Таймаут отправки файла в Telegram, секунд
+UPLOAD_TIMEOUT = 120
+# Пользователи, для которых сейчас собирается файл (один файл за раз)
+_exports_in_progress = set()
+
+
 # ===== Роль =====
-@sync_to_async
 def is_manager_or_admin(user):
     if not user:
         return False
     return user.is_superuser or any(g in {"Менеджер", "Администратор"} for g in user.group_names)
 
 
-# ===== Агрегаторы =====
-@sync_to_async
-def aggregate_period_text(start, end):
-    agg = FuelRecord.objects.filter(
-        filled_at__date__gte=start,
-        filled_at__date__lte=end
-    ).aggregate(total=Sum("liters"), cnt=Count("id"))
-    total = float(agg["total"] or 0)
-    cnt = int(agg["cnt"] or 0)
+def report_scope(user):
+    """Область видимости отчётов пользователя — часть ключа кэша отчётов"""
+    # Менеджеры и администраторы видят заправки всех зон и регионов
+    return "all" if is_manager_or_admin(user) else f"user:{getattr(user, 'id', None)}"
+
+
+# ===== Агрегаторы (по дневным итогам FuelDailyAggregate) =====
+def cached_totals(report, params, scope, dependencies, queryset):
+    """Литры и число записей: из кэша отчётов или по дневным итогам"""
+    agg = report_cache.get_or_compute(report, params, scope, dependencies, queryset.totals)
+    return float(agg["total"] or 0), int(agg["cnt"] or 0)
+
+
+@db_sync_to_async
+def aggregate_period_text(period, scope):
+    start, end = period.first_day, period.last_day
+    total, cnt = cached_totals(
+        "period", (start, end), scope, period_dependencies(start, end),
+        FuelDailyAggregate.objects.by_period(start, end),
+    )
     return f"📊 Отчёт за {start} — {end}\nВсего литров: {total:.1f} л\nЗаписей: {cnt}"
 
 
-@sync_to_async
-def aggregate_car_text(plate):
-    car = Car.objects.filter(state_number__iexact=plate).first()
+@db_sync_to_async
+def aggregate_car_text(plate, scope):
+    # Заправки архивного автомобиля тоже попадают в отчёт
+    car = Car.objects.find_by_plate(plate, fields=("id", "state_number"), with_archived=True)
     if not car:
         return None, "Автомобиль не найден."
-    agg = FuelRecord.objects.filter(car=car).aggregate(total=Sum("liters"), cnt=Count("id"))
-    total = float(agg["total"] or 0)
-    cnt = int(agg["cnt"] or 0)
+    total, cnt = cached_totals("car", car.id, scope, [("car", car.id)], FuelDailyAggregate.objects.filter(car=car))
     return car, f"🚗 {car.state_number} — всего {total:.1f} л, записей: {cnt}"
 
 
-@sync_to_async
-def aggregate_region_text(name):
+@db_sync_to_async
+def aggregate_region_text(name, scope):
     region = Region.objects.filter(name__iexact=name).first()
     if not region:
         return None, "Регион не найден."
-    agg = FuelRecord.objects.filter(car__region=region).aggregate(total=Sum("liters"), cnt=Count("id"))
-    total = float(agg["total"] or 0)
-    cnt = int(agg["cnt"] or 0)
+    total, cnt = cached_totals("region", region.id, scope, [("region", region.id)], FuelDailyAggregate.objects.filter(historical_region=region))
     return region, f"🗺️ {region.name} — всего {total:.1f} л, записей: {cnt}"
 
 
-@sync_to_async
-def aggregate_zone_text(text):
+@db_sync_to_async
+def aggregate_zone_text(text, scope):
     zone = Zone.objects.filter(Q(name__iexact=text) | Q(code__iexact=text)).first()
     if not zone:
         return None, "Зона не найдена."
-    agg = FuelRecord.objects.filter(employee__zone=zone).aggregate(total=Sum("liters"), cnt=Count("id"))
-    total = float(agg["total"] or 0)
-    cnt = int(agg["cnt"] or 0)
+    total, cnt = cached_totals("zone", zone.id, scope, [("zone", zone.id)], FuelDailyAggregate.objects.filter(zone=zone))
     return zone, f"📍 {zone.name} — всего {total:.1f} л, записей: {cnt}"
 
 
-@sync_to_async
-def aggregate_employee_text(text):
+@db_sync_to_async
+def aggregate_employee_text(text, scope):
     user = None
     # сначала попробуем как telegram_id
     try:
@@ -111,9 +141,7 @@ def aggregate_employee_text(text):
         user = User.objects.filter(Q(username__iexact=uq) | Q(last_name__icontains=text) | Q(first_name__icontains=text)).first()
     if not user:
         return None, "Заправщик не найден."
-    agg = FuelRecord.objects.filter(employee=user).aggregate(total=Sum("liters"), cnt=Count("id"))
-    total = float(agg["total"] or 0)
-    cnt = int(agg["cnt"] or 0)
+    total, cnt = cached_totals("employee", user.id, scope, [("employee", user.id)], FuelDailyAggregate.objects.filter(employee=user))
     who = user.get_full_name() or user.username or user.telegram_id
     return user, f"👤 {who} — всего {total:.1f} л, записей: {cnt}"
 
@@ -125,7 +153,7 @@ REPORTS_ROOT, REPORTS_PERIOD, REPORTS_FILTERS, PERIOD_FREE_INPUT, CAR_INPUT, REG
 # Вход в подменю "Отчёты"
 async def open_reports_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = getattr(context, "user", None)
-    if not await is_manager_or_admin(user):
+    if not is_manager_or_admin(user):
         await update.message.reply_text("⛔ Доступ к отчётам только для менеджеров и администраторов.")
         return ConversationHandler.END
 
@@ -158,15 +186,8 @@ async def reports_root_router(update: Update, context: ContextTypes.DEFAULT_TYPE
 # Периоды
 async def reports_period_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = (update.message.text or "").strip()
-    today = date.today()
-    if text == "📅 Сегодня":
-        start = end = today
-    elif text == "📅 Вчера":
-        start = end = today - timedelta(days=1)
-    elif text == "📅 Неделя":
-        start, end = today - timedelta(days=7), today
-    elif text == "📅 Месяц":
-        start, end = today - timedelta(days=30), today
+    if text in PERIOD_BUTTONS:
+        period = resolve_period(PERIOD_BUTTONS[text])
     elif text == "📅 Произвольная дата":
         await update.message.reply_text("Введите период в формате ДД.ММ.ГГГГ–ДД.ММ.ГГГГ (через дефис):")
         return PERIOD_FREE_INPUT
@@ -184,7 +205,8 @@ async def reports_period_router(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text("Выберите период из меню.", reply_markup=kb_reports_period())
         return REPORTS_PERIOD
 
-    text = await aggregate_period_text(start, end)
+    text = await aggregate_period_text(period, report_scope(getattr(context, "user", None)))
+    remember_period_report(context, period)
     await update.message.reply_text(text)
     # Возвращаем клавиатуру периодов, остаёмся в этом же state
     await update.message.reply_text("Выберите период:", reply_markup=kb_reports_period())
@@ -202,7 +224,9 @@ async def period_free_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Неверный формат. Пример: 01.10.2025-31.10.2025. Попробуйте ещё раз:")
         return PERIOD_FREE_INPUT
 
-    text = await aggregate_period_text(start, end)
+    period = date_range(start, end)
+    text = await aggregate_period_text(period, report_scope(getattr(context, "user", None)))
+    remember_period_report(context, period)
     await update.message.reply_text(text)
     # Назад к периодам
     await update.message.reply_text("Выберите период:", reply_markup=kb_reports_period())
@@ -244,33 +268,96 @@ async def reports_car_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if plate is None or not is_valid_plate(plate):
         await update.message.reply_text("Неверный формат. Попробуйте ещё раз:")
         return CAR_INPUT
-    car, text = await aggregate_car_text(plate)
+    car, text = await aggregate_car_text(plate, report_scope(getattr(context, "user", None)))
+    if car:
+        remember_report(context, "car", car.id, f"заправки_{car.state_number}")
     await update.message.reply_text(text)
     await update.message.reply_text("Выберите параметр:", reply_markup=kb_reports_filters())
     return REPORTS_FILTERS
 
 
 async def reports_region_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    region, text = await aggregate_region_text((update.message.text or "").strip())
+    scope = report_scope(getattr(context, "user", None))
+    region, text = await aggregate_region_text((update.message.text or "").strip(), scope)
+    if region:
+        remember_report(context, "region", region.id, f"заправки_{region.name}")
     await update.message.reply_text(text)
     await update.message.reply_text("Выберите параметр:", reply_markup=kb_reports_filters())
     return REPORTS_FILTERS
 
 
 async def reports_zone_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    zone, text = await aggregate_zone_text((update.message.text or "").strip())
+    scope = report_scope(getattr(context, "user", None))
+    zone, text = await aggregate_zone_text((update.message.text or "").strip(), scope)
+    if zone:
+        remember_report(context, "zone", zone.id, f"заправки_{zone.code}")
     await update.message.reply_text(text)
     await update.message.reply_text("Выберите параметр:", reply_markup=kb_reports_filters())
     return REPORTS_FILTERS
 
 
 async def reports_employee_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user, text = await aggregate_employee_text((update.message.text or "").strip())
+    scope = report_scope(getattr(context, "user", None))
+    user, text = await aggregate_employee_text((update.message.text or "").strip(), scope)
+    if user:
+        remember_report(context, "employee", user.id, f"заправки_{user.username or user.id}")
     await update.message.reply_text(text)
     await update.message.reply_text("Выберите параметр:", reply_markup=kb_reports_filters())
     return REPORTS_FILTERS
 
 
+# Выгрузка последнего отчёта файлом
+def remember_report(context, kind, entity_id, filename):
+    """Запоминает показанный отчёт: кнопки 📥 присылают его же файлом"""
+    context.user_data["last_report"] = {"kind": kind, "id": entity_id, "filename": filename}
+
+
+def remember_period_report(context, period):
+    start, end = period.first_day, period.last_day
+    context.user_data["last_report"] = {
+        "kind": "period",
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "filename": f"заправки_{start:%d.%m.%Y}-{end:%d.%m.%Y}",
+    }
+
+
+async def send_report_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Присылает последний отчёт файлом (по дням, машинам и заправщикам).
+    Обработчик неблокирующий (block=False): пока файл собирается, бот отвечает
+    остальным; None — диалог остаётся в текущем состоянии.
+    """
+    file_format = FILE_BUTTONS[(update.message.text or "").strip()]
+    report = context.user_data.get("last_report")
+    if not report:
+        await update.message.reply_text("Сначала сформируйте отчёт, затем выберите формат файла.")
+        return None
+
+    user_id = update.effective_user.id
+    if user_id in _exports_in_progress:
+        await update.message.reply_text("⏳ Предыдущий файл ещё готовится.")
+        return None
+
+    _exports_in_progress.add(user_id)
+    try:
+        await update.effective_chat.send_action(ChatAction.UPLOAD_DOCUMENT)
+        files = await build_report_files(report, file_format)
+        if not files:
+            await update.message.reply_text("По этому отчёту нет заправок.")
+            return None
+        if len(files) > 1:
+            await update.message.reply_text(f"Отчёт большой — разбит по месяцам, файлов: {len(files)}.")
+        for filename, buffer in files:
+            # Буфер передаётся как есть, без копирования в bytes
+            await update.message.reply_document(
+                document=buffer, filename=filename, write_timeout=UPLOAD_TIMEOUT
+            )
+    finally:
+        _exports_in_progress.discard(user_id)
+    return None
+
+
 # Обработчик отмены
 async def cancel_reports(update: Update, context: ContextTypes.DEFAULT_TYPE):
     from core.refuel_bot.keyboards.main_keyboard import MainKeyboard
@@ -281,7 +368,7 @@ async def cancel_reports(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 # Собираем Conversation под «📊 Отчёты»
-reports_menu_conv_handler = ConversationHandler(
+reports_menu_conv_handler = SharedConversationHandler(
     entry_points=[MessageHandler(filters.Regex("^📊 Отчёты$"), open_reports_menu)],
     states={
         REPORTS_ROOT: [
@@ -290,6 +377,7 @@ reports_menu_conv_handler = ConversationHandler(
             MessageHandler(filters.TEXT & ~filters.COMMAND, reports_root_router),
         ],
         REPORTS_PERIOD: [
+            MessageHandler(filters.Regex("^📥 (Excel|CSV)$"), send_report_file, block=False),
             MessageHandler(filters.Regex("^🔙 Назад$"), reports_period_router),
             MessageHandler(filters.Regex("^❌ Отмена$"), cancel_reports),
             MessageHandler(filters.TEXT & ~filters.COMMAND, reports_period_router),
@@ -299,6 +387,7 @@ reports_menu_conv_handler = ConversationHandler(
             MessageHandler(filters.TEXT & ~filters.COMMAND, period_free_input),
         ],
         REPORTS_FILTERS: [
+            MessageHandler(filters.Regex("^📥 (Excel|CSV)$"), send_report_file, block=False),
             MessageHandler(filters.Regex("^🔙 Назад$"), reports_filters_router),
             MessageHandler(filters.Regex("^❌ Отмена$"), cancel_reports),
             MessageHandler(filters.TEXT & ~filters.COMMAND, reports_filters_router),
@@ -324,5 +413,6 @@ reports_menu_conv_handler = ConversationHandler(
     per_user=True,
     per_chat=True,
     per_message=False,
-    name="reports_menu_conversation"
+    name="reports_menu_conversation",
+    persistent=is_persistence_enabled(),
 )
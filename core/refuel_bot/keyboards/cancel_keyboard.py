@@ -9,3 +9,11 @@ class CancelKeyboard:
             resize_keyboard=True, 
             one_time_keyboard=False
         )
+
+    def get_with_options(self, options):
+        """Варианты выбора (по одному в строке) над кнопками «Назад»/«Отмена»"""
+        return ReplyKeyboardMarkup(
+            [[option] for option in options] + [["🔙 Назад", "❌ Отмена"]],
+            resize_keyboard=True,
+            one_time_keyboard=False
+        )
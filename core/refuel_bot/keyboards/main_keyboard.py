@@ -1,13 +1,11 @@
 # core/bot/keyboards/main_keyboard.py
 from telegram import ReplyKeyboardMarkup
-from asgiref.sync import sync_to_async
 
 
 class MainKeyboard:
     """Reply keyboard used in main menu with role-based layout."""
 
     @staticmethod
-    @sync_to_async
     def _get_role(user):
         if user is None:
             return "anon"
@@ -20,7 +18,7 @@ class MainKeyboard:
 
     @staticmethod
     async def get_for_user(user=None):
-        role = await MainKeyboard._get_role(user) if user else "anon"
+        role = MainKeyboard._get_role(user)
 
         if role == "fueler":
             keyboard = [["⛽ Добавить", "❓ Помощь"],]
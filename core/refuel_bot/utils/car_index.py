@@ -0,0 +1,172 @@
+# core/refuel_bot/utils/car_index.py
+import asyncio
+import logging
+import time
+from typing import NamedTuple
+
+from django.core.cache import cache
+
+from core.models import Car
+from core.refuel_bot.utils.db import db_sync_to_async
+from core.refuel_bot.utils.validate_state_plate import normalize_plate_input
+
+
+logger = logging.getLogger(__name__)
+
+# Версия индекса в общем кэше. Увеличивается при изменении автомобилей
+# в любом процессе (админка, синхронизация с 1С), бот по ней перестраивает индекс.
+VERSION_CACHE_KEY = "car_plate_index:version"
+# Как часто бот сверяет версию индекса с кэшем, секунд
+VERSION_CHECK_INTERVAL = 30
+# Сколько вариантов предлагать при опечатке
+SUGGESTIONS_LIMIT = 5
+
+# Визуально похожие цифры и буквы, которые путают при вводе госномера
+CONFUSABLES = str.maketrans({"0": "О", "8": "В", "3": "З", "6": "Б"})
+
+
+class CarEntry(NamedTuple):
+    id: int
+    state_number: str
+    model: str
+    region_id: int | None
+    region_name: str | None
+
+
+def _fold(plate: str) -> str:
+    """Сводит похожие символы к одному виду."""
+    return plate.translate(CONFUSABLES)
+
+
+def _deletions(plate: str) -> set[str]:
+    """Все варианты строки без одного символа."""
+    return {plate[:i] + plate[i + 1:] for i in range(len(plate))}
+
+
+def _is_one_edit(a: str, b: str) -> bool:
+    """Расстояние Левенштейна между строками равно 1."""
+    if a == b or abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        return sum(x != y for x, y in zip(a, b)) == 1
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+def _get_version():
+    try:
+        return cache.get(VERSION_CACHE_KEY, 0)
+    except Exception as e:
+        logger.warning("Cache GET failed for %s: %s", VERSION_CACHE_KEY, e)
+        return None
+
+
+class CarPlateIndex:
+    """
+    Индекс активных автомобилей в памяти процесса бота.
+    Ключ — госномер, нормализованный normalize_plate_input.
+    """
+
+    def __init__(self):
+        self._by_plate: dict[str, CarEntry] = {}
+        self._by_folded: dict[str, list[str]] = {}
+        self._by_deletion: dict[str, list[str]] = {}
+        self._version = None
+        self._loaded = False
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _rebuild_sync(self, version):
+        rows = (
+            Car.objects
+            .filter(is_active=True)
+            .values_list("id", "state_number", "model", "region_id", "region__name", "normalized_plate")
+        )
+        by_plate, by_folded, by_deletion = {}, {}, {}
+        for *row, plate in rows.iterator():
+            entry = CarEntry(*row)
+            # Номер нормализован при сохранении; пустой (NULL) — у дубликата госномера
+            plate = plate or normalize_plate_input(entry.state_number)
+            by_plate[plate] = entry
+            by_folded.setdefault(_fold(plate), []).append(plate)
+            for variant in _deletions(plate):
+                by_deletion.setdefault(variant, []).append(plate)
+
+        self._by_plate, self._by_folded, self._by_deletion = by_plate, by_folded, by_deletion
+        self._version = version
+        self._loaded = True
+        logger.info("Индекс госномеров перестроен: %s автомобилей", len(by_plate))
+
+    async def _ensure_fresh(self, force: bool = False):
+        def is_fresh():
+            return (
+                self._loaded and not force
+                and time.monotonic() - self._checked_at < VERSION_CHECK_INTERVAL
+            )
+
+        if is_fresh():
+            return
+        async with self._lock:
+            if is_fresh():
+                return
+            version = await db_sync_to_async(_get_version)()
+            self._checked_at = time.monotonic()
+            # Кэш недоступен — работаем со старым индексом, если он есть
+            if self._loaded and (version is None or version == self._version):
+                return
+            await db_sync_to_async(self._rebuild_sync)(version)
+
+    def invalidate(self):
+        """Помечает индекс устаревшим (перестроится при следующем поиске)."""
+        self._loaded = False
+
+    async def find(self, plate: str) -> CarEntry | None:
+        key = normalize_plate_input(plate)
+        await self._ensure_fresh()
+        entry = self._by_plate.get(key)
+        if entry is None:
+            # Автомобиль мог появиться после последней сверки — проверяем версию сразу
+            await self._ensure_fresh(force=True)
+            entry = self._by_plate.get(key)
+        return entry
+
+    async def suggest(self, plate: str, limit: int = SUGGESTIONS_LIMIT) -> list[CarEntry]:
+        """Похожие госномера: путаница похожих символов и одна опечатка."""
+        key = normalize_plate_input(plate)
+        await self._ensure_fresh()
+
+        candidates = set(self._by_folded.get(_fold(key), ()))
+        # Во введённом номере лишний символ
+        candidates.update(v for v in _deletions(key) if v in self._by_plate)
+        # В введённом номере пропущен символ
+        candidates.update(self._by_deletion.get(key, ()))
+        # Один символ заменён
+        for variant in _deletions(key):
+            candidates.update(
+                p for p in self._by_deletion.get(variant, ()) if _is_one_edit(key, p)
+            )
+        candidates.discard(key)
+
+        entries = sorted((self._by_plate[p] for p in candidates), key=lambda e: e.state_number)
+        return entries[:limit]
+
+
+car_index = CarPlateIndex()
+
+
+def invalidate_car_index():
+    """
+    Сбрасывает индекс госномеров во всех процессах бота.
+    Вызывается при сохранении автомобиля и после синхронизации с 1С.
+    """
+    car_index.invalidate()
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(VERSION_CACHE_KEY, 1, timeout=None)
+    except Exception as e:
+        logger.warning("Cache INCR failed for %s: %s", VERSION_CACHE_KEY, e)
@@ -0,0 +1,30 @@
+# core/refuel_bot/utils/db.py
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+
+# Отдельный ограниченный пул потоков для запросов бота к БД.
+# sync_to_async по умолчанию (thread_sensitive=True) выполняет все вызовы
+# в одном потоке, и один медленный запрос задерживает диалоги всех пользователей.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.TELEGRAM.get("DB_POOL_SIZE", 8),
+    thread_name_prefix="bot-db",
+)
+
+
+def db_sync_to_async(func):
+    """
+    Аналог sync_to_async для обработчиков бота: выполняет функцию в пуле
+    потоков бота. У каждого потока своё соединение с БД, перед вызовом
+    устаревшие соединения закрываются.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        return func(*args, **kwargs)
+
+    return sync_to_async(wrapper, thread_sensitive=False, executor=_executor)
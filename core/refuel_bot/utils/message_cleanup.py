@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, Set
+
+from django.conf import settings
+from telegram import Bot
+from telegram.error import TelegramError
+
+
+logger = logging.getLogger(__name__)
+
+# Максимум сообщений в одном deleteMessages (ограничение Bot API)
+DELETE_BATCH_LIMIT = 100
+
+
+class MessageCleaner:
+    """
+    Фоновое удаление сообщений: обработчик не ждёт ответа Telegram.
+    Id сообщений одного чата копятся delay секунд и удаляются одним
+    запросом deleteMessages; недоступные для удаления сообщения Telegram
+    пропускает сам.
+    """
+
+    def __init__(self, delay: float = 0.3):
+        self.delay = delay
+        self._pending: Dict[int, Set[int]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = Counter()
+
+    def schedule(self, bot: Bot, chat_id: int, message_id: int) -> None:
+        if not chat_id or not message_id:
+            return
+        self.stats["scheduled"] += 1
+        ids = self._pending.get(chat_id)
+        if ids is None:
+            ids = self._pending[chat_id] = set()
+            task = asyncio.get_running_loop().create_task(self._flush(bot, chat_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        ids.add(message_id)
+
+    async def _flush(self, bot: Bot, chat_id: int) -> None:
+        await asyncio.sleep(self.delay)
+        ids = sorted(self._pending.pop(chat_id, ()))
+        for start in range(0, len(ids), DELETE_BATCH_LIMIT):
+            chunk = ids[start:start + DELETE_BATCH_LIMIT]
+            try:
+                await bot.delete_messages(chat_id=chat_id, message_ids=chunk)
+                self.stats["requests"] += 1
+                self.stats["deleted"] += len(chunk)
+            except TelegramError as e:
+                # Сообщения старше 48 часов или уже удалены — не ошибка для пользователя
+                self.stats["failed"] += len(chunk)
+                logger.debug("Не удалось удалить сообщения %s в чате %s: %s", chunk, chat_id, e)
+
+    async def drain(self) -> None:
+        """Дожидается удаления всего запланированного (при остановке бота)."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self.stats, "pending_chats": len(self._pending)}
+
+
+message_cleaner = MessageCleaner(delay=settings.TELEGRAM.get("DELETE_COALESCE_DELAY", 0.3))
@@ -0,0 +1,342 @@
+import asyncio
+import json
+import logging
+import os
+import pickle
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import redis.asyncio as aioredis
+from django.conf import settings
+from redis.exceptions import RedisError
+from telegram.ext import BasePersistence, ConversationHandler, PersistenceInput
+
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "nextbot:bot"
+# Поле хэша чата с chat_data; состояния диалогов лежат в полях conv:<имя>:<ключ>
+CHAT_DATA_FIELD = "data"
+CONVERSATION_FIELD_PREFIX = "conv:"
+# Метка версии перед сериализованными данными: по ней видно, что значение записал другой воркер
+STAMP_SIZE = 8
+# Пауза перед повторной записью, если Redis недоступен, секунд
+RETRY_DELAY = 5
+# Сколько ключей помнить для сравнения с Redis; давно не активные вытесняются
+KNOWN_MAX_KEYS = 10_000
+# Сколько ключей чатов читать одним pipeline при загрузке диалогов
+LOAD_BATCH_SIZE = 500
+
+# Слот хранения: (ключ Redis, поле хэша или None для строкового ключа)
+Slot = Tuple[str, Optional[str]]
+
+
+def is_persistence_enabled() -> bool:
+    return bool(settings.TELEGRAM.get("PERSISTENCE_URL"))
+
+
+class SharedConversationHandler(ConversationHandler):
+    """
+    ConversationHandler, состояния которого может менять другой воркер:
+    RedisPersistence перед каждым обновлением подставляет состояние из Redis.
+    """
+
+    def load_state(self, key: tuple, state: Optional[object]) -> None:
+        """Состояние, записанное другим воркером (None — диалог завершён), без отметки об изменении."""
+        if state is None:
+            self._conversations.data.pop(key, None)
+        else:
+            self._conversations.update_no_track({key: state})
+
+
+class RedisPersistence(BasePersistence[dict, dict, dict]):
+    """
+    Хранение user_data, chat_data и состояний ConversationHandler в Redis,
+    чтобы незаконченные диалоги переживали перезапуск и обновления одного
+    чата мог обрабатывать любой воркер.
+
+    Ключи: <prefix>:user:<id> — user_data, <prefix>:chat:<id> — хэш с chat_data
+    и состояниями диалогов этого чата. Значения — pickle с меткой версии,
+    неизменившиеся данные повторно не пишутся.
+
+    Запись отложенная: Application раз в update_interval передаёт изменения,
+    они копятся в буфере и уходят одним pipeline. Перед каждым обновлением
+    (refresh_*) user_data, chat_data и состояния диалогов чата перечитываются:
+    если значение в Redis записал другой воркер, локальная копия заменяется.
+    Состояния подставляются в диалоги SharedConversationHandler, переданные
+    в track_conversations; это работает потому, что access_middleware
+    (группа -1) создаёт контекст раньше, чем диалог проверяет обновление.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        prefix: str = KEY_PREFIX,
+        ttl_days: int = 30,
+        update_interval: float = 1,
+        flush_delay: float = 0,
+    ):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.prefix = prefix
+        # Данные неактивных пользователей и чатов удаляются сами
+        self.ttl = ttl_days * 24 * 3600
+        self.flush_delay = flush_delay
+        self.stats = Counter()
+        self._redis = aioredis.Redis.from_url(url)
+
+        # Последнее известное значение каждого слота (записанное нами или прочитанное),
+        # не больше KNOWN_MAX_KEYS ключей: вытесненный ключ просто перечитается
+        self._known: "OrderedDict[str, Dict[Optional[str], bytes]]" = OrderedDict()
+        # Ещё не записанные в Redis изменения; None — удаление
+        self._pending: Dict[Slot, Optional[bytes]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+        # Диалоги, состояния которых обновляются из Redis: имя -> обработчик
+        self._conversation_handlers: Dict[str, SharedConversationHandler] = {}
+
+    def track_conversations(self, application) -> None:
+        """Запоминает диалоги SharedConversationHandler, добавленные в application."""
+        for handlers in application.handlers.values():
+            for handler in handlers:
+                if isinstance(handler, SharedConversationHandler) and handler.persistent:
+                    self._conversation_handlers[handler.name] = handler
+
+    # --------------------- Ключи ---------------------
+    def _user_key(self, user_id: int) -> str:
+        return f"{self.prefix}:user:{user_id}"
+
+    def _chat_key(self, chat_id: int) -> str:
+        return f"{self.prefix}:chat:{chat_id}"
+
+    @staticmethod
+    def _conversation_field(name: str, key: tuple) -> str:
+        return f"{CONVERSATION_FIELD_PREFIX}{name}:{json.dumps(list(key), separators=(',', ':'))}"
+
+    @staticmethod
+    def _parse_conversation_field(field: str) -> Tuple[str, tuple]:
+        name, key = field[len(CONVERSATION_FIELD_PREFIX):].split(":", 1)
+        return name, tuple(json.loads(key))
+
+    # --------------------- Известные значения ---------------------
+    def _known_fields(self, key: str) -> Dict[Optional[str], bytes]:
+        fields = self._known.get(key)
+        if fields is None:
+            fields = self._known[key] = {}
+            while len(self._known) > KNOWN_MAX_KEYS:
+                self._known.popitem(last=False)
+        else:
+            self._known.move_to_end(key)
+        return fields
+
+    def _forget(self, key: str, field: Optional[str]) -> None:
+        fields = self._known.get(key)
+        if fields is not None:
+            fields.pop(field, None)
+            if not fields:
+                # Диалог завершён или данные удалены — ключ больше не нужен
+                del self._known[key]
+
+    # --------------------- Отложенная запись ---------------------
+    def _stage(self, key: str, field: Optional[str], data: Any) -> None:
+        current = self._known.get(key, {}).get(field)
+        if data is None or data == {}:
+            if current is None and (key, field) not in self._pending:
+                return
+            value = None
+        else:
+            payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+            if current is not None and current[STAMP_SIZE:] == payload:
+                self.stats["unchanged"] += 1
+                return
+            value = os.urandom(STAMP_SIZE) + payload
+
+        if value is None:
+            self._forget(key, field)
+        else:
+            self._known_fields(key)[field] = value
+        self._pending[(key, field)] = value
+        self._schedule_flush()
+
+    def _schedule_flush(self, delay: Optional[float] = None) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(
+                self._flush_later(self.flush_delay if delay is None else delay)
+            )
+
+    async def _flush_later(self, delay: float) -> None:
+        # Все update_* одного прохода Application попадают в один pipeline
+        await asyncio.sleep(delay)
+        if not await self._write_pending():
+            self._schedule_flush(RETRY_DELAY)
+
+    async def _write_pending(self) -> bool:
+        async with self._write_lock:
+            batch = dict(self._pending)
+            if not batch:
+                return True
+            try:
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for (key, field), value in batch.items():
+                        if field is None:
+                            if value is None:
+                                pipe.delete(key)
+                            else:
+                                pipe.set(key, value, ex=self.ttl)
+                        elif value is None:
+                            pipe.hdel(key, field)
+                        else:
+                            pipe.hset(key, field, value)
+                            pipe.expire(key, self.ttl)
+                    await pipe.execute()
+            except RedisError as e:
+                self.stats["write_errors"] += 1
+                logger.warning("Не удалось сохранить состояние бота в Redis (%s записей): %s", len(batch), e)
+                return False
+
+            # Слоты, изменённые во время записи, остаются в буфере до следующего раза
+            for slot, value in batch.items():
+                if self._pending.get(slot, value) is value:
+                    self._pending.pop(slot, None)
+            self.stats["flushes"] += 1
+            self.stats["writes"] += len(batch)
+            return True
+
+    # --------------------- Чтение ---------------------
+    def _is_remote_change(self, key: str, field: Optional[str], value: bytes) -> bool:
+        """True, если значение в Redis записал кто-то другой и локальных несохранённых изменений нет."""
+        if (key, field) in self._pending:
+            return False
+        known = self._known_fields(key)
+        if known.get(field) == value:
+            return False
+        known[field] = value
+        self.stats["remote_changes"] += 1
+        return True
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        key = self._user_key(user_id)
+        try:
+            value = await self._redis.get(key)
+        except RedisError as e:
+            logger.debug("Не удалось прочитать user_data %s из Redis: %s", user_id, e)
+            return
+        if value is not None and self._is_remote_change(key, None, value):
+            user_data.clear()
+            user_data.update(pickle.loads(value[STAMP_SIZE:]))
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        key = self._chat_key(chat_id)
+        try:
+            stored = await self._redis.hgetall(key)
+        except RedisError as e:
+            logger.debug("Не удалось прочитать состояние чата %s из Redis: %s", chat_id, e)
+            return
+
+        fields = {field.decode(): value for field, value in stored.items()}
+        for field, value in fields.items():
+            if self._is_remote_change(key, field, value):
+                self._apply_remote(field, chat_data, pickle.loads(value[STAMP_SIZE:]))
+
+        # Поля, пропавшие из Redis: данные удалены или диалог завершён другим воркером
+        known = self._known.get(key, {})
+        for field in [f for f in known if f not in fields and (key, f) not in self._pending]:
+            self._forget(key, field)
+            self.stats["remote_changes"] += 1
+            self._apply_remote(field, chat_data, None)
+
+    def _apply_remote(self, field: str, chat_data: dict, data: Any) -> None:
+        if field == CHAT_DATA_FIELD:
+            chat_data.clear()
+            chat_data.update(data or {})
+        elif field.startswith(CONVERSATION_FIELD_PREFIX):
+            name, conversation_key = self._parse_conversation_field(field)
+            handler = self._conversation_handlers.get(name)
+            if handler is not None:
+                handler.load_state(conversation_key, data)
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    # --------------------- Загрузка при старте ---------------------
+    # user_data и chat_data загружаются лениво, по чату и пользователю, в refresh_*
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        """Незавершённые диалоги name из хэшей всех чатов (вызывается один раз при старте)."""
+        prefix = f"{CONVERSATION_FIELD_PREFIX}{name}:"
+        conversations = {}
+        keys = [key async for key in self._redis.scan_iter(match=f"{self.prefix}:chat:*", count=LOAD_BATCH_SIZE)]
+        for start in range(0, len(keys), LOAD_BATCH_SIZE):
+            batch = keys[start:start + LOAD_BATCH_SIZE]
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key in batch:
+                    pipe.hgetall(key)
+                stored = await pipe.execute()
+            for key, fields in zip(batch, stored):
+                key = key.decode()
+                for field, value in fields.items():
+                    field = field.decode()
+                    if not field.startswith(prefix):
+                        continue
+                    self._known_fields(key)[field] = value
+                    conversations[self._parse_conversation_field(field)[1]] = pickle.loads(value[STAMP_SIZE:])
+        logger.info("Загружено незавершённых диалогов %s: %s", name, len(conversations))
+        return conversations
+
+    # --------------------- Изменения от Application ---------------------
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._stage(self._user_key(user_id), None, data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._stage(self._chat_key(chat_id), CHAT_DATA_FIELD, data)
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        # Ключ диалога per_chat начинается с id чата
+        self._stage(self._chat_key(key[0]), self._conversation_field(name, key), new_state)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._stage(self._user_key(user_id), None, None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._stage(self._chat_key(chat_id), CHAT_DATA_FIELD, None)
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Записывает буфер (при остановке бота) и закрывает соединение."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self._write_pending()
+        logger.info("Bot persistence stats: %s", self.get_stats())
+        await self._redis.aclose()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self.stats, "pending": len(self._pending)}
+
+
+def build_persistence() -> Optional[RedisPersistence]:
+    """RedisPersistence из настроек или None, если TELEGRAM_PERSISTENCE_URL не задан."""
+    if not is_persistence_enabled():
+        return None
+    return RedisPersistence(
+        url=settings.TELEGRAM["PERSISTENCE_URL"],
+        ttl_days=settings.TELEGRAM.get("PERSISTENCE_TTL_DAYS", 30),
+        update_interval=settings.TELEGRAM.get("PERSISTENCE_UPDATE_INTERVAL", 1),
+    )
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import time
+from collections import Counter, OrderedDict, deque
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+
+logger = logging.getLogger(__name__)
+
+# Методы без ограничений: служебные и ответы, которые Telegram ждёт немедленно
+UNLIMITED_ENDPOINTS = {
+    "getUpdates", "getMe", "setWebhook", "deleteWebhook", "getWebhookInfo",
+    "answerCallbackQuery", "answerInlineQuery", "close", "logOut",
+}
+# Методы, которые Telegram ограничивает в пределах одного чата
+CHAT_LIMITED_PREFIXES = ("send", "copy", "forward", "edit")
+# Сколько чатов держать в памяти (давно неактивные вытесняются)
+CHAT_BUCKETS_LIMIT = 10000
+# Окно для расчёта задержек и как часто писать метрики в лог, секунд
+LATENCY_WINDOW = 1000
+METRICS_LOG_INTERVAL = 60
+
+
+class _TokenBucket:
+    """Token bucket для asyncio: acquire() ждёт, пока появится токен."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        # До этого момента запросы не отправляются (после RetryAfter)
+        self.paused_until = 0.0
+
+    def _delay(self) -> float:
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> bool:
+        """Возвращает True, если пришлось ждать."""
+        waited = False
+        while delay := self._delay():
+            waited = True
+            await asyncio.sleep(delay)
+        return waited
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class BotRateLimiter(BaseRateLimiter[int]):
+    """
+    Ограничитель исходящих запросов бота под лимиты Telegram:
+    общий на бота (GLOBAL_PER_SECOND) и на чат (личные — PRIVATE_PER_SECOND,
+    группы — GROUP_PER_MINUTE). Запросы сверх лимита ждут своей очереди,
+    RetryAfter (flood control) повторяется после паузы, которую назвал Telegram.
+
+    Метрики (get_stats): глубина очереди, задержки, повторы.
+    """
+
+    def __init__(
+        self,
+        global_per_second: float = 25,
+        private_per_second: float = 1,
+        group_per_minute: float = 20,
+        max_retries: int = 3,
+    ):
+        self.private_per_second = private_per_second
+        self.group_per_minute = group_per_minute
+        self.max_retries = max_retries
+        self._global = _TokenBucket(global_per_second, global_per_second)
+        self._chats: "OrderedDict[int, _TokenBucket]" = OrderedDict()
+
+        self.stats = Counter()
+        self.pending = 0
+        self.max_pending = 0
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self._logged_at = time.monotonic()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        logger.info("Telegram rate limiter stats: %s", self.get_stats())
+
+    def _chat_bucket(self, chat_id: int) -> _TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if chat_id < 0:
+                # Группы и каналы: лимит в минуту, небольшой запас на всплеск
+                bucket = _TokenBucket(self.group_per_minute / 60, 3)
+            else:
+                bucket = _TokenBucket(self.private_per_second, 3)
+            self._chats[chat_id] = bucket
+            if len(self._chats) > CHAT_BUCKETS_LIMIT:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    @staticmethod
+    def _chat_id(endpoint: str, data: Dict[str, Any]) -> Optional[int]:
+        if not endpoint.startswith(CHAT_LIMITED_PREFIXES):
+            return None
+        chat_id = data.get("chat_id")
+        # @username каналов лимитируются только общим ограничением
+        return chat_id if isinstance(chat_id, int) else None
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if endpoint in UNLIMITED_ENDPOINTS:
+            return await callback(*args, **kwargs)
+
+        chat_id = self._chat_id(endpoint, data)
+        self.stats["requests"] += 1
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        started = time.monotonic()
+        try:
+            attempt = 0
+            while True:
+                waited = False
+                if chat_id is not None:
+                    waited = await self._chat_bucket(chat_id).acquire()
+                waited = await self._global.acquire() or waited
+                if waited:
+                    self.stats["throttled"] += 1
+                try:
+                    return await callback(*args, **kwargs)
+                except RetryAfter as e:
+                    if attempt >= self.max_retries:
+                        self.stats["dropped"] += 1
+                        raise
+                    attempt += 1
+                    retry_after = e.retry_after
+                    if isinstance(retry_after, timedelta):
+                        retry_after = retry_after.total_seconds()
+                    self.stats["retry_after"] += 1
+                    logger.warning(
+                        "Telegram flood control: %s (chat %s), повтор %s/%s через %s с",
+                        endpoint, chat_id, attempt, self.max_retries, retry_after,
+                    )
+                    # Пауза касается чата, если он известен, иначе — всех запросов бота
+                    bucket = self._chat_bucket(chat_id) if chat_id is not None else self._global
+                    bucket.pause(float(retry_after))
+        finally:
+            self.pending -= 1
+            self._latencies.append(time.monotonic() - started)
+            self._log_stats()
+
+    def get_stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+        return {
+            **self.stats,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "latency_avg_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0,
+            "latency_p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else 0,
+        }
+
+    def _log_stats(self) -> None:
+        now = time.monotonic()
+        if now - self._logged_at >= METRICS_LOG_INTERVAL:
+            self._logged_at = now
+            logger.info("Telegram rate limiter stats: %s", self.get_stats())
+
+
+bot_rate_limiter = BotRateLimiter(
+    global_per_second=settings.TELEGRAM.get("RATE_LIMIT_GLOBAL_PER_SECOND", 25),
+    private_per_second=settings.TELEGRAM.get("RATE_LIMIT_PRIVATE_PER_SECOND", 1),
+    group_per_minute=settings.TELEGRAM.get("RATE_LIMIT_GROUP_PER_MINUTE", 20),
+    max_retries=settings.TELEGRAM.get("RATE_LIMIT_MAX_RETRIES", 3),
+)
@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import time
+from collections import Counter
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "report"
+GENERATION_PREFIX = "report_gen"
+# Поколение всех отчётов: увеличивается при пересчёте дневных итогов
+GLOBAL_GENERATION = f"{GENERATION_PREFIX}:all"
+# Периоды длиннее этого зависят от поколений месяцев, а не дней
+MAX_DAY_DEPENDENCIES = 62
+
+# Зависимость отчёта: (вид, значение), например ("day", "2025-10-01") или ("car", 15)
+Dependency = Tuple[str, Any]
+
+
+def _generation_key(kind: str, value: Any) -> str:
+    return f"{GENERATION_PREFIX}:{kind}:{value}"
+
+
+def period_dependencies(start: date, end: date) -> List[Dependency]:
+    """Поколения, от которых зависит отчёт за дни start..end"""
+    days = (end - start).days + 1
+    if days <= MAX_DAY_DEPENDENCIES:
+        return [("day", (start + timedelta(days=offset)).isoformat()) for offset in range(days)]
+    months = []
+    month = start.replace(day=1)
+    while month <= end:
+        months.append(("month", f"{month:%Y-%m}"))
+        month = (month + timedelta(days=32)).replace(day=1)
+    return months
+
+
+def bucket_dependencies(bucket: Dict[str, Any]) -> List[Dependency]:
+    """Поколения, которые меняет заправка из строки дневных итогов bucket"""
+    day = bucket["day"]
+    dependencies = [("day", day.isoformat()), ("month", f"{day:%Y-%m}"), ("car", bucket["car_id"])]
+    for kind, field in (("employee", "employee_id"), ("region", "historical_region_id"), ("zone", "zone_id")):
+        if bucket.get(field):
+            dependencies.append((kind, bucket[field]))
+    return dependencies
+
+
+class ReportCache:
+    """
+    Кэш готовых отчётов бота с инвалидацией по поколениям.
+
+    Ключ результата: вид отчёта, параметры, область видимости пользователя
+    и текущие номера поколений всего, от чего отчёт зависит (дни или месяцы
+    периода, автомобиль, регион, зона, заправщик). Запись о заправке увеличивает
+    поколения своего дня, месяца и сущностей — затронутые отчёты получают новый
+    ключ и пересчитываются, остальные продолжают читаться из кэша.
+    """
+
+    def __init__(self, ttl: int = 600):
+        self.ttl = ttl
+        self.stats = Counter()
+
+    def get_or_compute(
+        self,
+        report: str,
+        params: Any,
+        scope: str,
+        dependencies: Iterable[Dependency],
+        compute: Callable[[], Any],
+    ) -> Any:
+        """Результат из кэша или compute() (вызывается из потока БД, не из event loop)"""
+        try:
+            key = self._result_key(report, params, scope, dependencies)
+            value = cache.get(key)
+        except Exception as e:
+            logger.warning("Report cache read failed for %s: %s", report, e)
+            self.stats["errors"] += 1
+            return compute()
+
+        if value is not None:
+            self.stats["hits"] += 1
+            return value
+
+        self.stats["misses"] += 1
+        value = compute()
+        try:
+            cache.set(key, value, timeout=self.ttl)
+        except Exception as e:
+            logger.warning("Report cache write failed for %s: %s", report, e)
+        return value
+
+    def _result_key(self, report: str, params: Any, scope: str, dependencies: Iterable[Dependency]) -> str:
+        generation_keys = [GLOBAL_GENERATION] + [_generation_key(kind, value) for kind, value in dependencies]
+        generations = cache.get_many(generation_keys)
+        stamp = "|".join(f"{key}={generations.get(key, 0)}" for key in generation_keys)
+        digest = hashlib.sha1(f"{params}|{stamp}".encode("utf-8")).hexdigest()
+        return f"{KEY_PREFIX}:{report}:{scope}:{digest}"
+
+    def bump(self, dependencies: Iterable[Dependency]) -> None:
+        """Увеличивает поколения: зависящие от них отчёты пересчитаются при следующем запросе"""
+        for key in {_generation_key(kind, value) for kind, value in dependencies}:
+            self._incr(key)
+
+    def bump_all(self) -> None:
+        self._incr(GLOBAL_GENERATION)
+
+    def _incr(self, key: str) -> None:
+        self.stats["invalidations"] += 1
+        try:
+            # Начальное значение от времени: если ключ вытеснен из кэша,
+            # новое поколение не совпадёт с прежними
+            if not cache.add(key, int(time.time() * 1000), timeout=None):
+                cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), timeout=None)
+        except Exception as e:
+            logger.warning("Cache INCR failed for %s: %s", key, e)
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats)
+
+
+report_cache = ReportCache(ttl=settings.TELEGRAM.get("REPORT_CACHE_TTL", 600))
+
+
+def invalidate_reports(*dependencies: Dependency) -> None:
+    """
+    Сбрасывает отчёты, зависящие от dependencies, после фиксации транзакции
+    (иначе отчёт мог бы пересчитаться и закэшироваться по старым данным).
+    """
+    dependencies = [(kind, value) for kind, value in dependencies if value is not None]
+    if dependencies:
+        transaction.on_commit(lambda: report_cache.bump(dependencies))
+
+
+def invalidate_reports_for_buckets(*buckets: Dict[str, Any]) -> None:
+    """Сбрасывает отчёты, затронутые изменением строк дневных итогов"""
+    invalidate_reports(*(dependency for bucket in buckets for dependency in bucket_dependencies(bucket)))
+
+
+def invalidate_all_reports() -> None:
+    transaction.on_commit(report_cache.bump_all)
@@ -0,0 +1,81 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from core.models import FuelDailyAggregate, FuelRecord
+from core.refuel_bot.utils.db import db_sync_to_async
+from core.refuel_bot.utils.report_render import COLUMNS, render_report_files
+
+
+logger = logging.getLogger(__name__)
+
+# Отдельные процессы для сборки файлов: запись XLSX занимает процессор на секунды
+# и держит GIL — в потоке она тормозила бы event loop и пул потоков БД.
+# spawn, а не fork: процесс бота многопоточный. Пул создаётся при первом отчёте
+_render_executor: Optional[ProcessPoolExecutor] = None
+_render_executor_lock = threading.Lock()
+
+FILE_FORMATS = ("xlsx", "csv")
+
+
+def _get_render_executor() -> ProcessPoolExecutor:
+    global _render_executor
+    with _render_executor_lock:
+        if _render_executor is None:
+            _render_executor = ProcessPoolExecutor(
+                max_workers=settings.TELEGRAM.get("REPORT_RENDER_WORKERS", 2),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _render_executor
+
+
+def report_queryset(report: Dict[str, Any]):
+    """Строки дневных итогов для отчёта, описанного в user_data["last_report"]"""
+    aggregates = FuelDailyAggregate.objects.all()
+    kind = report["kind"]
+    if kind == "period":
+        return aggregates.by_period(date.fromisoformat(report["start"]), date.fromisoformat(report["end"]))
+    field = {
+        "car": "car_id",
+        "region": "historical_region_id",
+        "zone": "zone_id",
+        "employee": "employee_id",
+    }[kind]
+    return aggregates.filter(**{field: report["id"]})
+
+
+@db_sync_to_async
+def fetch_report_columns(report: Dict[str, Any]) -> Dict[str, list]:
+    """Строки отчёта по столбцам: так DataFrame собирается без промежуточных словарей"""
+    fields = [field for _, field, _ in COLUMNS]
+    columns: Dict[str, list] = {field: [] for field in fields}
+    rows = report_queryset(report).order_by("day", "car__state_number").values_list(*fields)
+    for row in rows.iterator(chunk_size=5000):
+        for field, value in zip(fields, row):
+            columns[field].append(value)
+    return columns
+
+
+async def build_report_files(report: Dict[str, Any], file_format: str) -> List[Tuple[str, io.BytesIO]]:
+    """Выборка в пуле потоков БД, сборка файлов — в процессах отчётов; пустой отчёт — пустой список"""
+    columns = await fetch_report_columns(report)
+    if not columns["day"]:
+        return []
+    basename = report.get("filename", "report")
+    max_rows = settings.TELEGRAM.get("REPORT_FILE_MAX_ROWS", 50000)
+    # Подписи вычисляются здесь: в процессе сборки нет Django
+    labels = {
+        "тип топлива": {k: str(v) for k, v in FuelRecord.FuelType.choices},
+        "способ заправки": {k: str(v) for k, v in FuelRecord.SourceFuel.choices},
+    }
+    files = await asyncio.get_running_loop().run_in_executor(
+        _get_render_executor(), render_report_files, columns, file_format, basename, max_rows, labels
+    )
+    return [(filename, io.BytesIO(content)) for filename, content in files]
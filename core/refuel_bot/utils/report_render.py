@@ -0,0 +1,64 @@
+"""
+Сборка файлов отчёта. Выполняется в отдельном процессе (см. report_files),
+поэтому модуль не импортирует Django: на вход — простые списки, на выход — байты.
+"""
+import io
+from typing import Dict, List, Tuple
+
+import polars as pl
+
+
+# Столбцы файла: (заголовок, поле FuelDailyAggregate, тип Polars)
+COLUMNS = [
+    ("дата", "day", pl.Date),
+    ("госномер", "car__state_number", pl.Utf8),
+    ("модель авто", "car__model", pl.Utf8),
+    ("фамилия", "employee__last_name", pl.Utf8),
+    ("имя", "employee__first_name", pl.Utf8),
+    ("логин", "employee__username", pl.Utf8),
+    ("регион (на момент заправки)", "historical_region__name", pl.Utf8),
+    ("зона", "zone__name", pl.Utf8),
+    ("тип топлива", "fuel_type", pl.Utf8),
+    ("способ заправки", "source", pl.Utf8),
+    ("кол-во, л", "total_liters", pl.Float64),
+    ("заправок", "record_count", pl.Int64),
+]
+
+
+def _write(df: pl.DataFrame, file_format: str) -> bytes:
+    buffer = io.BytesIO()
+    if file_format == "csv":
+        # BOM — чтобы Excel открыл кириллицу без мастера импорта
+        buffer.write(b"\xef\xbb\xbf")
+        df.write_csv(buffer)
+    else:
+        df.write_excel(buffer, worksheet="Заправки", autofit=True)
+    return buffer.getvalue()
+
+
+def render_report_files(
+    columns: Dict[str, list],
+    file_format: str,
+    basename: str,
+    max_rows: int,
+    labels: Dict[str, Dict[str, str]],
+) -> List[Tuple[str, bytes]]:
+    """
+    Собирает файлы отчёта. labels — подписи значений по заголовку столбца
+    (тип топлива, способ заправки). Больше max_rows строк — отдельный файл
+    на каждый месяц.
+    """
+    columns["total_liters"] = [float(value) for value in columns["total_liters"]]
+    df = pl.DataFrame(
+        {title: columns[field] for title, field, _ in COLUMNS},
+        schema={title: dtype for title, _, dtype in COLUMNS},
+    ).with_columns(pl.col(title).replace(mapping) for title, mapping in labels.items())
+    if df.height <= max_rows:
+        return [(f"{basename}.{file_format}", _write(df, file_format))]
+
+    files = []
+    by_month = df.with_columns(pl.col("дата").dt.strftime("%Y-%m").alias("_month"))
+    for part in by_month.partition_by("_month", maintain_order=True):
+        month = part["_month"][0]
+        files.append((f"{basename}_{month}.{file_format}", _write(part.drop("_month"), file_format)))
+    return files
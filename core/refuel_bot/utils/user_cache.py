@@ -0,0 +1,367 @@
+# core/refuel_bot/utils/user_cache.py
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone as dj_tz
+
+from core.models import User
+from core.refuel_bot.utils.db import db_sync_to_async
+
+
+logger = logging.getLogger(__name__)
+
+# Ключ кэша: bot_user:<telegram_id>:<поколение>
+CACHE_KEY_PREFIX = "bot_user:"
+# Время жизни в общем кэше (Redis) — 15 минут
+CACHE_TTL = 60 * 15
+# Поколение пользователя: bot_user_gen:<telegram_id>. Инвалидация увеличивает его,
+# и загрузка, начатая до инвалидации, пишет под старым ключом, который уже никто не читает.
+# Живёт дольше данных, чтобы не вернуться к поколению, под которым ещё лежат старые данные
+GENERATION_KEY_PREFIX = "bot_user_gen:"
+GENERATION_TTL = 60 * 60 * 24
+# Локальный LRU процесса: размер и время жизни записи.
+# TTL короткий — страховка на случай потерянного сообщения об инвалидации.
+LOCAL_CACHE_SIZE = 4096
+LOCAL_CACHE_TTL = 60
+# Канал Redis, через который процессы узнают об изменении пользователей
+INVALIDATION_CHANNEL = "bot_user:invalidate"
+
+USER_FIELDS = (
+    "id", "telegram_id", "username", "first_name", "last_name", "is_active",
+    "zone_id", "zone__name", "region_id", "region__name",
+)
+
+
+class SimpleUser:
+    """Лёгкий объект пользователя для обработчиков бота (context.user)."""
+
+    __slots__ = (
+        "id", "telegram_id", "username", "first_name", "last_name",
+        "group_names", "is_superuser", "is_manager", "is_fueler",
+    )
+
+    def __init__(self, data: Dict[str, Any]):
+        self.id = data["id"]
+        self.telegram_id = data["telegram_id"]
+        self.username = data["username"]
+        self.first_name = data["first_name"]
+        self.last_name = data["last_name"]
+        self.group_names = frozenset(data["group_names"])
+        self.is_superuser = "Администратор" in self.group_names
+        self.is_manager = "Менеджер" in self.group_names
+        self.is_fueler = "Заправщик" in self.group_names
+
+    def get_full_name(self) -> str:
+        full_name = f"{self.first_name or ''} {self.last_name or ''}".strip()
+        return full_name or self.username or f"User{self.telegram_id}"
+
+    def has_group(self, name: str) -> bool:
+        return name in self.group_names
+
+
+def _cache_key(telegram_id: int, generation: int) -> str:
+    return f"{CACHE_KEY_PREFIX}{telegram_id}:{generation}"
+
+
+def _generation_key(telegram_id: int) -> str:
+    return f"{GENERATION_KEY_PREFIX}{telegram_id}"
+
+
+def _rows_to_user_data(rows: Iterable[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """
+    Собирает данные пользователей из строк values() с JOIN на группы
+    (по строке на каждую группу пользователя).
+    """
+    users = {}
+    for row in rows:
+        data = users.get(row["telegram_id"])
+        if data is None:
+            data = users[row["telegram_id"]] = {
+                "id": row["id"],
+                "telegram_id": row["telegram_id"],
+                "username": row["username"] or "",
+                "first_name": row["first_name"] or "",
+                "last_name": row["last_name"] or "",
+                "is_active": row["is_active"],
+                "zone_id": row["zone_id"],
+                "zone_name": row["zone__name"],
+                "region_id": row["region_id"],
+                "region_name": row["region__name"],
+                "group_names": [],
+                "fetched_at": dj_tz.now().isoformat(),
+            }
+        if row["groups__name"]:
+            data["group_names"].append(row["groups__name"])
+    return users
+
+
+def _fetch_user_data_sync(telegram_id: int) -> Dict[str, Any] | None:
+    """Загружает пользователя вместе с группами одним запросом."""
+    rows = (
+        User.objects
+        .filter(telegram_id=telegram_id, is_active=True)
+        .values(*USER_FIELDS, "groups__name")
+    )
+    return _rows_to_user_data(rows).get(telegram_id)
+
+
+def _fetch_all_users_data_sync() -> Dict[int, Dict[str, Any]]:
+    """Загружает всех активных пользователей с telegram_id одним запросом."""
+    rows = (
+        User.objects
+        .filter(telegram_id__isnull=False, is_active=True)
+        .values(*USER_FIELDS, "groups__name")
+        .order_by("telegram_id")
+    )
+    return _rows_to_user_data(rows.iterator())
+
+
+def _build_redis_client():
+    """Клиент Redis из настроек кэша (None, если кэш не Redis)."""
+    conf = settings.CACHES.get("default", {})
+    if "redis" not in conf.get("BACKEND", "").lower():
+        return None
+    location = conf["LOCATION"]
+    if isinstance(location, (list, tuple)):
+        location = location[0]
+    return redis.Redis.from_url(location)
+
+
+# Один клиент (и пул соединений) на процесс: соединение открывается при первом запросе
+redis_client = _build_redis_client()
+
+
+class BotUserCache:
+    """
+    Двухуровневый кэш пользователей бота:
+    локальный LRU процесса -> общий кэш (Redis) -> БД.
+    """
+
+    def __init__(self, max_size: int = LOCAL_CACHE_SIZE, local_ttl: int = LOCAL_CACHE_TTL):
+        self.max_size = max_size
+        self.local_ttl = local_ttl
+        self.stats = Counter()
+        # Счётчики растут и в event loop, и в потоках пула БД
+        self._stats_lock = threading.Lock()
+        self._local: OrderedDict[int, tuple[float, SimpleUser]] = OrderedDict()
+        # Локальный кэш меняют и event loop, и поток подписки на инвалидации
+        self._lock = threading.Lock()
+        self._listener = None
+        # Загрузки, которые сейчас выполняются: telegram_id -> Task
+        self._inflight: Dict[int, asyncio.Task] = {}
+        # Растёт при каждой инвалидации в процессе: загрузка, во время которой
+        # был сброс, не кладёт результат в локальный уровень
+        self._epoch = 0
+
+    def count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    # --------------------- Локальный уровень ---------------------
+    def _local_get(self, telegram_id: int) -> SimpleUser | None:
+        with self._lock:
+            item = self._local.get(telegram_id)
+            if item is None:
+                return None
+            expires_at, user = item
+            if expires_at < time.monotonic():
+                del self._local[telegram_id]
+                return None
+            self._local.move_to_end(telegram_id)
+            return user
+
+    def _local_set(self, telegram_id: int, user: SimpleUser, epoch: int | None = None) -> None:
+        """epoch — значение _epoch до загрузки: если с тех пор был сброс, данные могли устареть."""
+        with self._lock:
+            if epoch is not None and epoch != self._epoch:
+                self.count("stale_loads")
+                return
+            self._local[telegram_id] = (time.monotonic() + self.local_ttl, user)
+            self._local.move_to_end(telegram_id)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+    def _local_pop(self, telegram_id: int) -> None:
+        with self._lock:
+            self._epoch += 1
+            self._local.pop(telegram_id, None)
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._epoch += 1
+            self._local.clear()
+
+    # --------------------- Общий кэш и БД ---------------------
+    @staticmethod
+    def _get_generation(telegram_id: int) -> int | None:
+        """Текущее поколение пользователя в общем кэше; None — кэш недоступен."""
+        try:
+            return cache.get(_generation_key(telegram_id), 0)
+        except Exception as e:
+            logger.warning("Cache GET failed for generation of %s: %s", telegram_id, e)
+            return None
+
+    def _load_sync(self, telegram_id: int) -> Dict[str, Any] | None:
+        generation = self._get_generation(telegram_id)
+        user_data = None
+        if generation is not None:
+            cache_key = _cache_key(telegram_id, generation)
+            try:
+                user_data = cache.get(cache_key)
+            except Exception as e:
+                logger.warning("Cache GET failed for %s: %s", telegram_id, e)
+
+        if user_data is not None:
+            self.count("redis_hits")
+            return user_data
+
+        self.count("redis_misses")
+        try:
+            user_data = _fetch_user_data_sync(telegram_id)
+        except Exception:
+            logger.exception("Ошибка при загрузке пользователя telegram_id=%s", telegram_id)
+            return None
+        self.count("db_loads")
+        if user_data is None or generation is None:
+            return user_data
+
+        try:
+            cache.set(cache_key, user_data, timeout=CACHE_TTL)
+        except Exception as e:
+            logger.warning("Cache SET failed for %s: %s", telegram_id, e)
+        return user_data
+
+    async def get(self, telegram_id: int) -> SimpleUser | None:
+        user = self._local_get(telegram_id)
+        if user is not None:
+            self.count("local_hits")
+            return user
+        self.count("local_misses")
+
+        # Одновременные промахи по одному пользователю ждут одну общую загрузку
+        task = self._inflight.get(telegram_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load(telegram_id))
+            self._inflight[telegram_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(telegram_id, None))
+        else:
+            self.count("coalesced")
+
+        # shield: отмена одного обработчика не должна отменять загрузку для остальных
+        return await asyncio.shield(task)
+
+    async def _load(self, telegram_id: int) -> SimpleUser | None:
+        epoch = self._epoch
+        user_data = await db_sync_to_async(self._load_sync)(telegram_id)
+        if user_data is None:
+            return None
+
+        user = SimpleUser(user_data)
+        self._local_set(telegram_id, user, epoch)
+        return user
+
+    # --------------------- Прогрев ---------------------
+    def warm_up_sync(self) -> int:
+        """
+        Загружает всех активных пользователей бота в оба уровня кэша.
+        Возвращает количество загруженных пользователей.
+        """
+        epoch = self._epoch
+        users = _fetch_all_users_data_sync()
+        self.count("db_loads")
+        try:
+            # Поколения читаются после выборки: сброс во время неё увеличит поколение
+            generations = cache.get_many([_generation_key(telegram_id) for telegram_id in users])
+            cache.set_many(
+                {
+                    _cache_key(telegram_id, generations.get(_generation_key(telegram_id), 0)): data
+                    for telegram_id, data in users.items()
+                },
+                timeout=CACHE_TTL,
+            )
+        except Exception as e:
+            logger.warning("Cache SET_MANY failed during warm-up: %s", e)
+
+        for telegram_id, data in list(users.items())[:self.max_size]:
+            self._local_set(telegram_id, SimpleUser(data), epoch)
+        return len(users)
+
+    async def warm_up(self) -> None:
+        try:
+            count = await db_sync_to_async(self.warm_up_sync)()
+        except Exception:
+            # Прогрев — оптимизация, без него бот работает через обычные промахи
+            logger.exception("Не удалось прогреть кэш пользователей бота")
+            return
+        logger.info("Кэш пользователей бота прогрет: %s пользователей", count)
+
+    # --------------------- Инвалидация ---------------------
+    def invalidate(self, telegram_id: int | None) -> None:
+        """Удаляет пользователя из обоих уровней и оповещает другие процессы."""
+        if telegram_id is None:
+            return
+        self.count("invalidations")
+        self._local_pop(telegram_id)
+        generation_key = _generation_key(telegram_id)
+        try:
+            # Новое поколение: данные старого больше не читаются, даже если их допишет загрузка
+            cache.add(generation_key, 0, timeout=GENERATION_TTL)
+            cache.incr(generation_key)
+        except Exception as e:
+            logger.warning("Cache INCR failed for %s: %s", generation_key, e)
+
+        try:
+            if redis_client is not None:
+                redis_client.publish(INVALIDATION_CHANNEL, str(telegram_id))
+        except Exception as e:
+            logger.warning("Publish of user invalidation failed for %s: %s", telegram_id, e)
+
+    def _on_invalidation_message(self, message) -> None:
+        try:
+            self._local_pop(int(message["data"]))
+        except (TypeError, ValueError):
+            logger.warning("Некорректное сообщение об инвалидации: %s", message)
+
+    def _on_listener_error(self, error, pubsub, thread) -> None:
+        # Сообщения за время разрыва могли потеряться — сбрасываем локальный уровень
+        logger.warning("Подписка на инвалидации пользователей прервана: %s", error)
+        self.clear_local()
+        time.sleep(1)
+
+    async def start_listener(self) -> None:
+        """Подписывает процесс на инвалидации из других процессов (только Redis)."""
+        # SUBSCRIBE ждёт ответа Redis — не в event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.start_listener_sync)
+
+    def start_listener_sync(self) -> None:
+        if self._listener is not None:
+            return
+        if redis_client is None:
+            return
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_invalidation_message})
+        self._listener = pubsub.run_in_thread(
+            sleep_time=1.0,
+            daemon=True,
+            exception_handler=self._on_listener_error,
+        )
+        logger.info("Подписка на инвалидации пользователей бота запущена")
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return dict(stats, local_size=len(self._local))
+
+
+user_cache = BotUserCache()
+
+
+def invalidate_bot_user(telegram_id: int | None) -> None:
+    user_cache.invalidate(telegram_id)
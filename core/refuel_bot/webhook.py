@@ -0,0 +1,153 @@
+# core/refuel_bot/webhook.py
+import asyncio
+import hmac
+import json
+import logging
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from telegram import Update
+
+
+logger = logging.getLogger(__name__)
+
+# Заголовок, в котором Telegram передаёт secret_token из setWebhook
+SECRET_HEADER = "HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN"
+
+# Application текущего воркера (создаётся в lifespan ASGI-приложения)
+_application = None
+
+
+class InflightUpdateQueue(asyncio.Queue):
+    """
+    update_queue, считающая принятые и ещё не обработанные обновления.
+    При concurrent_updates > 1 Application сразу забирает обновления из очереди
+    в задачи, qsize() остаётся около нуля; task_done() вызывается только после
+    обработки обновления.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.inflight = 0
+
+    def put_nowait(self, item):
+        super().put_nowait(item)
+        self.inflight += 1
+
+    def task_done(self):
+        super().task_done()
+        self.inflight -= 1
+
+
+def is_webhook_mode() -> bool:
+    return settings.TELEGRAM.get("MODE", "polling") == "webhook"
+
+
+def _get_secret() -> str:
+    secret = settings.TELEGRAM.get("WEBHOOK_SECRET", "")
+    if not secret:
+        raise RuntimeError("TELEGRAM_WEBHOOK_SECRET not set in settings")
+    return secret
+
+
+async def start_webhook_app():
+    """
+    Запускает Application без Updater: обработка идёт из update_queue,
+    которую наполняет telegram_webhook.
+    """
+    global _application
+    if _application is not None:
+        return _application
+
+    _get_secret()
+
+    from core.refuel_bot.main import build_app
+
+    app = build_app(webhook=True)
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    await app.start()
+
+    _application = app
+    logger.info("Telegram application started in webhook mode")
+    return app
+
+
+async def stop_webhook_app():
+    """Останавливает Application, дожидаясь обработки принятых обновлений."""
+    global _application
+    app, _application = _application, None
+    if app is None:
+        return
+
+    await app.stop()
+    if app.post_stop:
+        await app.post_stop(app)
+    await app.shutdown()
+    if app.post_shutdown:
+        await app.post_shutdown(app)
+    logger.info("Telegram application stopped")
+
+
+async def set_webhook():
+    """Регистрирует адрес вебхука в Telegram (вызывается из runbot)."""
+    url = settings.TELEGRAM.get("WEBHOOK_URL", "")
+    if not url:
+        raise RuntimeError("TELEGRAM_WEBHOOK_URL not set in settings")
+
+    from core.refuel_bot.main import build_app
+
+    app = build_app(webhook=True)
+    async with app.bot:
+        await app.bot.set_webhook(
+            url=url,
+            secret_token=_get_secret(),
+            allowed_updates=Update.ALL_TYPES,
+        )
+    logger.info("Telegram webhook set: %s", url)
+
+
+async def delete_webhook():
+    """Снимает вебхук, чтобы вернуться к long polling."""
+    from core.refuel_bot.main import build_app
+
+    app = build_app(webhook=True)
+    async with app.bot:
+        await app.bot.delete_webhook()
+    logger.info("Telegram webhook deleted")
+
+
+@csrf_exempt
+@require_POST
+async def telegram_webhook(request):
+    """
+    Принимает обновление от Telegram и кладёт его в update_queue.
+    Ответ не ждёт обработки: Telegram получает 200 сразу после постановки в очередь.
+    """
+    app = _application
+    if app is None:
+        return HttpResponse(status=503)
+
+    token = request.META.get(SECRET_HEADER, "")
+    if not hmac.compare_digest(token.encode(), _get_secret().encode()):
+        logger.warning("Webhook request with invalid secret token")
+        return HttpResponseForbidden()
+
+    # В очереди и в обработке уже слишком много — 503, Telegram повторит доставку позже
+    max_inflight = settings.TELEGRAM.get("WEBHOOK_MAX_INFLIGHT", 100)
+    if app.update_queue.inflight >= max_inflight:
+        logger.warning("Webhook queue is full (%s updates in flight), rejecting", max_inflight)
+        return HttpResponse(status=503)
+
+    try:
+        data = json.loads(request.body)
+        update = Update.de_json(data, app.bot)
+    except Exception:
+        logger.warning("Malformed webhook payload")
+        return HttpResponseBadRequest()
+
+    await app.update_queue.put(update)
+    return HttpResponse(status=200)
@@ -3,6 +3,12 @@ from django.db import transaction
 from django.db.models import Q, F, Count, Avg, Min, Max
 from django.utils import timezone
 from core.models import Car
+from core.refuel_bot.utils.car_index import invalidate_car_index
+from core.utils.logging import log_action
+
+
+# Сколько кодов автомобилей перечислять в SystemLog
+LOGGED_CODES_LIMIT = 50
 
 
 class CarService:
@@ -64,21 +70,48 @@ class CarService:
         return errors
     
     @staticmethod
-    def bulk_archive_cars(car_ids: List[int], reason: str = "Массовая архивация"):
+    def _log_archive_change(codes: List[str], details: str, user=None) -> None:
+        """Записывает массовую архивацию/восстановление в SystemLog и сбрасывает индекс госномеров бота"""
+        if not codes:
+            return
+        shown = ", ".join(codes[:LOGGED_CODES_LIMIT])
+        if len(codes) > LOGGED_CODES_LIMIT:
+            shown += f" и ещё {len(codes) - LOGGED_CODES_LIMIT}"
+        log_action(user, "info", f"{details}: {len(codes)} автомобилей ({shown})")
+        # UPDATE не вызывает сигналы сохранения
+        invalidate_car_index()
+
+    @staticmethod
+    def bulk_archive_cars(car_ids: List[int], reason: str = "Массовая архивация", user=None):
         """
         Массовая архивация автомобилей
         """
-        archived_count = 0
-        for car_id in car_ids:
-            try:
-                car = Car.objects.get(id=car_id)
-                if not car.is_archived:
-                    car.archive(reason)
-                    archived_count += 1
-            except Car.DoesNotExist:
-                continue
-        
-        return archived_count
+        codes = Car.objects.filter(id__in=car_ids).archive_all()
+        CarService._log_archive_change(codes, f"Архивация ({reason})", user)
+        return len(codes)
+
+    @staticmethod
+    def bulk_restore_cars(car_ids: List[int], user=None):
+        """
+        Массовое восстановление автомобилей из архива
+        """
+        codes = Car.objects.filter(id__in=car_ids).restore_all()
+        CarService._log_archive_change(codes, "Восстановление из архива", user)
+        return len(codes)
+
+    @staticmethod
+    def archive_missing_cars(codes, reason: str, owner_inns=None) -> List[str]:
+        """
+        Архивирует активные автомобили, отсутствующие в списке кодов (выгрузке 1С).
+        owner_inns — проверять только автомобили этих владельцев (выгрузка по ИНН).
+        Возвращает коды архивированных автомобилей.
+        """
+        cars = Car.objects.all()
+        if owner_inns is not None:
+            cars = cars.filter(owner_inn__in=owner_inns)
+        archived_codes = cars.archive_missing(codes)
+        CarService._log_archive_change(archived_codes, f"Архивация ({reason})")
+        return archived_codes
     
     @staticmethod
     def get_age_statistics():
@@ -0,0 +1,235 @@
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from core.models import FuelDailyAggregate, FuelRecord, User
+from core.utils.periods import start_of_day
+
+
+# Поля заправки, от которых зависят дневные итоги
+AGGREGATED_FIELDS = {
+    "car", "employee", "liters", "fuel_type", "source", "filled_at", "historical_region",
+}
+# Размер пакета вставки при пересчёте
+REBUILD_BATCH_SIZE = 1000
+
+# Столбцы ключа строки итогов и цель ON CONFLICT — выражения уникального
+# индекса fuel_daily_aggregates_bucket_uniq (см. FuelDailyAggregate.Meta)
+BUCKET_COLUMNS = ("day", "car_id", "employee_id", "historical_region_id", "zone_id", "fuel_type", "source")
+NULLABLE_BUCKET_COLUMNS = {"employee_id", "historical_region_id", "zone_id"}
+CONFLICT_TARGET = ", ".join(
+    f"(COALESCE({column}, 0))" if column in NULLABLE_BUCKET_COLUMNS else column
+    for column in BUCKET_COLUMNS
+)
+UPSERT_TAIL = f"""
+    ON CONFLICT ({CONFLICT_TARGET}) DO UPDATE SET
+        total_liters = fuel_daily_aggregates.total_liters + excluded.total_liters,
+        record_count = fuel_daily_aggregates.record_count + excluded.record_count,
+        updated_at = excluded.updated_at
+"""
+UPSERT_SQL = f"""
+    INSERT INTO fuel_daily_aggregates ({", ".join(BUCKET_COLUMNS)}, total_liters, record_count, updated_at)
+    VALUES ({", ".join(["%s"] * (len(BUCKET_COLUMNS) + 3))})
+    {UPSERT_TAIL}
+    RETURNING id, total_liters, record_count
+"""
+
+
+class FuelAggregateService:
+    """Поддержка таблицы дневных итогов заправок (FuelDailyAggregate)"""
+
+    @staticmethod
+    def bucket_for(record: FuelRecord) -> Dict[str, Any]:
+        """Ключ строки итогов для заправки (зона — текущая зона заправщика)"""
+        zone_id = None
+        if record.employee_id:
+            zone_id = User.objects.filter(pk=record.employee_id).values_list("zone_id", flat=True).first()
+        return {
+            "day": timezone.localdate(record.filled_at),
+            "car_id": record.car_id,
+            "employee_id": record.employee_id,
+            "historical_region_id": record.historical_region_id,
+            "zone_id": zone_id,
+            "fuel_type": record.fuel_type,
+            "source": record.source,
+        }
+
+    @staticmethod
+    def stored_state(record_id: int) -> Optional[Dict[str, Any]]:
+        """Ключ и литры заправки в том виде, как она учтена в итогах сейчас"""
+        row = FuelRecord.objects.filter(pk=record_id).values(
+            "car_id", "employee_id", "historical_region_id", "fuel_type", "source",
+            "filled_at", "liters", "employee__zone_id",
+        ).first()
+        if row is None:
+            return None
+        return {
+            "bucket": {
+                "day": timezone.localdate(row["filled_at"]),
+                "car_id": row["car_id"],
+                "employee_id": row["employee_id"],
+                "historical_region_id": row["historical_region_id"],
+                "zone_id": row["employee__zone_id"],
+                "fuel_type": row["fuel_type"],
+                "source": row["source"],
+            },
+            "liters": row["liters"],
+        }
+
+    @staticmethod
+    def apply(bucket: Dict[str, Any], liters: Decimal, count: int) -> None:
+        """
+        Прибавляет (или вычитает) литры и число заправок к строке итогов одним
+        INSERT ... ON CONFLICT DO UPDATE: параллельные вставки не создают дублей,
+        приращение не теряется, даже если строки ещё нет. Строка удаляется,
+        только когда и заправок, и литров в ней стало 0.
+        """
+        if not liters and not count:
+            return
+        ops = connection.ops
+        params = [
+            ops.adapt_datefield_value(bucket["day"]),
+            *(bucket[column] for column in BUCKET_COLUMNS[1:]),
+            ops.adapt_decimalfield_value(liters, 14, 2),
+            count,
+            ops.adapt_datetimefield_value(timezone.now()),
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(UPSERT_SQL, params)
+            row_id, total_liters, record_count = cursor.fetchone()
+        if not record_count and not total_liters:
+            # Условие повторено в DELETE: строку могли пополнить после RETURNING
+            FuelDailyAggregate.objects.filter(pk=row_id, record_count=0, total_liters=0).delete()
+
+    @staticmethod
+    @transaction.atomic
+    def reassign(rows, column: str, value: Optional[int]) -> int:
+        """
+        Переносит строки итогов rows в ключ со значением column = value, сливая
+        их со строками, уже существующими под этим ключом. Обычный UPDATE
+        нарушил бы уникальность ключа. Возвращает число перенесённых строк.
+        """
+        rows = rows.exclude(**{column: value}) if value is not None else rows.exclude(**{f"{column}__isnull": True})
+        # Блокировка: до DELETE в эти строки не должны попасть новые приращения
+        ids = list(rows.select_for_update().order_by().values_list("pk", flat=True))
+        if not ids:
+            return 0
+
+        kept = ", ".join(c for c in BUCKET_COLUMNS if c != column)
+        selected = ", ".join("%s" if c == column else c for c in BUCKET_COLUMNS)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        for start in range(0, len(ids), REBUILD_BATCH_SIZE):
+            batch = ids[start:start + REBUILD_BATCH_SIZE]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    INSERT INTO fuel_daily_aggregates ({", ".join(BUCKET_COLUMNS)}, total_liters, record_count, updated_at)
+                    SELECT {selected}, SUM(total_liters), SUM(record_count), %s
+                    FROM fuel_daily_aggregates
+                    WHERE id IN ({", ".join(["%s"] * len(batch))})
+                    GROUP BY {kept}
+                    {UPSERT_TAIL}
+                    """,
+                    [value, now, *batch],
+                )
+            FuelDailyAggregate.objects.filter(pk__in=batch).delete()
+        return len(ids)
+
+    @staticmethod
+    def record_saved(record: FuelRecord, previous: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Переносит заправку из прежней строки итогов (previous) в текущую.
+        Возвращает ключи изменённых строк.
+        """
+        bucket = FuelAggregateService.bucket_for(record)
+        liters = Decimal(str(record.liters))
+        if previous is not None:
+            if previous["bucket"] == bucket:
+                if liters == previous["liters"]:
+                    return []
+                FuelAggregateService.apply(bucket, liters - previous["liters"], 0)
+                return [bucket]
+            FuelAggregateService.apply(previous["bucket"], -previous["liters"], -1)
+            FuelAggregateService.apply(bucket, liters, 1)
+            return [previous["bucket"], bucket]
+        FuelAggregateService.apply(bucket, liters, 1)
+        return [bucket]
+
+    @staticmethod
+    def record_deleted(record: FuelRecord) -> Dict[str, Any]:
+        """Вычитает заправку из итогов; возвращает ключ изменённой строки"""
+        bucket = FuelAggregateService.bucket_for(record)
+        FuelAggregateService.apply(bucket, -Decimal(str(record.liters)), -1)
+        return bucket
+
+    @staticmethod
+    def move_employee_zone(employee_id: int, zone_id: Optional[int]) -> int:
+        """Переносит итоги заправщика в его новую зону"""
+        return FuelAggregateService.reassign(
+            FuelDailyAggregate.objects.filter(employee_id=employee_id), "zone_id", zone_id
+        )
+
+    @staticmethod
+    def detach(column: str, value: int) -> int:
+        """
+        Перед удалением заправщика, региона или зоны: строки итогов переводятся
+        на пустую связь заранее, иначе SET_NULL столкнул бы их ключи
+        """
+        return FuelAggregateService.reassign(
+            FuelDailyAggregate.objects.filter(**{column: value}), column, None
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def rebuild(since=None) -> Dict[str, Any]:
+        """
+        Пересчитывает итоги по исходным заправкам (все или начиная с даты since).
+
+        Returns:
+            Dict: удалено и создано строк, литры и заправки в пересчитанном диапазоне
+        """
+        aggregates = FuelDailyAggregate.objects.all()
+        records = FuelRecord.objects.all()
+        if since:
+            aggregates = aggregates.filter(day__gte=since)
+            records = records.filter(filled_at__gte=start_of_day(since))
+
+        deleted, _ = aggregates.delete()
+        rows = (
+            records.order_by()
+            .annotate(bucket_day=TruncDate("filled_at"), bucket_zone=F("employee__zone"))
+            .values(
+                "bucket_day", "car_id", "employee_id", "historical_region_id",
+                "bucket_zone", "fuel_type", "source",
+            )
+            .annotate(liters_sum=Sum("liters"), records=Count("id"))
+        )
+
+        result = {"deleted": deleted, "created": 0, "liters": Decimal("0"), "records": 0}
+        batch = []
+        for row in rows.iterator(chunk_size=REBUILD_BATCH_SIZE):
+            batch.append(FuelDailyAggregate(
+                day=row["bucket_day"],
+                car_id=row["car_id"],
+                employee_id=row["employee_id"],
+                historical_region_id=row["historical_region_id"],
+                zone_id=row["bucket_zone"],
+                fuel_type=row["fuel_type"],
+                source=row["source"],
+                total_liters=row["liters_sum"],
+                record_count=row["records"],
+            ))
+            result["liters"] += row["liters_sum"]
+            result["records"] += row["records"]
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                FuelDailyAggregate.objects.bulk_create(batch)
+                result["created"] += len(batch)
+                batch = []
+        if batch:
+            FuelDailyAggregate.objects.bulk_create(batch)
+            result["created"] += len(batch)
+        return result
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import random
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from core.clients.google_sheets_limiter import sheets_limiter
+from core.models import GoogleSheetsOutbox, GoogleSheetsRowMapping
+from core.services.google_sheets_service import SHEET_LOCK_TTL, FuelRecordGoogleSheetsService, save_row_mappings
+from core.services.scheduler_service import JobLocks
+from core.utils.logging import log_action
+
+
+logger = logging.getLogger(__name__)
+
+# Пауза между повторами после ошибки: 30 с, 1 мин, 2 мин ... но не больше 30 мин
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 60 * 30
+# Как часто воркер проверяет очередь, секунд
+POLL_INTERVAL = 2
+
+
+class GoogleSheetsOutboxWorker:
+    """
+    Выгружает очередь GoogleSheetsOutbox в Google Sheets пакетами:
+    пакет отправляется, когда набралось batch_size записей или самая старая
+    запись ждёт дольше flush_interval секунд.
+    Рассчитан на один запущенный экземпляр. Пакет пишется под блокировкой
+    листа: полная синхронизация не очистит лист посреди выгрузки пакета.
+
+    dry_run=True — проверка очереди: статусы записей и номера строк в БД
+    не меняются, уже обработанные записи пропускаются до конца работы.
+    """
+
+    def __init__(self, client=None, batch_size=None, flush_interval=None, max_attempts=None, dry_run=False):
+        self.service = FuelRecordGoogleSheetsService(client=client)
+        self.dry_run = dry_run
+        self._dry_run_seen: set[int] = set()
+        self._locks = JobLocks()
+        self.batch_size = batch_size or settings.GSHEET.get("OUTBOX_BATCH_SIZE", 100)
+        self.flush_interval = flush_interval or settings.GSHEET.get("OUTBOX_FLUSH_INTERVAL", 10)
+        self.max_attempts = max_attempts or settings.GSHEET.get("OUTBOX_MAX_ATTEMPTS", 10)
+
+    def _get_batch_sync(self, force: bool) -> list[GoogleSheetsOutbox]:
+        close_old_connections()
+        batch = list(
+            GoogleSheetsOutbox.objects
+            .ready()
+            .exclude(id__in=self._dry_run_seen)
+            .select_related(
+                "fuel_record__car", "fuel_record__employee", "fuel_record__historical_region"
+            )
+            .order_by("id")[:self.batch_size]
+        )
+        if force or len(batch) >= self.batch_size:
+            return batch
+        # Пакет неполный — ждём, пока самая старая запись не задержится дольше flush_interval
+        if batch and batch[0].created_at <= timezone.now() - timedelta(seconds=self.flush_interval):
+            return batch
+        return []
+
+    def _skip_already_synced_sync(self, batch: list[GoogleSheetsOutbox]) -> list[GoogleSheetsOutbox]:
+        """
+        Убирает из пакета записи, которые уже есть в листе (например, выгружены
+        полной или инкрементальной синхронизацией), и отмечает их выгруженными.
+        """
+        synced_ids = set(
+            GoogleSheetsRowMapping.objects
+            .filter(
+                sheet_name=self.service.sheet_name,
+                fuel_record_id__in=[item.fuel_record_id for item in batch],
+            )
+            .values_list("fuel_record_id", flat=True)
+        )
+        if not synced_ids:
+            return batch
+        self._mark_sent_sync([item for item in batch if item.fuel_record_id in synced_ids])
+        return [item for item in batch if item.fuel_record_id not in synced_ids]
+
+    def _mark_sent_sync(self, batch: list[GoogleSheetsOutbox], row_numbers: list[int] = ()) -> None:
+        if self.dry_run:
+            self._dry_run_seen.update(item.id for item in batch)
+            return
+        if row_numbers:
+            save_row_mappings(
+                self.service.sheet_name, [item.fuel_record_id for item in batch], list(row_numbers)
+            )
+        GoogleSheetsOutbox.objects.filter(id__in=[item.id for item in batch]).update(
+            status=GoogleSheetsOutbox.Status.SENT,
+            sent_at=timezone.now(),
+            last_error="",
+        )
+
+    def _mark_failed_sync(self, batch: list[GoogleSheetsOutbox], error: Exception) -> None:
+        if self.dry_run:
+            self._dry_run_seen.update(item.id for item in batch)
+            return
+        now = timezone.now()
+        failed = []
+        for item in batch:
+            item.attempts += 1
+            item.last_error = str(error)
+            if item.attempts >= self.max_attempts:
+                item.status = GoogleSheetsOutbox.Status.FAILED
+                failed.append(item.fuel_record_id)
+            else:
+                delay = min(RETRY_BASE_DELAY * 2 ** (item.attempts - 1), RETRY_MAX_DELAY)
+                # Случайный разброс, чтобы повторы не совпадали с пиками нагрузки
+                item.next_attempt_at = now + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+        GoogleSheetsOutbox.objects.bulk_update(
+            batch, ["attempts", "last_error", "status", "next_attempt_at"]
+        )
+        if failed:
+            log_action(
+                None,
+                "error",
+                f"Google Sheets: не удалось выгрузить записи {failed} за {self.max_attempts} попыток: {error}"
+            )
+
+    async def flush(self, force: bool = False) -> int:
+        """
+        Отправляет один пакет. Возвращает количество выгруженных записей.
+        force=True — не ждать заполнения пакета.
+        """
+        if self.dry_run:
+            # Лист в памяти — блокировать нечего
+            return await self._flush_batch(force)
+        lock_name = self.service.lock_name
+        if not await sync_to_async(self._locks.acquire)(lock_name, SHEET_LOCK_TTL):
+            logger.info("Google Sheets: лист занят синхронизацией, пакет отложен")
+            return 0
+        try:
+            return await self._flush_batch(force)
+        finally:
+            await sync_to_async(self._locks.release)(lock_name)
+
+    async def _flush_batch(self, force: bool) -> int:
+        batch = await sync_to_async(self._get_batch_sync)(force)
+        if not batch:
+            return 0
+        size = len(batch)
+
+        batch = await sync_to_async(self._skip_already_synced_sync)(batch)
+        if not batch:
+            return size
+
+        rows = [self.service._prepare_fuel_record_row(item.fuel_record) for item in batch]
+        try:
+            row_numbers = await self.service.client.batch_append_rows(self.service.sheet_name, rows)
+        except Exception as e:
+            logger.warning("Google Sheets: ошибка выгрузки пакета из %s записей: %s", len(batch), e)
+            await sync_to_async(self._mark_failed_sync)(batch, e)
+            return 0
+
+        await sync_to_async(self._mark_sent_sync)(batch, row_numbers)
+        logger.info(
+            "Google Sheets: выгружено %s записей (запросы к API: %s)",
+            len(batch), sheets_limiter.get_stats()
+        )
+        return size
+
+    async def drain(self) -> int:
+        """Выгружает всё, что готово к отправке, не дожидаясь заполнения пакетов."""
+        total = 0
+        while True:
+            sent = await self.flush(force=True)
+            if not sent:
+                return total
+            total += sent
+
+    async def run_forever(self) -> None:
+        logger.info(
+            "Google Sheets outbox worker started (batch=%s, interval=%ss)",
+            self.batch_size, self.flush_interval
+        )
+        while True:
+            try:
+                sent = await self.flush()
+            except Exception:
+                logger.exception("Google Sheets outbox worker error")
+                sent = 0
+            # Есть ещё полные пакеты — отправляем без паузы
+            if not sent:
+                await asyncio.sleep(POLL_INTERVAL)
@@ -1,19 +1,78 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone as dj_tz
 from asgiref.sync import sync_to_async
 import pytz
 
-from core.clients.google_sheets_client import GoogleSheetsClient
-from core.models import FuelRecord
+from core.clients.google_sheets_client import get_google_sheets_client
+from core.clients.google_sheets_limiter import GoogleSheetsError
+from core.models import FuelRecord, GoogleSheetsOutbox, GoogleSheetsRowMapping, GoogleSheetsSyncState
+from core.services.scheduler_service import JobLocks
 from core.utils.logging import log_action
 
 
+MOSCOW_TZ = pytz.timezone("Europe/Moscow")
+
+# Блокировка записи в лист: sheet_write:<лист>. Воркер очереди и синхронизации
+# не пишут в лист одновременно (полная синхронизация очищает его целиком)
+SHEET_LOCK_PREFIX = "sheet_write:"
+# Предельная длительность записи под блокировкой (TTL ключа без PostgreSQL), секунд
+SHEET_LOCK_TTL = 60 * 30
+# Сколько синхронизация ждёт, пока воркер очереди допишет пакет, секунд
+SHEET_LOCK_WAIT = 30
+
+
+def save_row_mappings(sheet_name: str, record_ids: list[int], row_numbers: list[int]) -> None:
+    """Запоминает, в какие строки листа выгружены записи (для обновления на месте)."""
+    if len(record_ids) != len(row_numbers):
+        # Ответ API без диапазона — номера строк неизвестны, запись обновить не сможем
+        return
+    GoogleSheetsRowMapping.objects.bulk_create(
+        [
+            GoogleSheetsRowMapping(
+                fuel_record_id=record_id, sheet_name=sheet_name, row_number=row_number
+            )
+            for record_id, row_number in zip(record_ids, row_numbers)
+        ],
+        update_conflicts=True,
+        unique_fields=["sheet_name", "fuel_record"],
+        update_fields=["row_number", "synced_at"],
+        batch_size=1000,
+    )
+
+
 class FuelRecordGoogleSheetsService:
     """Сервис для синхронизации записей о заправках с Google Sheets"""
     
-    def __init__(self):
+    def __init__(self, client=None):
         self.sheet_name = settings.GSHEET.get("SHEET_NAME", "Заправки")
-        self.client = GoogleSheetsClient()
+        self.client = client or get_google_sheets_client()
+
+    @property
+    def lock_name(self) -> str:
+        return f"{SHEET_LOCK_PREFIX}{self.sheet_name}"
+
+    @asynccontextmanager
+    async def sheet_lock(self):
+        """Запись в лист под блокировкой, общей с воркером очереди."""
+        locks = JobLocks()
+        deadline = time.monotonic() + SHEET_LOCK_WAIT
+        try:
+            while not await sync_to_async(locks.acquire)(self.lock_name, SHEET_LOCK_TTL):
+                if time.monotonic() >= deadline:
+                    raise GoogleSheetsError("Лист занят другой выгрузкой, повторите позже")
+                await asyncio.sleep(1)
+            try:
+                yield
+            finally:
+                await sync_to_async(locks.release)(self.lock_name)
+        finally:
+            await sync_to_async(locks.close)()
     
     @sync_to_async
     def _get_all_fuel_records(self):
@@ -23,20 +82,119 @@ class FuelRecordGoogleSheetsService:
         ).all())
     
     @sync_to_async
-    def _get_fuel_record_by_id(self, record_id):
-        """Асинхронное получение записи по ID"""
-        try:
-            return FuelRecord.objects.select_related(
-                "car", "employee", "historical_region"
-            ).get(id=record_id)
-        except FuelRecord.DoesNotExist:
-            return None
+    def _get_records_by_ids(self, record_ids):
+        """
+        Записи по ID: (номер строки, запись) для уже выгруженных в лист
+        и записи, которых в листе ещё нет
+        """
+        records = FuelRecord.objects.select_related(
+            "car", "employee", "historical_region"
+        ).filter(id__in=record_ids).order_by("id")
+        row_numbers = dict(
+            GoogleSheetsRowMapping.objects
+            .filter(sheet_name=self.sheet_name, fuel_record_id__in=record_ids)
+            .values_list("fuel_record_id", "row_number")
+        )
+        mapped, unmapped = [], []
+        for record in records:
+            if record.id in row_numbers:
+                mapped.append((row_numbers[record.id], record))
+            else:
+                unmapped.append(record)
+        return mapped, unmapped
     
     @sync_to_async
     def _log_sync_action(self, user, action, details):
         """Асинхронное логирование"""
         return log_action(user, action, details, ip_address=None)
     
+    @sync_to_async
+    def _enqueue_records(self, record_ids: list[int]) -> None:
+        """Ставит записи в очередь выгрузки, если их там ещё нет"""
+        pending_ids = set(
+            GoogleSheetsOutbox.objects.pending()
+            .filter(fuel_record_id__in=record_ids)
+            .values_list("fuel_record_id", flat=True)
+        )
+        GoogleSheetsOutbox.objects.bulk_create(
+            [GoogleSheetsOutbox(fuel_record_id=record_id) for record_id in record_ids if record_id not in pending_ids],
+            batch_size=1000,
+        )
+
+    @sync_to_async
+    def _get_sync_state(self):
+        """Отметка последней синхронизации листа (None, если синхронизации не было)"""
+        return GoogleSheetsSyncState.objects.filter(sheet_name=self.sheet_name).first()
+
+    @sync_to_async
+    def _enqueue_unsynced(self, state: GoogleSheetsSyncState) -> list[int]:
+        """
+        Ставит в очередь выгрузки новые записи, которых нет ни в листе, ни в очереди.
+        Строки добавляет только воркер очереди: две параллельные выгрузки одной
+        записи дали бы две строки в листе. Возвращает id поставленных записей.
+        """
+        mapped_ids = GoogleSheetsRowMapping.objects.filter(sheet_name=self.sheet_name)
+        record_ids = list(
+            FuelRecord.objects
+            .filter(id__gt=state.last_record_id)
+            .exclude(id__in=mapped_ids.values("fuel_record_id"))
+            # В очереди или уже отправлены воркером (ответ API мог быть без номеров строк)
+            .exclude(id__in=GoogleSheetsOutbox.objects.exclude(
+                status=GoogleSheetsOutbox.Status.FAILED
+            ).values("fuel_record_id"))
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        GoogleSheetsOutbox.objects.bulk_create(
+            [GoogleSheetsOutbox(fuel_record_id=record_id) for record_id in record_ids],
+            batch_size=1000,
+        )
+        return record_ids
+
+    @sync_to_async
+    def _get_changed_records(self, state: GoogleSheetsSyncState):
+        """Изменённые после прошлой синхронизации записи вместе с номерами их строк в листе"""
+        records = FuelRecord.objects.select_related("car", "employee", "historical_region")
+        mapped_ids = GoogleSheetsRowMapping.objects.filter(sheet_name=self.sheet_name)
+
+        changed = []
+        if state.last_updated_at:
+            row_numbers = dict(
+                mapped_ids
+                # Изменена после прошлой синхронизации и после выгрузки своей строки
+                .filter(fuel_record__updated_at__gt=state.last_updated_at)
+                .filter(fuel_record__updated_at__gt=F("synced_at"))
+                .values_list("fuel_record_id", "row_number")
+            )
+            changed = [
+                (row_numbers[record.id], record)
+                for record in records.filter(id__in=row_numbers).order_by("id")
+            ]
+        return changed
+
+    @sync_to_async
+    def _save_row_mappings(self, record_ids: list[int], row_numbers: list[int]):
+        """Сохраняет номера строк, в которые выгружены записи"""
+        save_row_mappings(self.sheet_name, record_ids, row_numbers)
+
+    @sync_to_async
+    def _save_sync_state(self, *, last_updated_at, last_record_id=None, replace_mappings=None):
+        """
+        Обновляет отметку синхронизации.
+        replace_mappings=(record_ids, row_numbers) — полностью заменить карту строк листа.
+        """
+        with transaction.atomic():
+            state, _ = GoogleSheetsSyncState.objects.select_for_update().get_or_create(
+                sheet_name=self.sheet_name
+            )
+            if replace_mappings is not None:
+                GoogleSheetsRowMapping.objects.filter(sheet_name=self.sheet_name).delete()
+                save_row_mappings(self.sheet_name, *replace_mappings)
+            if last_record_id is not None:
+                state.last_record_id = max(state.last_record_id, last_record_id)
+            state.last_updated_at = last_updated_at
+            state.save()
+
     def _prepare_fuel_record_row(self, record: FuelRecord) -> list:
         """Подготовка строки для Google Sheets из записи о заправке"""
         # Получаем читаемые значения вместо ленивых объектов
@@ -79,118 +237,177 @@ class FuelRecordGoogleSheetsService:
         """Форматирование даты в московское время"""
         if dt.tzinfo is None:
             dt = dt.replace(tzinfo=timezone.utc)
-        dt_msk = dt.astimezone(pytz.timezone("Europe/Moscow"))
+        dt_msk = dt.astimezone(MOSCOW_TZ)
         return dt_msk.strftime("%d.%m.%Y %H:%M")
     
     async def sync_single_record(self, record_id: int) -> bool:
         """Синхронизация одной записи о заправке по ID"""
+        result = await self.sync_multiple_records([record_id])
+        if not result["total_count"]:
+            await self._log_sync_action(None, "google_sheets_error", f"Запись {record_id} не найдена")
+        return result["success"] and result["synced_count"] == 1
+
+    async def sync_multiple_records(self, record_ids: list[int]) -> dict:
+        """
+        Синхронизация нескольких записей: строки уже выгруженных записей
+        перезаписываются на месте, остальные ставятся в очередь выгрузки —
+        строки в лист добавляет только воркер очереди.
+        """
         try:
-            # Получаем запись асинхронно
-            record = await self._get_fuel_record_by_id(record_id)
-            if not record:
-                await self._log_sync_action(
-                    None,
-                    "google_sheets_error",
-                    f"Запись {record_id} не найдена"
-                )
-                return False
-            
-            row = self._prepare_fuel_record_row(record)
-            await self.client.append_row(self.sheet_name, row)
-            
-            # Логируем успешную синхронизацию
-            await self._log_sync_action(
-                record.employee,
-                "google_sheets_sync",
-                f"Запись о заправке {record.id} синхронизирована с Google Sheets"
-            )
-            return True
-            
+            mapped, unmapped = await self._get_records_by_ids(record_ids)
+            if mapped:
+                async with self.sheet_lock():
+                    await self.client.batch_update_rows(
+                        self.sheet_name,
+                        {row_number: self._prepare_fuel_record_row(record) for row_number, record in mapped},
+                    )
+            await self._enqueue_records([record.id for record in unmapped])
         except Exception as e:
-            # Логируем ошибку
             await self._log_sync_action(
                 None,
                 "google_sheets_error",
-                f"Ошибка синхронизации записи {record_id} с Google Sheets: {str(e)}"
+                f"Ошибка синхронизации записей {record_ids} с Google Sheets: {str(e)}"
             )
-            return False
-    
-    async def sync_multiple_records(self, record_ids: list[int]) -> dict:
-        """Синхронизация нескольких записей"""
-        success_count = 0
-        total_count = len(record_ids)
-        
-        for record_id in record_ids:
-            if await self.sync_single_record(record_id):
-                success_count += 1
-        
+            return {
+                "success": False,
+                "synced_count": 0,
+                "total_count": len(record_ids),
+                "error": str(e)
+            }
+
+        message = f"Обновлено {len(mapped)} записей, поставлено в очередь выгрузки {len(unmapped)}"
+        await self._log_sync_action(None, "google_sheets_sync", f"Google Sheets: {message}")
         return {
             "success": True,
-            "synced_count": success_count,
-            "total_count": total_count,
-            "message": f"Синхронизировано {success_count} из {total_count} записей"
+            "synced_count": len(mapped) + len(unmapped),
+            "total_count": len(mapped) + len(unmapped),
+            "message": message
         }
     
     async def sync_all_records(self) -> dict:
         """Синхронизация всех записей о заправках"""
         try:
-            # Получаем все записи о заправках асинхронно
-            records = await self._get_all_fuel_records()
-            
-            # Подготавливаем данные
-            rows = []
-            for record in records:
-                rows.append(self._prepare_fuel_record_row(record))
-            
-            # Очищаем лист
-            await self.client.clear_sheet(self.sheet_name)
-            
-            # Добавляем заголовки
-            headers = [
-                "Дата заправки",
-                "Госномер",
-                "Модель авто",
-                "Литры",
-                "Тип топлива",
-                "Способ заправки",
-                "Сотрудник",
-                "Подразделение",
-                "Регион",
-                "Подтверждено",
-                "Примечания",
-                "Дата создания"
-            ]
-            
-            # Добавляем заголовки и все данные одним пакетом
-            all_data = [headers] + rows
-            await self.client.batch_append_rows(self.sheet_name, all_data)
-            
-            # Логируем успешную синхронизацию
+            async with self.sheet_lock():
+                return await self._sync_all_records_locked()
+        except Exception as e:
+            # Логируем ошибку
             await self._log_sync_action(
                 None,
-                "google_sheets_sync",
-                f"Синхронизировано {len(rows)} записей о заправках с Google Sheets"
+                "google_sheets_error",
+                f"Ошибка массовой синхронизации с Google Sheets: {str(e)}"
+            )
+            return {
+                "success": False,
+                "synced_count": 0,
+                "error": str(e)
+            }
+
+    async def _sync_all_records_locked(self) -> dict:
+        """Переписывает лист целиком; вызывается под блокировкой листа"""
+        started_at = dj_tz.now()
+        # Получаем все записи о заправках асинхронно
+        records = await self._get_all_fuel_records()
+        
+        # Подготавливаем данные
+        rows = []
+        for record in records:
+            rows.append(self._prepare_fuel_record_row(record))
+        
+        # Очищаем лист
+        await self.client.clear_sheet(self.sheet_name)
+        
+        # Добавляем заголовки
+        headers = [
+            "Дата заправки",
+            "Госномер",
+            "Модель авто",
+            "Литры",
+            "Тип топлива",
+            "Способ заправки",
+            "Сотрудник",
+            "Подразделение",
+            "Регион",
+            "Подтверждено",
+            "Примечания",
+            "Дата создания"
+        ]
+        
+        # Добавляем заголовки и все данные одним пакетом
+        all_data = [headers] + rows
+        row_numbers = await self.client.batch_append_rows(self.sheet_name, all_data)
+
+        # Лист переписан целиком: новая карта строк и отметка для инкрементального режима
+        record_ids = [record.id for record in records]
+        await self._save_sync_state(
+            last_updated_at=started_at,
+            last_record_id=max(record_ids, default=0),
+            replace_mappings=(record_ids, (row_numbers or [])[1:]),
+        )
+        
+        # Логируем успешную синхронизацию
+        await self._log_sync_action(
+            None,
+            "google_sheets_sync",
+            f"Синхронизировано {len(rows)} записей о заправках с Google Sheets"
+        )
+        
+        return {
+            "success": True,
+            "synced_count": len(rows),
+            "message": f"Успешно синхронизировано {len(rows)} записей"
+        }
+
+    async def sync_incremental(self) -> dict:
+        """
+        Инкрементальная синхронизация: перезаписывает на месте строки записей,
+        изменённых после прошлой синхронизации. Новые записи не добавляются
+        напрямую, а ставятся в очередь выгрузки (если их там нет) — строки
+        в лист добавляет только воркер очереди.
+        Без сохранённой отметки выполняется полная синхронизация.
+        Запись в лист — под блокировкой листа, общей с воркером очереди.
+        """
+        try:
+            state = await self._get_sync_state()
+            if state is None:
+                return await self.sync_all_records()
+
+            started_at = dj_tz.now()
+            changed = await self._get_changed_records(state)
+
+            if changed:
+                async with self.sheet_lock():
+                    await self.client.batch_update_rows(
+                        self.sheet_name,
+                        {row_number: self._prepare_fuel_record_row(record) for row_number, record in changed},
+                    )
+
+            enqueued = await self._enqueue_unsynced(state)
+            await self._save_sync_state(
+                last_updated_at=started_at, last_record_id=enqueued[-1] if enqueued else None
             )
-            
+
+            message = (
+                f"Обновлено {len(changed)} записей, поставлено в очередь выгрузки {len(enqueued)}"
+            )
+            await self._log_sync_action(None, "google_sheets_sync", f"Google Sheets: {message}")
             return {
                 "success": True,
-                "synced_count": len(rows),
-                "message": f"Успешно синхронизировано {len(rows)} записей"
+                "synced_count": len(changed),
+                "message": message,
             }
-            
+
         except Exception as e:
-            # Логируем ошибку
             await self._log_sync_action(
                 None,
                 "google_sheets_error",
-                f"Ошибка массовой синхронизации с Google Sheets: {str(e)}"
+                f"Ошибка инкрементальной синхронизации с Google Sheets: {str(e)}"
             )
             return {
                 "success": False,
                 "synced_count": 0,
                 "error": str(e)
             }
-    
+
     async def get_synced_data(self) -> list[dict]:
         """Получение данных из Google Sheets"""
         try:
@@ -0,0 +1,310 @@
+import asyncio
+import logging
+import random
+import socket
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from django.utils import timezone
+
+from core.models import GoogleSheetsOutbox, ScheduledJobRun
+from core.utils.logging import log_action, log_sync_failure, log_sync_success
+
+
+logger = logging.getLogger(__name__)
+
+# Ключ блокировки в кэше, если БД не PostgreSQL: scheduler_lock:<задача>
+LOCK_CACHE_KEY_PREFIX = "scheduler_lock:"
+# Пространство ключей advisory-блокировок планировщика
+LOCK_NAMESPACE = "nextbot.scheduler"
+
+
+class JobLocks:
+    """
+    Взаимное исключение задач между процессами (несколько планировщиков,
+    перезапуск контейнера поверх зависшего процесса).
+
+    В PostgreSQL — сессионные advisory-блокировки на отдельном соединении:
+    оно не закрывается вместе с соединением задач, а при падении процесса
+    блокировки снимаются сервером. В остальных БД — ключ в кэше с TTL.
+    Все вызовы выполняются в одном потоке (sync_to_async по умолчанию).
+    """
+
+    def __init__(self):
+        self._connection = None
+
+    @staticmethod
+    def _key(name: str) -> int:
+        return zlib.crc32(f"{LOCK_NAMESPACE}:{name}".encode("utf-8"))
+
+    def _get_connection(self):
+        if self._connection is not None and self._connection.connection is not None:
+            if not self._connection.is_usable():
+                # Соединение потеряно — вместе с ним сервер снял и блокировки
+                self._connection.close()
+                self._connection = None
+        if self._connection is None:
+            self._connection = connections.create_connection(DEFAULT_DB_ALIAS)
+        return self._connection
+
+    @property
+    def _use_advisory(self) -> bool:
+        return connections[DEFAULT_DB_ALIAS].vendor == "postgresql"
+
+    def acquire(self, name: str, ttl: int) -> bool:
+        if not self._use_advisory:
+            return cache.add(f"{LOCK_CACHE_KEY_PREFIX}{name}", socket.gethostname(), timeout=ttl)
+        with self._get_connection().cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [self._key(name)])
+            return cursor.fetchone()[0]
+
+    def release(self, name: str) -> None:
+        if not self._use_advisory:
+            cache.delete(f"{LOCK_CACHE_KEY_PREFIX}{name}")
+            return
+        try:
+            with self._get_connection().cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [self._key(name)])
+        except Exception as e:
+            logger.warning("Scheduler: не удалось снять блокировку %s: %s", name, e)
+
+    def close(self) -> None:
+        """Закрывает соединение блокировок (сервер снимает оставшиеся advisory-блокировки)."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class JobContext:
+    """Контекст запуска: задача отмечает этапы, их длительность попадает в историю."""
+
+    def __init__(self, job_name: str):
+        self.job_name = job_name
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(self.phases.get(name, 0) + time.monotonic() - started, 3)
+
+
+JobFunc = Callable[[JobContext], Awaitable[Optional[dict]]]
+
+
+class ScheduledJob:
+    """
+    Периодическая задача. interval — пауза между окончанием запуска и началом
+    следующего, timeout — предельная длительность запуска, секунд.
+    """
+
+    def __init__(self, name: str, func: JobFunc, interval: int, timeout: int, run_on_start: bool = True):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.timeout = timeout
+        self.run_on_start = run_on_start
+
+    def __repr__(self):
+        return f"<ScheduledJob {self.name} every {self.interval}s>"
+
+
+class JobScheduler:
+    """
+    Планировщик в одном процессе asyncio: у каждой задачи свой цикл,
+    запуски одной задачи не пересекаются, между процессами — JobLocks.
+    Каждый запуск (и пропуск из-за блокировки) записывается в ScheduledJobRun.
+    """
+
+    def __init__(self, jobs: List[ScheduledJob], jitter: Optional[int] = None, locks: Optional[JobLocks] = None):
+        self.jobs = {job.name: job for job in jobs}
+        self.jitter = settings.SCHEDULER.get("JITTER_SECONDS", 60) if jitter is None else jitter
+        self.locks = locks or JobLocks()
+        self.hostname = socket.gethostname()
+
+    @sync_to_async
+    def _start_run(self, job: ScheduledJob, status=ScheduledJobRun.Status.RUNNING) -> ScheduledJobRun:
+        # Процесс живёт долго: соединение могло устареть или оборваться
+        close_old_connections()
+        run = ScheduledJobRun(job_name=job.name, status=status, hostname=self.hostname)
+        if status != ScheduledJobRun.Status.RUNNING:
+            run.finished_at = run.started_at
+            run.duration = 0
+        run.save()
+        return run
+
+    @sync_to_async
+    def _finish_run(self, run: ScheduledJobRun) -> None:
+        run.finished_at = timezone.now()
+        run.save(update_fields=["status", "finished_at", "duration", "phases", "result", "error"])
+
+    async def run_job(self, job: ScheduledJob) -> ScheduledJobRun:
+        """Один запуск задачи под блокировкой, с таймаутом и записью в историю."""
+        if not await sync_to_async(self.locks.acquire)(job.name, job.timeout):
+            logger.info("Scheduler: %s уже выполняется в другом процессе, пропуск", job.name)
+            return await self._start_run(job, status=ScheduledJobRun.Status.SKIPPED)
+
+        ctx = JobContext(job.name)
+        started = time.monotonic()
+        run = None
+        try:
+            run = await self._start_run(job)
+            logger.info("Scheduler: %s запущена", job.name)
+            run.result = await asyncio.wait_for(job.func(ctx), timeout=job.timeout) or {}
+            run.status = ScheduledJobRun.Status.SUCCESS
+        except asyncio.TimeoutError:
+            run.status = ScheduledJobRun.Status.TIMEOUT
+            run.error = f"Превышено время выполнения ({job.timeout} с)"
+            logger.error("Scheduler: %s — %s", job.name, run.error)
+        except asyncio.CancelledError:
+            if run is not None:
+                run.status = ScheduledJobRun.Status.FAILED
+                run.error = "Прервано остановкой планировщика"
+            raise
+        except Exception as e:
+            if run is None:
+                raise
+            run.status = ScheduledJobRun.Status.FAILED
+            run.error = str(e)
+            logger.exception("Scheduler: %s завершилась с ошибкой", job.name)
+        finally:
+            # Снятие блокировки идёт в том же потоке, что и работа задачи с БД:
+            # после таймаута оно дождётся окончания уже начатого синхронного вызова
+            await sync_to_async(self.locks.release)(job.name)
+            if run is not None:
+                run.duration = round(time.monotonic() - started, 3)
+                run.phases = ctx.phases
+                await self._finish_run(run)
+
+        logger.info(
+            "Scheduler: %s — %s за %.1f с %s",
+            job.name, run.get_status_display(), run.duration, ctx.phases
+        )
+        return run
+
+    async def _job_loop(self, job: ScheduledJob) -> None:
+        # Случайный сдвиг, чтобы задачи разных процессов не стартовали одновременно
+        delay = random.uniform(0, self.jitter)
+        if not job.run_on_start:
+            delay += job.interval
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Ошибка записи истории или блокировки — задача продолжит по расписанию
+                logger.exception("Scheduler: сбой запуска %s", job.name)
+            delay = job.interval + random.uniform(0, self.jitter)
+
+    async def run_forever(self) -> None:
+        logger.info("Scheduler started: %s", list(self.jobs.values()))
+        await asyncio.gather(*(self._job_loop(job) for job in self.jobs.values()))
+
+
+# --------------------- Задачи ---------------------
+
+async def sync_cars_job(ctx: JobContext) -> dict:
+    """Синхронизация автомобилей с 1С:Элемент."""
+    from core.clients.element_car_client import ElementCarClient
+
+    async with ElementCarClient() as client:
+        with ctx.phase("check_availability"):
+            available = await client.check_availability()
+        if not available:
+            await log_sync_failure("API недоступен")
+            raise RuntimeError("API 1С:Элемент недоступен")
+        with ctx.phase("sync"):
+            stats = await client.sync_with_database()
+
+    await log_sync_success(
+        f"Синхронизация автомобилей по расписанию: создано {stats['created']}, "
+        f"обновлено {stats['updated']}, архивировано {stats['archived']}, "
+        f"без изменений {stats['skipped']}",
+        stats,
+    )
+    return stats
+
+
+async def sync_gsheets_job(ctx: JobContext) -> dict:
+    """Инкрементальная синхронизация заправок с Google Sheets."""
+    from core.clients.google_sheets_limiter import sheets_limiter
+    from core.services.google_sheets_service import FuelRecordGoogleSheetsService
+
+    with ctx.phase("sync"):
+        result = await FuelRecordGoogleSheetsService().sync_incremental()
+    if not result["success"]:
+        raise RuntimeError(result["error"])
+    return {**result, "api_requests": sheets_limiter.get_stats()}
+
+
+async def archive_empty_regions_job(ctx: JobContext) -> dict:
+    """Архивация регионов без активных автомобилей."""
+    from core.services.region_service import RegionService
+
+    with ctx.phase("archive"):
+        result = await sync_to_async(RegionService.archive_empty_regions)(dry_run=False)
+    if result["archived"]:
+        await sync_to_async(log_action)(
+            None,
+            "info",
+            f"Архивировано регионов без активных автомобилей: {result['archived']} "
+            f"({', '.join(region['name'] for region in result['regions'])})",
+        )
+    return {"archived": result["archived"], "regions": [region["name"] for region in result["regions"]]}
+
+
+async def reports_job(ctx: JobContext) -> dict:
+    """Сводные отчёты по автопарку и регионам (итог сохраняется в истории запусков)."""
+    from core.services.car_service import CarService
+    from core.services.region_service import RegionService
+
+    with ctx.phase("fleet_age"):
+        fleet_age = await sync_to_async(CarService.get_fleet_age_report)()
+    with ctx.phase("region_health"):
+        region_health = await sync_to_async(RegionService.get_region_health_report)()
+    return {"fleet_age": fleet_age, "region_health": region_health}
+
+
+async def cleanup_job(ctx: JobContext) -> dict:
+    """Удаление выгруженных записей очереди Google Sheets и старой истории запусков."""
+    days = settings.SCHEDULER.get("HISTORY_DAYS", 30)
+    with ctx.phase("gsheets_outbox"):
+        outbox_deleted, _ = await sync_to_async(GoogleSheetsOutbox.objects.purge_sent)()
+    with ctx.phase("job_history"):
+        runs_deleted, _ = await sync_to_async(ScheduledJobRun.objects.purge_older_than)(days)
+    return {"outbox_deleted": outbox_deleted, "runs_deleted": runs_deleted}
+
+
+def get_default_jobs() -> List[ScheduledJob]:
+    """
+    Задачи по настройкам SYNC_CARS_SCHEDULE_MINUTES и SCHEDULER.
+    Интервал 0 отключает задачу; интеграции без настроек не регистрируются.
+    """
+    config = settings.SCHEDULER
+    timeout = config.get("JOB_TIMEOUT_MINUTES", 30) * 60
+    hour = 60 * 60
+    jobs = []
+
+    if settings.ELEMENT_API.get("URL") and settings.SYNC_CARS_SCHEDULE_MINUTES:
+        jobs.append(ScheduledJob("sync_cars", sync_cars_job, settings.SYNC_CARS_SCHEDULE_MINUTES * 60, timeout))
+    if settings.GSHEET.get("SPREADSHEET_ID") and config.get("GSHEETS_SYNC_MINUTES"):
+        jobs.append(ScheduledJob("sync_gsheets", sync_gsheets_job, config["GSHEETS_SYNC_MINUTES"] * 60, timeout))
+    if config.get("ARCHIVE_REGIONS_HOURS"):
+        jobs.append(ScheduledJob(
+            "archive_empty_regions", archive_empty_regions_job, config["ARCHIVE_REGIONS_HOURS"] * hour, timeout,
+        ))
+    if config.get("REPORTS_HOURS"):
+        jobs.append(ScheduledJob("reports", reports_job, config["REPORTS_HOURS"] * hour, timeout))
+    # Обслуживание не срочное — первый запуск через сутки после старта
+    jobs.append(ScheduledJob("cleanup", cleanup_job, 24 * hour, timeout, run_on_start=False))
+    return jobs
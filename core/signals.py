@@ -1,13 +1,16 @@
 # core/signals.py
-from asgiref.sync import async_to_sync
-from django.db.models.signals import post_migrate, post_save
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import Group, Permission
 from django.contrib.auth.signals import user_logged_in, user_logged_out
 from django.contrib.contenttypes.models import ContentType
 
-from core.models import FuelRecord, Car, Region, Zone
-from core.services.google_sheets_service import FuelRecordGoogleSheetsService
+from core.models import FuelRecord, Car, GoogleSheetsOutbox, Region, User, Zone
+from core.refuel_bot.utils.car_index import invalidate_car_index
+from core.refuel_bot.utils.report_cache import invalidate_reports, invalidate_reports_for_buckets
+from core.refuel_bot.utils.user_cache import invalidate_bot_user
+from core.services.fuel_aggregate_service import AGGREGATED_FIELDS, FuelAggregateService
 from core.utils.logging import log_action
 
 
@@ -63,19 +66,132 @@ def create_default_groups(sender, **kwargs):
 
 
 @receiver(post_save, sender=FuelRecord)
-def sync_fuel_record_to_google_sheets(sender, instance, created, **kwargs):
+def enqueue_fuel_record_for_google_sheets(sender, instance, created, **kwargs):
     """
-    Автоматическая синхронизация новой записи о заправке с Google Sheets
+    Ставит новую запись о заправке в очередь выгрузки в Google Sheets.
+    Выгрузку выполняет воркер run_gsheets_outbox, сохранение не ждёт Google.
     """
     if created:
-        # Используем async_to_sync для вызова асинхронного кода из синхронного контекста
-        try:
-            service = FuelRecordGoogleSheetsService()
-            async_to_sync(service.sync_single_record)(instance.id)
-        except Exception as e:
-            # Логируем ошибку, но не прерываем выполнение
-            print(f"Ошибка синхронизации с Google Sheets: {e}")
-            
+        GoogleSheetsOutbox.objects.create(fuel_record=instance)
+
+
+@receiver(pre_save, sender=FuelRecord)
+def remember_fuel_record_aggregate(sender, instance, update_fields=None, **kwargs):
+    """
+    Запоминает, в какой строке дневных итогов заправка учтена сейчас.
+    Сохранения, не затрагивающие итоги (approve/reject), пропускаются без запросов.
+    """
+    instance._skip_aggregate = update_fields is not None and not {
+        field.removesuffix("_id") for field in update_fields
+    } & AGGREGATED_FIELDS
+    instance._aggregate_previous = None
+    if instance.pk and not instance._skip_aggregate:
+        instance._aggregate_previous = FuelAggregateService.stored_state(instance.pk)
+
+
+@receiver(post_save, sender=FuelRecord)
+def update_fuel_daily_aggregate(sender, instance, **kwargs):
+    """
+    Обновляет дневные итоги заправок (FuelRecord.save выполняется в транзакции)
+    и сбрасывает кэш затронутых отчётов бота
+    """
+    if not getattr(instance, "_skip_aggregate", False):
+        buckets = FuelAggregateService.record_saved(instance, getattr(instance, "_aggregate_previous", None))
+        invalidate_reports_for_buckets(*buckets)
+
+
+@receiver(post_delete, sender=FuelRecord)
+def remove_fuel_record_from_aggregate(sender, instance, **kwargs):
+    """
+    Вычитает удалённую заправку из дневных итогов и сбрасывает кэш затронутых отчётов
+    """
+    invalidate_reports_for_buckets(FuelAggregateService.record_deleted(instance))
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+def invalidate_car_plate_index(sender, instance, **kwargs):
+    """
+    Сброс индекса госномеров бота при изменении автомобиля
+    (после коммита: иначе бот успеет перестроить индекс по старым данным)
+    """
+    transaction.on_commit(invalidate_car_index)
+
+
+def _invalidate_bot_users_on_commit(*telegram_ids):
+    for telegram_id in {t for t in telegram_ids if t}:
+        transaction.on_commit(lambda t=telegram_id: invalidate_bot_user(t))
+
+
+@receiver(pre_save, sender=User)
+def remember_user_telegram_id(sender, instance, **kwargs):
+    """
+    Запоминает прежние telegram_id (при его смене сбрасывается и старая запись кэша)
+    и зону (при её смене переносятся дневные итоги заправок)
+    """
+    instance._old_telegram_id = None
+    instance._old_zone_id = None
+    if instance.pk:
+        old = User.objects.filter(pk=instance.pk).values("telegram_id", "zone_id").first() or {}
+        instance._old_telegram_id = old.get("telegram_id")
+        instance._old_zone_id = old.get("zone_id")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_bot_user_cache(sender, instance, **kwargs):
+    """
+    Сброс кэша пользователя бота при изменении или удалении пользователя
+    """
+    _invalidate_bot_users_on_commit(
+        instance.telegram_id, getattr(instance, "_old_telegram_id", None)
+    )
+
+
+@receiver(post_save, sender=User)
+def move_fuel_aggregates_on_zone_change(sender, instance, created, **kwargs):
+    """
+    Зона в дневных итогах — текущая зона заправщика: при смене зоны итоги переносятся
+    """
+    old_zone_id = getattr(instance, "_old_zone_id", None)
+    if not created and instance.zone_id != old_zone_id:
+        FuelAggregateService.move_employee_zone(instance.pk, instance.zone_id)
+        invalidate_reports(("zone", old_zone_id), ("zone", instance.zone_id), ("employee", instance.pk))
+
+
+@receiver(pre_delete, sender=User)
+@receiver(pre_delete, sender=Region)
+@receiver(pre_delete, sender=Zone)
+def detach_fuel_aggregates(sender, instance, **kwargs):
+    """
+    Переводит дневные итоги удаляемого заправщика, региона или зоны на пустую
+    связь до SET_NULL, сливая строки с совпавшим ключом
+    """
+    column = {User: "employee_id", Region: "historical_region_id", Zone: "zone_id"}[sender]
+    FuelAggregateService.detach(column, instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_bot_user_cache_on_groups(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Сброс кэша пользователей бота при изменении состава групп
+    """
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    if not reverse:
+        # user.groups.add(...) / remove(...) / clear()
+        _invalidate_bot_users_on_commit(instance.telegram_id)
+        return
+
+    # group.user_set.add(...) / remove(...) / clear()
+    users = User.objects.filter(telegram_id__isnull=False)
+    if action == "pre_clear":
+        users = users.filter(groups=instance)
+    else:
+        users = users.filter(pk__in=pk_set or ())
+    _invalidate_bot_users_on_commit(*users.values_list("telegram_id", flat=True))
+
 
 @receiver(user_logged_in)
 def log_user_login(sender, request, user, **kwargs):
@@ -0,0 +1,182 @@
+import os
+import pickle
+from datetime import datetime, timezone
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from telegram import Chat, Message, Update, User
+from telegram.ext import ApplicationBuilder, ConversationHandler, MessageHandler, TypeHandler, filters
+
+from core.refuel_bot.utils.persistence import STAMP_SIZE, RedisPersistence, SharedConversationHandler
+
+
+def stored(data):
+    return os.urandom(STAMP_SIZE) + pickle.dumps(data)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        # Команды копятся и выполняются в execute(), как в redis-py
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [getattr(self.redis, f"_{name}")(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class FakeRedis:
+    """Общий Redis воркеров в памяти: строки и хэши"""
+
+    def __init__(self):
+        self.strings = {}
+        self.hashes = {}
+
+    @staticmethod
+    def _name(key):
+        return key.decode() if isinstance(key, bytes) else key
+
+    async def scan_iter(self, match, count):
+        for key in list(self.hashes):
+            yield key.encode()
+
+    def pipeline(self, transaction):
+        return FakePipeline(self)
+
+    async def get(self, key):
+        return self.strings.get(self._name(key))
+
+    async def hgetall(self, key):
+        return self._hgetall(key)
+
+    def _hgetall(self, key):
+        return {field.encode(): value for field, value in self.hashes.get(self._name(key), {}).items()}
+
+    def _set(self, key, value, ex=None):
+        self.strings[self._name(key)] = value
+
+    def _delete(self, key):
+        self.strings.pop(self._name(key), None)
+        self.hashes.pop(self._name(key), None)
+
+    def _hset(self, key, field, value):
+        self.hashes.setdefault(self._name(key), {})[self._name(field)] = value
+
+    def _hdel(self, key, field):
+        fields = self.hashes.get(self._name(key), {})
+        fields.pop(self._name(field), None)
+        if not fields:
+            self.hashes.pop(self._name(key), None)
+
+    def _expire(self, key, ttl):
+        pass
+
+
+class RedisPersistenceTests(SimpleTestCase):
+    """Состояние бота в Redis: загрузка диалогов и память известных значений"""
+
+    def setUp(self):
+        self.persistence = RedisPersistence(url="redis://localhost:6379/15")
+        patcher = mock.patch.object(RedisPersistence, "_schedule_flush")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_conversations_loaded_at_startup(self):
+        self.persistence._redis = FakeRedis()
+        self.persistence._redis.hashes = {
+            "nextbot:bot:chat:1": {"data": stored({"a": 1}), "conv:fuel:[1,1]": stored(3)},
+            "nextbot:bot:chat:2": {"conv:report:[2,2]": stored(5)},
+        }
+        conversations = async_to_sync(self.persistence.get_conversations)("fuel")
+        self.assertEqual(conversations, {(1, 1): 3})
+
+    def test_ended_conversation_is_forgotten(self):
+        async def run():
+            await self.persistence.update_conversation("fuel", (1, 1), 3)
+            await self.persistence.update_conversation("fuel", (1, 1), None)
+
+        async_to_sync(run)()
+        self.assertEqual(self.persistence._known, {})
+
+    def test_known_values_are_bounded(self):
+        async def run():
+            for user_id in range(5):
+                await self.persistence.update_user_data(user_id, {"step": user_id})
+
+        with mock.patch("core.refuel_bot.utils.persistence.KNOWN_MAX_KEYS", 3):
+            async_to_sync(run)()
+        self.assertEqual(
+            list(self.persistence._known),
+            [self.persistence._user_key(user_id) for user_id in (2, 3, 4)],
+        )
+
+
+class SharedConversationTests(SimpleTestCase):
+    """Шаги одного диалога обрабатывают разные воркеры с общим Redis"""
+
+    def setUp(self):
+        patcher = mock.patch.object(RedisPersistence, "_schedule_flush")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.redis = FakeRedis()
+        self.steps = []
+
+    def build_worker(self, name):
+        async def middleware(update, context):
+            pass
+
+        def step(text, state):
+            async def callback(update, context):
+                self.steps.append((text, name))
+                return state
+            return MessageHandler(filters.Regex(f"^{text}$"), callback)
+
+        persistence = RedisPersistence(url="redis://localhost:6379/15")
+        persistence._redis = self.redis
+        app = ApplicationBuilder().token("123:secret").persistence(persistence).updater(None).build()
+        # Без запросов к Telegram: getMe уже «выполнен»
+        app.bot._bot_user = User(123, "bot", True, username="test_bot")
+        app.bot._bot_initialized = app.bot._requests_initialized = True
+        # Как access_middleware: контекст (и refresh_*) создаётся до проверки диалога
+        app.add_handler(TypeHandler(Update, middleware), group=-1)
+        app.add_handler(SharedConversationHandler(
+            entry_points=[step("start", 1)],
+            states={1: [step("next", 2)], 2: [step("done", ConversationHandler.END)]},
+            fallbacks=[],
+            name="fuel_conversation",
+            persistent=True,
+        ))
+        persistence.track_conversations(app)
+        return app, persistence
+
+    @staticmethod
+    def message(update_id, text):
+        chat = Chat(1, Chat.PRIVATE)
+        user = User(1, "fueler", False)
+        return Update(update_id, message=Message(update_id, datetime.now(timezone.utc), chat, from_user=user, text=text))
+
+    def test_any_worker_continues_conversation(self):
+        async def run():
+            workers = [self.build_worker("A"), self.build_worker("B")]
+            for app, _ in workers:
+                await app.initialize()
+            for update_id, (text, (app, persistence)) in enumerate(
+                [("start", workers[0]), ("next", workers[1]), ("done", workers[0]), ("next", workers[1])]
+            ):
+                await app.process_update(self.message(update_id, text))
+                await app.update_persistence()
+                await persistence._write_pending()
+
+        async_to_sync(run)()
+        # Последнее «next» вне диалога: диалог завершил воркер A
+        self.assertEqual(self.steps, [("start", "A"), ("next", "B"), ("done", "A")])
+        self.assertEqual(self.redis.hashes, {})
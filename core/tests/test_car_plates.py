@@ -0,0 +1,87 @@
+from importlib import import_module
+
+from django.apps import apps
+from django.core.cache import cache
+from django.test import TestCase
+
+from core.models import Car
+from core.refuel_bot.handlers.report import aggregate_car_text
+from core.refuel_bot.utils.car_index import VERSION_CACHE_KEY
+from core.refuel_bot.utils.validate_state_plate import normalize_plate_input
+
+fill_normalized_plates = import_module("core.migrations.0009_car_normalized_plate").fill_normalized_plates
+
+
+class CarPlateTests(TestCase):
+    """Нормализованный госномер: заполнение, уникальность среди активных, поиск"""
+
+    def car(self, code, state_number, **fields):
+        return Car.objects.create(code=code, state_number=state_number, model="Lada", **fields)
+
+    def test_normalize_plate_input(self):
+        self.assertEqual(normalize_plate_input("a 123 bc 77"), "А123ВС77")
+        self.assertEqual(normalize_plate_input(" А123ВС777"), "А123ВС777")
+
+    def test_find_by_plate_in_any_spelling(self):
+        car = self.car("C-1", "А123ВС77")
+        self.assertEqual(car.normalized_plate, "А123ВС77")
+        self.assertEqual(Car.objects.find_by_plate("a123 bc77").id, car.id)
+
+    def test_archived_car_found_only_with_archived(self):
+        car = self.car("C-1", "А123ВС77", is_active=False, status="АРХИВ")
+        self.assertIsNone(Car.objects.find_by_plate("А123ВС77"))
+        self.assertEqual(Car.objects.find_by_plate("А123ВС77", with_archived=True).id, car.id)
+
+    def test_duplicate_active_plate_saved_without_normalized_plate(self):
+        self.car("C-1", "А123ВС77")
+        duplicate = self.car("C-2", "а 123 вс 77")
+        self.assertIsNone(duplicate.normalized_plate)
+
+        archived = self.car("C-3", "А123ВС77", is_active=False, status="АРХИВ")
+        self.assertEqual(archived.normalized_plate, "А123ВС77")
+        archived.restore_from_archive()
+        archived.refresh_from_db()
+        self.assertFalse(archived.is_archived)
+        self.assertIsNone(archived.normalized_plate)
+
+    def test_migration_keeps_duplicate_active_plates_active(self):
+        old = self.car("C-1", "А123ВС77")
+        new = self.car("C-2", "А123ВС77")
+        Car.objects.update(normalized_plate=None)
+        Car.objects.filter(id=new.id).update(updated_at=old.updated_at.replace(year=old.updated_at.year + 1))
+
+        with self.assertLogs("core.migrations", "WARNING"):
+            fill_normalized_plates(apps, None)
+        old.refresh_from_db()
+        new.refresh_from_db()
+        self.assertFalse(old.is_archived)
+        self.assertFalse(new.is_archived)
+        self.assertIsNone(old.normalized_plate)
+        self.assertEqual(new.normalized_plate, "А123ВС77")
+        self.assertEqual(Car.objects.find_by_plate("А123ВС77").id, new.id)
+
+    def test_plate_index_invalidated_after_commit(self):
+        cache.delete(VERSION_CACHE_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.car("C-1", "А123ВС77")
+            self.assertIsNone(cache.get(VERSION_CACHE_KEY))
+        self.assertEqual(cache.get(VERSION_CACHE_KEY), 1)
+
+    def test_car_report_shows_state_number_and_finds_archived(self):
+        car = self.car("C-1", "а123вс 77", is_active=False, status="АРХИВ")
+        # Без пула потоков бота: тестовая транзакция видна только в этом потоке
+        found, text = aggregate_car_text.func("А123ВС77", "all")
+        self.assertEqual(found.id, car.id)
+        self.assertIn("а123вс 77", text)
+
+
+class CarArchiveTests(TestCase):
+    """Массовая архивация возвращает только изменённые автомобили"""
+
+    def test_archive_returns_only_changed_codes(self):
+        active = Car.objects.create(code="C-1", state_number="А111АА77", model="Lada")
+        # Архивирован после того, как попал в список
+        archived = Car.objects.create(code="C-2", state_number="В222ВВ77", model="Lada", is_active=False, status="АРХИВ")
+        rows = [(active.id, active.code), (archived.id, archived.code)]
+        self.assertEqual(Car.objects.all()._set_archived_by_ids(rows, archived=True, batch_size=1), ["C-1"])
+        self.assertEqual(Car.objects.archive_missing([]), [])
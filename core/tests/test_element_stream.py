@@ -0,0 +1,90 @@
+import asyncio
+import json
+from unittest import mock
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from core.clients.element_car_client import ElementCarClient
+from core.utils.json_stream import JsonArrayStreamParser
+
+
+def feed_chunks(text, size):
+    parser = JsonArrayStreamParser()
+    objects = []
+    for pos in range(0, len(text), size):
+        objects.extend(parser.feed(text[pos:pos + size]))
+    return parser, objects
+
+
+class JsonArrayStreamParserTests(SimpleTestCase):
+    """Потоковый разбор выгрузки 1С"""
+
+    CARS = [
+        {"Code": "C-1", "Number": "А111АА77", "Model": "Lada \"Vesta\" {sport}"},
+        {"Code": "C-2", "Number": "В222ВВ77", "Model": "Путь C:\\1С\\[архив]"},
+        {"Code": "C-3", "Number": "Е333ЕЕ77", "Model": "Kia", "Tags": [{"a": 1}, []]},
+    ]
+
+    def test_objects_split_at_every_position(self):
+        text = json.dumps(self.CARS, ensure_ascii=False)
+        for size in range(1, 12):
+            parser, objects = feed_chunks(text, size)
+            self.assertEqual(objects, self.CARS, f"кусок {size}")
+            self.assertTrue(parser.complete)
+            self.assertEqual(parser.errors, 0)
+
+    def test_truncated_stream_keeps_received_objects(self):
+        text = json.dumps(self.CARS, ensure_ascii=False)
+        cut = text.index('"C-3"')
+        parser, objects = feed_chunks(text[:cut], 7)
+        self.assertEqual(objects, self.CARS[:2])
+        self.assertFalse(parser.complete)
+
+    def test_broken_object_is_counted_and_skipped(self):
+        parser, objects = feed_chunks('[{"Code": "C-1"}, {"Code": C-2}, {"Code": "C-3"}]', 5)
+        self.assertEqual(objects, [{"Code": "C-1"}, {"Code": "C-3"}])
+        self.assertEqual(parser.errors, 1)
+        self.assertTrue(parser.complete)
+
+    def test_empty_array(self):
+        parser, objects = feed_chunks("  []  ", 1)
+        self.assertEqual(objects, [])
+        self.assertTrue(parser.complete)
+
+
+class ElementStreamTimeoutTests(SimpleTestCase):
+    """Медленная обработка пакетов не обрывает выгрузку по таймауту"""
+
+    def test_slow_consumer_gets_whole_export(self):
+        cars = [{"Code": f"C-{i}", "Number": f"А{i:03}АА77"} for i in range(5)]
+
+        async def handler(request):
+            # 1С отдаёт выгрузку без долгих пауз, но дольше таймаута чтения целиком
+            response = web.StreamResponse(headers={"Content-Type": "application/json"})
+            await response.prepare(request)
+            for i, car in enumerate(cars):
+                await response.write((", " if i else "[").encode() + json.dumps(car).encode())
+                await asyncio.sleep(0.1)
+            await response.write(b"]")
+            return response
+
+        async def read_slowly():
+            app = web.Application()
+            app.router.add_get("/Car/v1/Get", handler)
+            async with TestServer(app) as server:
+                client = ElementCarClient(base_url=str(server.make_url("")).rstrip("/"), user="api", password="secret")
+                async with client:
+                    outcome, received = {}, []
+                    async for car in client._read_cars({}, outcome):
+                        # Запись пакета в БД между чтениями
+                        await asyncio.sleep(0.05)
+                        received.append(car)
+                    return outcome, received
+
+        with mock.patch("core.clients.element_car_client.REQUEST_TIMEOUT", 0.3):
+            outcome, received = async_to_sync(read_slowly)()
+        self.assertTrue(outcome["complete"])
+        self.assertEqual(received, cars)
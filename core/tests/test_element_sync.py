@@ -0,0 +1,110 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from core.clients.element_car_client import SHARD_INNS_CACHE_KEY, ElementCarClient
+from core.models import Car
+
+
+def element_car(code, number, inn):
+    return {"Code": code, "Number": number, "Model": "Lada", "INN": inn, "YearCar": "2020", "Activity": True}
+
+
+def element_api(**overrides):
+    return override_settings(ELEMENT_API={**settings.ELEMENT_API, "SHARD_RETRIES": 0, **overrides})
+
+
+class ElementShardedSyncTests(TestCase):
+    """Выгрузка из 1С по ИНН: список ИНН и архивация отсутствующих автомобилей"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = ElementCarClient(base_url="http://1c.test", user="api", password="secret")
+        # ИНН -> автомобили в 1С; None — выгрузка ИНН не удаётся
+        self.shards = {}
+        self.requests = []
+        patcher = mock.patch.object(ElementCarClient, "_read_cars", self.read_cars)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def read_cars(self, params, outcome, conditional=False):
+        self.requests.append(params)
+        outcome["not_modified"] = False
+        outcome["complete"] = False
+        if "inn" in params:
+            cars = self.shards.get(params["inn"], [])
+        elif None in self.shards.values():
+            cars = None
+        else:
+            cars = [car for shard in self.shards.values() for car in shard]
+        if cars is None:
+            return
+        for car in cars:
+            yield car
+        outcome["complete"] = True
+
+    def sync(self):
+        return async_to_sync(self.client.sync_with_database)(sharded=True)
+
+    @element_api()
+    def test_full_fetch_when_inn_list_is_unknown(self):
+        self.shards = {"111": [element_car("C-1", "А111АА77", "111")]}
+        self.sync()
+        self.assertEqual(self.requests, [{}])
+        self.assertEqual(cache.get(SHARD_INNS_CACHE_KEY), ["111"])
+
+        self.requests.clear()
+        self.sync()
+        self.assertEqual(self.requests, [{"inn": "111"}])
+
+    @element_api()
+    def test_car_moved_to_new_inn_is_not_archived_until_full_fetch(self):
+        self.shards = {"111": [element_car("C-1", "А111АА77", "111")]}
+        self.sync()
+
+        # Автомобиль перешёл к владельцу, которого нет в списке ИНН
+        self.shards = {"111": [], "222": [element_car("C-1", "А111АА77", "222")]}
+        self.sync()
+        self.assertFalse(Car.objects.get(code="C-1").is_archived)
+
+        cache.delete(SHARD_INNS_CACHE_KEY)
+        self.sync()
+        car = Car.objects.get(code="C-1")
+        self.assertFalse(car.is_archived)
+        self.assertEqual(car.owner_inn, "222")
+        self.assertEqual(cache.get(SHARD_INNS_CACHE_KEY), ["222"])
+
+    @element_api(SHARD_INNS=["111", "222"])
+    def test_failed_shard_blocks_archiving(self):
+        self.shards = {
+            "111": [element_car("C-1", "А111АА77", "111")],
+            "222": [element_car("C-2", "В222ВВ77", "222")],
+        }
+        self.sync()
+
+        self.shards = {"111": [], "222": None}
+        self.sync()
+        self.assertFalse(Car.objects.archived().exists())
+
+    @element_api(SHARD_INNS=["111", "222"])
+    def test_missing_car_archived_when_all_shards_fetched(self):
+        self.shards = {
+            "111": [element_car("C-1", "А111АА77", "111")],
+            "222": [element_car("C-2", "В222ВВ77", "222")],
+        }
+        self.sync()
+
+        self.shards = {"111": [], "222": [element_car("C-2", "В222ВВ77", "222")]}
+        self.sync()
+        self.assertEqual(list(Car.objects.archived().values_list("code", flat=True)), ["C-1"])
+
+    @element_api()
+    def test_incomplete_full_fetch_keeps_cars_and_inn_list(self):
+        Car.objects.create(code="C-1", state_number="А111АА77", model="Lada", owner_inn="111")
+        self.shards = {"111": [], "222": None}
+        self.sync()
+        self.assertFalse(Car.objects.get(code="C-1").is_archived)
+        self.assertIsNone(cache.get(SHARD_INNS_CACHE_KEY))
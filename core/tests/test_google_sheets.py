@@ -0,0 +1,133 @@
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.admin.sites import site
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from core.clients.google_sheets_client import InMemoryGoogleSheetsClient
+from core.models import (
+    Car, FuelRecord, GoogleSheetsOutbox, GoogleSheetsRowMapping, GoogleSheetsSyncState, User,
+)
+from core.services.google_sheets_outbox_service import GoogleSheetsOutboxWorker
+from core.services.google_sheets_service import FuelRecordGoogleSheetsService
+from core.services.scheduler_service import LOCK_CACHE_KEY_PREFIX
+
+
+class GoogleSheetsSyncTests(TestCase):
+    """Выгрузка заправок: очередь (outbox) и инкрементальная синхронизация"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.car = Car.objects.create(code="C-1", state_number="А123ВС77", model="Lada")
+        cls.employee = User.objects.create_user("fueler")
+
+    def setUp(self):
+        self.client = InMemoryGoogleSheetsClient()
+        self.service = FuelRecordGoogleSheetsService(client=self.client)
+        self.worker = GoogleSheetsOutboxWorker(client=self.client)
+        GoogleSheetsSyncState.objects.create(
+            sheet_name=self.service.sheet_name, last_updated_at=timezone.now()
+        )
+
+    @property
+    def sheet(self):
+        return self.client.sheets.get(self.service.sheet_name, [])
+
+    def refuel(self, liters="10"):
+        return FuelRecord.objects.create_fuel_record(car=self.car, employee=self.employee, liters=liters)
+
+    def test_new_record_is_queued_and_appended_once(self):
+        record = self.refuel()
+        self.assertTrue(GoogleSheetsOutbox.objects.pending().filter(fuel_record=record).exists())
+
+        self.assertEqual(async_to_sync(self.worker.drain)(), 1)
+        self.assertEqual(len(self.sheet), 1)
+        mapping = GoogleSheetsRowMapping.objects.get(fuel_record=record)
+        self.assertEqual(mapping.row_number, 1)
+        self.assertEqual(async_to_sync(self.worker.drain)(), 0)
+        self.assertEqual(len(self.sheet), 1)
+
+    def test_dry_run_leaves_queue_untouched(self):
+        record = self.refuel()
+        dry_client = InMemoryGoogleSheetsClient()
+        worker = GoogleSheetsOutboxWorker(client=dry_client, batch_size=1, dry_run=True)
+
+        self.assertEqual(async_to_sync(worker.drain)(), 1)
+        self.assertEqual(len(dry_client.sheets[self.service.sheet_name]), 1)
+        self.assertEqual(GoogleSheetsOutbox.objects.get(fuel_record=record).status, GoogleSheetsOutbox.Status.PENDING)
+        self.assertFalse(GoogleSheetsRowMapping.objects.exists())
+
+    def test_selected_records_go_through_queue(self):
+        synced = self.refuel()
+        async_to_sync(self.worker.drain)()
+        synced.liters = Decimal("42.5")
+        synced.save()
+        new = self.refuel()
+
+        result = async_to_sync(self.service.sync_multiple_records)([synced.id, new.id])
+        self.assertEqual(result["synced_count"], 2)
+        self.assertEqual(len(self.sheet), 1)
+        self.assertEqual(self.sheet[0][3], 42.5)
+        self.assertTrue(GoogleSheetsOutbox.objects.pending().filter(fuel_record=new).exists())
+
+    def test_sheet_lock_shared_with_worker(self):
+        self.refuel()
+        lock_key = f"{LOCK_CACHE_KEY_PREFIX}{self.service.lock_name}"
+        cache.add(lock_key, "other-host")
+        self.addCleanup(cache.delete, lock_key)
+
+        self.assertEqual(async_to_sync(self.worker.drain)(), 0)
+        with mock.patch("core.services.google_sheets_service.SHEET_LOCK_WAIT", 0):
+            self.assertFalse(async_to_sync(self.service.sync_all_records)()["success"])
+        self.assertEqual(self.sheet, [])
+
+        cache.delete(lock_key)
+        self.assertTrue(async_to_sync(self.service.sync_all_records)()["success"])
+        # Запись из очереди уже в листе после полной синхронизации
+        self.assertEqual(async_to_sync(self.worker.drain)(), 1)
+        self.assertEqual(len(self.sheet), 2)
+
+    def test_incremental_does_not_append_new_records(self):
+        self.refuel()
+        result = async_to_sync(self.service.sync_incremental)()
+        self.assertTrue(result["success"])
+        self.assertEqual(self.sheet, [])
+
+        async_to_sync(self.worker.drain)()
+        async_to_sync(self.service.sync_incremental)()
+        self.assertEqual(len(self.sheet), 1)
+
+    def test_incremental_requeues_record_missing_from_sheet_and_queue(self):
+        record = self.refuel()
+        GoogleSheetsOutbox.objects.all().delete()
+
+        async_to_sync(self.service.sync_incremental)()
+        self.assertEqual(GoogleSheetsOutbox.objects.pending().get().fuel_record_id, record.id)
+        # Повторный запуск не ставит запись в очередь второй раз
+        async_to_sync(self.service.sync_incremental)()
+        self.assertEqual(GoogleSheetsOutbox.objects.count(), 1)
+
+    def test_incremental_updates_changed_row_in_place(self):
+        record = self.refuel()
+        async_to_sync(self.worker.drain)()
+        async_to_sync(self.service.sync_incremental)()
+
+        record.liters = Decimal("42.5")
+        record.save()
+        async_to_sync(self.service.sync_incremental)()
+        self.assertEqual(len(self.sheet), 1)
+        self.assertEqual(self.sheet[0][3], 42.5)
+
+    def test_admin_bulk_approval_reaches_sheet(self):
+        record = self.refuel()
+        async_to_sync(self.worker.drain)()
+        async_to_sync(self.service.sync_incremental)()
+
+        model_admin = site._registry[FuelRecord]
+        with mock.patch.object(model_admin, "message_user"):
+            model_admin.approve_selected(RequestFactory().get("/"), FuelRecord.objects.filter(pk=record.pk))
+        async_to_sync(self.service.sync_incremental)()
+        self.assertEqual(self.sheet[0][9], "Да")
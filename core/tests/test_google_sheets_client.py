@@ -0,0 +1,121 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from gspread.exceptions import APIError
+from requests.exceptions import ConnectionError
+
+from core.clients.google_sheets_client import GoogleSheetsClient
+from core.clients.google_sheets_limiter import (
+    QUOTA_CACHE_KEY_PREFIX, GoogleSheetsError, GoogleSheetsQuotaError, SheetsRateLimiter,
+)
+
+
+class SlowSpreadsheet:
+    def __init__(self):
+        self.opened = []
+
+    def worksheet(self, name):
+        self.opened.append(name)
+        time.sleep(0.2)
+        return f"worksheet:{name}"
+
+
+@override_settings(GSHEET={**settings.GSHEET, "CREDENTIALS_JSON_PATH": "creds.json", "SPREADSHEET_ID": "sheet-id"})
+class GoogleSheetsHandleTests(SimpleTestCase):
+    """Дескрипторы листов: открываются один раз и не блокируют другие листы"""
+
+    def setUp(self):
+        self.spreadsheet = SlowSpreadsheet()
+        self.client = GoogleSheetsClient()
+        self.client._client = mock.Mock(open_by_key=mock.Mock(return_value=self.spreadsheet))
+        patcher = mock.patch("core.clients.google_sheets_client.sheets_limiter")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sheet_opened_once_for_concurrent_callers(self):
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(self.client._get_worksheet, ["Заправки"] * 4))
+        self.assertEqual(results, ["worksheet:Заправки"] * 4)
+        self.assertEqual(self.spreadsheet.opened, ["Заправки"])
+        self.client._client.open_by_key.assert_called_once()
+
+    def test_cached_sheet_not_blocked_by_opening_another(self):
+        self.client._get_worksheet("Заправки")
+        opening = threading.Thread(target=self.client._get_worksheet, args=("Отчёт",))
+        opening.start()
+        time.sleep(0.05)
+        started = time.monotonic()
+        self.assertEqual(self.client._get_worksheet("Заправки"), "worksheet:Заправки")
+        self.assertLess(time.monotonic() - started, 0.1)
+        opening.join()
+
+    def test_reset_during_opening_does_not_cache_stale_handle(self):
+        opening = threading.Thread(target=self.client._get_worksheet, args=("Заправки",))
+        opening.start()
+        time.sleep(0.05)
+        self.client._reset()
+        opening.join()
+        self.assertEqual(self.client._worksheets, {})
+
+
+def api_error(code):
+    return APIError(mock.Mock(json=mock.Mock(return_value={"error": {"code": code, "message": "error"}})))
+
+
+@override_settings(GSHEET={**settings.GSHEET, "CREDENTIALS_JSON_PATH": "creds.json", "SPREADSHEET_ID": "sheet-id"})
+class GoogleSheetsAppendRetryTests(SimpleTestCase):
+    """Добавление строк повторяется, только если Google его не выполнил"""
+
+    def setUp(self):
+        self.client = GoogleSheetsClient()
+        self.worksheet = mock.Mock()
+        self.client._get_worksheet = mock.Mock(return_value=self.worksheet)
+        for target in ("sheets_limiter", "backoff_delay"):
+            patcher = mock.patch(f"core.clients.google_sheets_client.{target}", return_value=0)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def append(self):
+        return self.client._call("Заправки", lambda ws: ws.append_rows([[1]]), idempotent=False)
+
+    def test_append_retried_after_quota_error(self):
+        self.worksheet.append_rows.side_effect = [api_error(429), {"updates": {}}]
+        self.assertEqual(self.append(), {"updates": {}})
+        self.assertEqual(self.worksheet.append_rows.call_count, 2)
+
+    def test_append_not_retried_when_result_is_unknown(self):
+        for error in (api_error(503), ConnectionError("reset")):
+            self.worksheet.append_rows.reset_mock()
+            self.worksheet.append_rows.side_effect = error
+            with self.assertRaises(GoogleSheetsError):
+                self.append()
+            self.worksheet.append_rows.assert_called_once()
+
+
+class SheetsRateLimiterTests(SimpleTestCase):
+    """Квота Google Sheets: общий счётчик минуты и токены процесса"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_local_token_kept_when_shared_quota_is_used_up(self):
+        limiter = SheetsRateLimiter(per_minute=2, max_wait=0)
+        with mock.patch("core.clients.google_sheets_limiter.time.time", return_value=600.0):
+            cache.set(f"{QUOTA_CACHE_KEY_PREFIX}10", 2)
+            with self.assertRaises(GoogleSheetsQuotaError):
+                limiter.acquire()
+        self.assertEqual(limiter._tokens, 2)
+        self.assertEqual(limiter.get_stats(), {"requests": 1, "queued": 1, "dropped": 1})
+
+    def test_stats_counted_from_many_threads(self):
+        limiter = SheetsRateLimiter(per_minute=60, max_wait=0)
+        with ThreadPoolExecutor(8) as pool:
+            for _ in range(8):
+                pool.submit(lambda: [limiter.count("requests") for _ in range(5000)])
+        self.assertEqual(limiter.get_stats(), {"requests": 40000})
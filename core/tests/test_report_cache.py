@@ -0,0 +1,78 @@
+from datetime import date
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from core.models import Car, FuelRecord, User
+from core.refuel_bot.handlers.report import aggregate_car_text
+from core.refuel_bot.utils.report_cache import ReportCache, period_dependencies
+
+
+class ReportCacheTests(SimpleTestCase):
+    """Кэш отчётов: инвалидация по поколениям"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.report_cache = ReportCache()
+        self.compute = mock.Mock(side_effect=range(100))
+
+    def get(self, dependencies, params="p"):
+        return self.report_cache.get_or_compute("period", params, "all", dependencies, self.compute)
+
+    def test_bump_invalidates_only_dependent_reports(self):
+        day = [("day", "2026-01-05")]
+        car = [("car", 1)]
+        self.assertEqual(self.get(day), 0)
+        self.assertEqual(self.get(car, "c"), 1)
+        self.assertEqual(self.get(day), 0)
+
+        self.report_cache.bump([("day", "2026-01-05")])
+        self.assertEqual(self.get(day), 2)
+        self.assertEqual(self.get(car, "c"), 1)
+
+        self.report_cache.bump_all()
+        self.assertEqual(self.get(car, "c"), 3)
+
+    def test_result_computed_during_bump_is_not_served(self):
+        dependencies = [("car", 1)]
+
+        def compute():
+            # Заправка записана, пока отчёт считался по старым данным
+            self.report_cache.bump(dependencies)
+            return "stale"
+
+        self.assertEqual(self.report_cache.get_or_compute("car", 1, "all", dependencies, compute), "stale")
+        self.assertEqual(self.get(dependencies, 1), 0)
+
+    def test_long_period_depends_on_months(self):
+        self.assertEqual(len(period_dependencies(date(2026, 1, 1), date(2026, 1, 31))), 31)
+        self.assertEqual(
+            period_dependencies(date(2026, 1, 15), date(2026, 4, 2)),
+            [("month", "2026-01"), ("month", "2026-02"), ("month", "2026-03"), ("month", "2026-04")],
+        )
+
+
+class ReportCacheInvalidationTests(TestCase):
+    """Новая заправка сбрасывает закэшированный отчёт по автомобилю"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.car = Car.objects.create(code="C-1", state_number="А123ВС77", model="Lada")
+        self.employee = User.objects.create_user("fueler")
+
+    def refuel(self, liters):
+        with self.captureOnCommitCallbacks(execute=True):
+            FuelRecord.objects.create_fuel_record(car=self.car, employee=self.employee, liters=liters)
+
+    def car_report(self):
+        # Без пула потоков бота: тестовая транзакция видна только в этом потоке
+        return aggregate_car_text.func("А123ВС77", "all")[1]
+
+    def test_refuel_invalidates_car_report(self):
+        self.refuel("10")
+        self.assertIn("всего 10.0 л, записей: 1", self.car_report())
+        self.refuel("5")
+        self.assertIn("всего 15.0 л, записей: 2", self.car_report())
@@ -0,0 +1,52 @@
+import io
+from datetime import date
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+from openpyxl import load_workbook
+
+from core.refuel_bot.utils.report_files import _get_render_executor
+from core.refuel_bot.utils.report_render import COLUMNS, render_report_files
+
+
+def report_columns(days):
+    rows = {
+        "day": days,
+        "car__state_number": ["А123ВС77"] * len(days),
+        "car__model": ["Lada"] * len(days),
+        "employee__last_name": ["Иванов"] * len(days),
+        "employee__first_name": ["Иван"] * len(days),
+        "employee__username": ["ivanov"] * len(days),
+        "historical_region__name": ["Москва"] * len(days),
+        "zone__name": ["Центр"] * len(days),
+        "fuel_type": ["AI95"] * len(days),
+        "source": ["CARD"] * len(days),
+        "total_liters": [Decimal("10.50")] * len(days),
+        "record_count": [1] * len(days),
+    }
+    assert set(rows) == {field for _, field, _ in COLUMNS}
+    return rows
+
+
+class ReportFilesTests(SimpleTestCase):
+    """Файлы отчёта собираются в отдельном процессе без Django"""
+
+    labels = {"тип топлива": {"AI95": "АИ-95"}, "способ заправки": {"CARD": "Карта"}}
+
+    def test_xlsx_rendered_in_process_pool(self):
+        future = _get_render_executor().submit(
+            render_report_files, report_columns([date(2026, 1, 5)]), "xlsx", "заправки", 100, self.labels
+        )
+        [(filename, content)] = future.result(timeout=60)
+        self.assertEqual(filename, "заправки.xlsx")
+        sheet = load_workbook(io.BytesIO(content))["Заправки"]
+        row = [cell.value for cell in sheet[2]]
+        self.assertEqual(row[1], "А123ВС77")
+        self.assertEqual(row[8], "АИ-95")
+        self.assertEqual(row[10], 10.5)
+
+    def test_large_report_split_by_month(self):
+        days = [date(2026, 1, 5), date(2026, 1, 6), date(2026, 2, 1)]
+        files = render_report_files(report_columns(days), "csv", "r", 2, self.labels)
+        self.assertEqual([name for name, _ in files], ["r_2026-01.csv", "r_2026-02.csv"])
+        self.assertTrue(files[0][1].startswith(b"\xef\xbb\xbf"))
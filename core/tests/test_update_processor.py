@@ -0,0 +1,40 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from telegram import Chat, Message, Update, User
+
+from core.refuel_bot.utils.update_processor import PerUserUpdateProcessor
+
+
+def message(update_id, user_id):
+    user = User(user_id, f"user{user_id}", False)
+    return Update(update_id, message=Message(update_id, None, Chat(user_id, Chat.PRIVATE), from_user=user, text="1"))
+
+
+class PerUserUpdateProcessorTests(SimpleTestCase):
+    """Обновления одного пользователя идут по очереди и не занимают чужие слоты"""
+
+    def test_burst_of_one_user_does_not_block_others(self):
+        processor = PerUserUpdateProcessor(2)
+        release = asyncio.Event()
+        handled = []
+
+        async def handle(update_id, slow):
+            if slow:
+                await release.wait()
+            handled.append(update_id)
+
+        async def run():
+            burst = [
+                asyncio.create_task(processor.process_update(message(update_id, 1), handle(update_id, True)))
+                for update_id in range(3)
+            ]
+            await asyncio.sleep(0)
+            await asyncio.wait_for(processor.process_update(message(10, 2), handle(10, False)), timeout=1)
+            release.set()
+            await asyncio.gather(*burst)
+
+        async_to_sync(run)()
+        self.assertEqual(handled, [10, 0, 1, 2])
+        self.assertEqual(processor._locks, {})
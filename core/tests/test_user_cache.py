@@ -0,0 +1,72 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from core.refuel_bot.utils.user_cache import BotUserCache
+
+
+def user_data(telegram_id, username):
+    return {
+        "id": 1, "telegram_id": telegram_id, "username": username, "first_name": "", "last_name": "",
+        "is_active": True, "zone_id": None, "zone_name": None, "region_id": None, "region_name": None,
+        "group_names": ["Заправщик"],
+    }
+
+
+class BotUserCacheTests(SimpleTestCase):
+    """Кэш пользователей бота: инвалидация во время загрузки"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user_cache = BotUserCache()
+        self.usernames = ["old", "new"]
+        patcher = mock.patch("core.refuel_bot.utils.user_cache._fetch_user_data_sync", side_effect=self.fetch)
+        self.fetch_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch(self, telegram_id):
+        username = self.usernames.pop(0)
+        if username == "old":
+            # Пользователя изменили, пока загрузка читала старые данные
+            self.user_cache.invalidate(telegram_id)
+        return user_data(telegram_id, username)
+
+    def get(self, telegram_id):
+        return async_to_sync(self.user_cache.get)(telegram_id)
+
+    def test_stale_load_does_not_survive_invalidation(self):
+        self.assertEqual(self.get(42).username, "old")
+        self.assertEqual(self.get(42).username, "new")
+        self.assertEqual(self.fetch_mock.call_count, 2)
+        # Свежие данные закэшированы на обоих уровнях
+        self.assertEqual(self.get(42).username, "new")
+        self.user_cache.clear_local()
+        self.assertEqual(self.get(42).username, "new")
+        self.assertEqual(self.fetch_mock.call_count, 2)
+        self.assertEqual(self.user_cache.get_stats()["stale_loads"], 1)
+
+    def test_stats_counted_from_many_threads(self):
+        with ThreadPoolExecutor(8) as pool:
+            for _ in range(8):
+                pool.submit(lambda: [self.user_cache.count("redis_hits") for _ in range(5000)])
+        self.assertEqual(self.user_cache.get_stats()["redis_hits"], 40000)
+
+    def test_listener_subscribes_outside_event_loop(self):
+        threads = []
+        client = mock.Mock()
+        client.pubsub.return_value.subscribe.side_effect = lambda **kwargs: threads.append(threading.current_thread())
+
+        async def start():
+            threads.append(threading.current_thread())
+            await self.user_cache.start_listener()
+
+        with mock.patch("core.refuel_bot.utils.user_cache.redis_client", client):
+            async_to_sync(start)()
+        loop_thread, subscribe_thread = threads
+        self.assertIsNot(subscribe_thread, loop_thread)
+        client.pubsub.return_value.run_in_thread.assert_called_once()
@@ -0,0 +1,55 @@
+import json
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.refuel_bot.webhook import SECRET_HEADER, InflightUpdateQueue, telegram_webhook
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1, "date": 0, "text": "/start",
+        "chat": {"id": 1, "type": "private"},
+        "from": {"id": 1, "is_bot": False, "first_name": "Иван"},
+    },
+}
+
+
+@override_settings(TELEGRAM={**settings.TELEGRAM, "WEBHOOK_SECRET": "secret", "WEBHOOK_MAX_INFLIGHT": 1})
+class TelegramWebhookTests(SimpleTestCase):
+    """Приём обновлений вебхуком: проверка секрета, переполнение очереди, разбор"""
+
+    def setUp(self):
+        self.app = SimpleNamespace(update_queue=InflightUpdateQueue(), bot=None)
+        patcher = mock.patch("core.refuel_bot.webhook._application", self.app)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, body=UPDATE, secret="secret"):
+        data = body if isinstance(body, str) else json.dumps(body)
+        request = RequestFactory().post(
+            "/telegram/webhook/", data, content_type="application/json", **{SECRET_HEADER: secret}
+        )
+        return async_to_sync(telegram_webhook)(request)
+
+    def test_invalid_secret_is_forbidden(self):
+        self.assertEqual(self.post(secret="wrong").status_code, 403)
+        self.assertEqual(self.app.update_queue.inflight, 0)
+
+    def test_full_queue_rejected(self):
+        self.app.update_queue.put_nowait(object())
+        self.assertEqual(self.post().status_code, 503)
+        self.assertEqual(self.app.update_queue.qsize(), 1)
+
+    def test_malformed_payload(self):
+        self.assertEqual(self.post("{not json").status_code, 400)
+        self.assertEqual(self.app.update_queue.inflight, 0)
+
+    def test_update_enqueued(self):
+        self.assertEqual(self.post().status_code, 200)
+        update = self.app.update_queue.get_nowait()
+        self.assertEqual((update.update_id, update.effective_user.id), (1, 1))
+        self.assertEqual(self.app.update_queue.inflight, 1)
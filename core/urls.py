@@ -1,6 +1,7 @@
 # web/urls.py
 from django.urls import path
 from core import views
+from core.refuel_bot.webhook import telegram_webhook
 
 
 urlpatterns = [
@@ -8,4 +9,5 @@ urlpatterns = [
     path("fuel/add/", views.add_fuel_record, name="add_fuel"),
     path("fuel/reports/", views.reports, name="reports"),
     path("health/", views.health_check, name="health"),
+    path("telegram/webhook/", telegram_webhook, name="telegram_webhook"),
 ]
@@ -0,0 +1,82 @@
+import json
+import logging
+import re
+
+
+logger = logging.getLogger(__name__)
+
+# Символы, которые меняют состояние разбора; остальной текст пропускается целиком
+_TOKEN_RE = re.compile(r'[\[\]{}"\\]')
+
+
+class JsonArrayStreamParser:
+    """
+    Инкрементальный разбор JSON-массива объектов: [{...}, {...}, ...].
+
+    Текст подаётся кусками через feed(), который возвращает объекты,
+    закончившиеся в этом куске. В памяти держится только незавершённый объект.
+    Если поток оборвался, все полностью полученные объекты уже отданы,
+    а complete остаётся False.
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._in_string = False
+        # Предыдущий кусок закончился обратной косой чертой внутри строки
+        self._escape_pending = False
+        self._parts: list[str] = []
+        self.started = False
+        self.complete = False
+        self.errors = 0
+
+    def feed(self, text: str) -> list[dict]:
+        objects = []
+        # Объект, начатый в предыдущем куске, продолжается с начала текущего
+        start = 0 if self._parts else None
+        escaped_pos = 0 if self._escape_pending else -1
+        self._escape_pending = False
+
+        for match in _TOKEN_RE.finditer(text):
+            pos = match.start()
+            char = text[pos]
+
+            if self._in_string:
+                if pos == escaped_pos:
+                    continue
+                if char == "\\":
+                    escaped_pos = pos + 1
+                    if escaped_pos == len(text):
+                        self._escape_pending = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "[{":
+                self._depth += 1
+                if self._depth == 1:
+                    self.started = True
+                elif self._depth == 2 and char == "{":
+                    start = pos
+            elif char in "]}":
+                self._depth -= 1
+                if self._depth == 1 and char == "}" and start is not None:
+                    self._parts.append(text[start:pos + 1])
+                    self._emit(objects)
+                    start = None
+                elif self._depth == 0 and self.started:
+                    self.complete = True
+
+        if start is not None:
+            self._parts.append(text[start:])
+        return objects
+
+    def _emit(self, objects: list) -> None:
+        raw = "".join(self._parts)
+        self._parts = []
+        try:
+            objects.append(json.loads(raw))
+        except ValueError:
+            self.errors += 1
+            logger.warning("Пропущен некорректный JSON-объект: %s", raw[:200])
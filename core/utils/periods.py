@@ -0,0 +1,67 @@
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple, Optional
+
+from django.utils import timezone
+
+
+class Period(NamedTuple):
+    """
+    Полуоткрытый интервал [start, end) в aware-datetime.
+
+    Фильтр filled_at__gte/__lt сравнивает столбец напрямую и использует индексы
+    (filled_at), (car, filled_at); filled_at__date приводил бы каждую строку
+    к дате в локальной зоне.
+    """
+
+    start: datetime
+    end: datetime
+
+    def as_filter(self, field: str = "filled_at") -> dict:
+        return {f"{field}__gte": self.start, f"{field}__lt": self.end}
+
+    @property
+    def first_day(self) -> date:
+        return timezone.localtime(self.start).date()
+
+    @property
+    def last_day(self) -> date:
+        """Последний календарный день периода (включительно)"""
+        return timezone.localtime(self.end - timedelta(microseconds=1)).date()
+
+
+def start_of_day(day: date, tz=None) -> datetime:
+    """Начало календарного дня в зоне tz (по умолчанию — текущая зона Django)"""
+    return timezone.make_aware(datetime.combine(day, time.min), tz or timezone.get_current_timezone())
+
+
+def date_range(start_date: date, end_date: date, tz=None) -> Period:
+    """Календарные дни start_date..end_date включительно"""
+    return Period(start_of_day(start_date, tz), start_of_day(end_date + timedelta(days=1), tz))
+
+
+def day_range(day: date, tz=None) -> Period:
+    return date_range(day, day, tz)
+
+
+# Периоды меню отчётов бота: (первый день, последний день) относительно сегодня
+CALENDAR_PERIODS = {
+    "today": lambda today: (today, today),
+    "yesterday": lambda today: (today - timedelta(days=1), today - timedelta(days=1)),
+    "week": lambda today: (today - timedelta(days=7), today),
+    "month": lambda today: (today - timedelta(days=30), today),
+    "this_week": lambda today: (today - timedelta(days=today.weekday()), today),
+    "this_month": lambda today: (today.replace(day=1), today),
+}
+
+
+def resolve_period(name: str, today: Optional[date] = None, tz=None) -> Period:
+    """
+    Именованный календарный период (today, yesterday, week, month,
+    this_week, this_month) в интервал [start, end); «сегодня» — в локальной зоне.
+    """
+    try:
+        bounds = CALENDAR_PERIODS[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный период: {name}")
+    today = today or timezone.localdate(timezone=tz)
+    return date_range(*bounds(today), tz=tz)
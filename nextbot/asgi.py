@@ -14,11 +14,22 @@ django_application = get_asgi_application()
 # Создаем ASGI приложение с поддержкой lifespan
 async def application(scope, receive, send):
     if scope["type"] == "lifespan":
+        from core.refuel_bot.webhook import is_webhook_mode, start_webhook_app, stop_webhook_app
+
         while True:
             message = await receive()
             if message["type"] == "lifespan.startup":
+                # В режиме webhook каждый воркер держит свой Application
+                if is_webhook_mode():
+                    try:
+                        await start_webhook_app()
+                    except Exception as e:
+                        await send({"type": "lifespan.startup.failed", "message": str(e)})
+                        return
                 await send({"type": "lifespan.startup.complete"})
             elif message["type"] == "lifespan.shutdown":
+                if is_webhook_mode():
+                    await stop_webhook_app()
                 await send({"type": "lifespan.shutdown.complete"})
                 return
     else:
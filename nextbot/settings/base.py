@@ -99,22 +99,109 @@ MEDIA_ROOT = BASE_DIR / "media"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # === Integrations / Custom settings ===
-TELEGRAM = {"TOKEN": env.str("TELEGRAM_BOT_TOKEN", "")} # TELEGRAM['TOKEN']
+# Пул потоков бота для запросов к БД; столько же обновлений по умолчанию
+# обрабатывается параллельно: больше — лишние ждут потока БД, меньше — пул простаивает
+TELEGRAM_DB_POOL_SIZE = env.int("TELEGRAM_DB_POOL_SIZE", 8)
+
+TELEGRAM = {
+    "TOKEN": env.str("TELEGRAM_BOT_TOKEN", ""),  # TELEGRAM['TOKEN']
+    # Режим получения обновлений: polling (runbot) или webhook (ASGI-приложение)
+    "MODE": env.str("TELEGRAM_MODE", "polling"),
+    "WEBHOOK_URL": env.str("TELEGRAM_WEBHOOK_URL", ""),
+    "WEBHOOK_SECRET": env.str("TELEGRAM_WEBHOOK_SECRET", ""),
+    # Максимум принятых, но ещё не обработанных обновлений на воркер
+    "WEBHOOK_MAX_INFLIGHT": env.int("TELEGRAM_WEBHOOK_MAX_INFLIGHT", 100),
+    # Сколько обновлений Application обрабатывает параллельно (сообщения одного
+    # пользователя — всегда по очереди); по умолчанию равно DB_POOL_SIZE
+    "CONCURRENT_UPDATES": env.int("TELEGRAM_CONCURRENT_UPDATES", TELEGRAM_DB_POOL_SIZE),
+    # Размер пула потоков для запросов бота к БД
+    "DB_POOL_SIZE": TELEGRAM_DB_POOL_SIZE,
+    # Загружать активных пользователей в кэш при старте бота
+    "WARM_UP_USERS": env.bool("TELEGRAM_WARM_UP_USERS", True),
+    # Лимиты исходящих запросов: на бота в секунду, на личный чат в секунду, на группу в минуту
+    "RATE_LIMIT_GLOBAL_PER_SECOND": env.float("TELEGRAM_RATE_LIMIT_GLOBAL_PER_SECOND", 25),
+    "RATE_LIMIT_PRIVATE_PER_SECOND": env.float("TELEGRAM_RATE_LIMIT_PRIVATE_PER_SECOND", 1),
+    "RATE_LIMIT_GROUP_PER_MINUTE": env.float("TELEGRAM_RATE_LIMIT_GROUP_PER_MINUTE", 20),
+    # Сколько раз повторять запрос после RetryAfter (flood control)
+    "RATE_LIMIT_MAX_RETRIES": env.int("TELEGRAM_RATE_LIMIT_MAX_RETRIES", 3),
+    # Сколько секунд копить удаления сообщений чата перед одним запросом deleteMessages
+    "DELETE_COALESCE_DELAY": env.float("TELEGRAM_DELETE_COALESCE_DELAY", 0.3),
+    # Redis для состояния диалогов и user_data (пусто — только в памяти процесса)
+    "PERSISTENCE_URL": env.str("TELEGRAM_PERSISTENCE_URL", ""),
+    # Как часто сохранять изменения в Redis, секунд
+    "PERSISTENCE_UPDATE_INTERVAL": env.float("TELEGRAM_PERSISTENCE_UPDATE_INTERVAL", 1),
+    # Сколько дней хранить состояние неактивных пользователей и чатов
+    "PERSISTENCE_TTL_DAYS": env.int("TELEGRAM_PERSISTENCE_TTL_DAYS", 30),
+    # Сколько секунд хранить готовые отчёты (изменённые заправками сбрасываются сразу)
+    "REPORT_CACHE_TTL": env.int("TELEGRAM_REPORT_CACHE_TTL", 600),
+    # Отчёты файлом: больше строк — по файлу на месяц; сколько процессов собирают файлы
+    "REPORT_FILE_MAX_ROWS": env.int("TELEGRAM_REPORT_FILE_MAX_ROWS", 50000),
+    "REPORT_RENDER_WORKERS": env.int("TELEGRAM_REPORT_RENDER_WORKERS", 2),
+}
 
 ELEMENT_API = {
     "URL": env.str("ELEMENT_API_URL", ""),
     "USER": env.str("ELEMENT_API_USER", ""),
     "PASSWORD": env.str("ELEMENT_API_PASSWORD", ""),
+    # Размер пакета записи автомобилей в БД при синхронизации
+    "SYNC_BATCH_SIZE": env.int("ELEMENT_API_SYNC_BATCH_SIZE", 500),
+    # Сколько ждать очередной кусок ответа выгрузки, секунд (общего лимита на выгрузку нет)
+    "REQUEST_TIMEOUT": env.int("ELEMENT_API_REQUEST_TIMEOUT", 60),
+    # Выгрузка по ИНН владельцев параллельными запросами вместо одного запроса на весь парк
+    "SHARDED": env.bool("ELEMENT_API_SHARDED", False),
+    # ИНН для выгрузки по частям; пусто — ИНН владельцев из последней полной выгрузки 1С
+    "SHARD_INNS": env.list("ELEMENT_API_SHARD_INNS", default=[]),
+    # Раз в сколько часов выгружать весь парк одним запросом, чтобы обновить список ИНН
+    "SHARD_FULL_SYNC_HOURS": env.int("ELEMENT_API_SHARD_FULL_SYNC_HOURS", 24),
+    # Сколько ИНН выгружать одновременно и сколько раз повторять неудачную выгрузку ИНН
+    "SHARD_CONCURRENCY": env.int("ELEMENT_API_SHARD_CONCURRENCY", 4),
+    "SHARD_RETRIES": env.int("ELEMENT_API_SHARD_RETRIES", 3),
+    # Пул соединений: максимум одновременных соединений, кэш DNS и keep-alive, секунд
+    "CONNECTION_LIMIT": env.int("ELEMENT_API_CONNECTION_LIMIT", 8),
+    "DNS_CACHE_TTL": env.int("ELEMENT_API_DNS_CACHE_TTL", 300),
+    "KEEPALIVE_TIMEOUT": env.int("ELEMENT_API_KEEPALIVE_TIMEOUT", 60),
+    # Таймаут проверки доступности и установки соединения, секунд
+    "PROBE_TIMEOUT": env.int("ELEMENT_API_PROBE_TIMEOUT", 15),
+    # Сколько часов доверять ETag / Last-Modified прошлой выгрузки; 0 — без условных запросов
+    "CONDITIONAL_TTL_HOURS": env.int("ELEMENT_API_CONDITIONAL_TTL_HOURS", 6),
 }
 
 GSHEET = {
     "CREDENTIALS_JSON_PATH": BASE_DIR / env.str("GSHEET_CREDENTIALS_JSON_PATH", ""),
     "SPREADSHEET_ID": env.str("GSHEET_SPREADSHEET_ID", ""),
     "SHEET_NAME": env.str("GSHEET_SHEET_NAME", ""),
+    # Время жизни открытых дескрипторов таблицы и листов, секунд
+    "HANDLE_TTL": env.int("GSHEET_HANDLE_TTL", 600),
+    # Потоков для блокирующих вызовов gspread
+    "EXECUTOR_WORKERS": env.int("GSHEET_EXECUTOR_WORKERS", 4),
+    # Квота API на запись/чтение в минуту (общая для всех процессов) и допустимое ожидание, секунд
+    "RATE_LIMIT_PER_MINUTE": env.int("GSHEET_RATE_LIMIT_PER_MINUTE", 60),
+    "RATE_LIMIT_MAX_WAIT": env.int("GSHEET_RATE_LIMIT_MAX_WAIT", 120),
+    # Повторов при 429/5xx и сетевых ошибках
+    "MAX_RETRIES": env.int("GSHEET_MAX_RETRIES", 5),
+    # Сколько строк отправлять в одном запросе append
+    "APPEND_CHUNK_SIZE": env.int("GSHEET_APPEND_CHUNK_SIZE", 5000),
+    # Очередь выгрузки заправок: размер пакета и максимальная задержка, секунд
+    "OUTBOX_BATCH_SIZE": env.int("GSHEET_OUTBOX_BATCH_SIZE", 100),
+    "OUTBOX_FLUSH_INTERVAL": env.int("GSHEET_OUTBOX_FLUSH_INTERVAL", 10),
+    "OUTBOX_MAX_ATTEMPTS": env.int("GSHEET_OUTBOX_MAX_ATTEMPTS", 10),
 }
 
 SYNC_CARS_SCHEDULE_MINUTES = env.int("SYNC_CARS_SCHEDULE_MINUTES", 30)
 
+# Планировщик фоновых задач (manage.py runscheduler); интервал 0 отключает задачу
+SCHEDULER = {
+    # Случайная добавка к интервалу, секунд
+    "JITTER_SECONDS": env.int("SCHEDULER_JITTER_SECONDS", 60),
+    # Предельная длительность одного запуска задачи, минут
+    "JOB_TIMEOUT_MINUTES": env.int("SCHEDULER_JOB_TIMEOUT_MINUTES", 30),
+    "GSHEETS_SYNC_MINUTES": env.int("SCHEDULER_GSHEETS_SYNC_MINUTES", 15),
+    "ARCHIVE_REGIONS_HOURS": env.int("SCHEDULER_ARCHIVE_REGIONS_HOURS", 24),
+    "REPORTS_HOURS": env.int("SCHEDULER_REPORTS_HOURS", 24),
+    # Сколько дней хранить историю запусков
+    "HISTORY_DAYS": env.int("SCHEDULER_HISTORY_DAYS", 30),
+}
+
 # UX
 CSRF_FAILURE_VIEW = "django.views.csrf.csrf_failure"
 LOGIN_URL = "/admin/login/?next=/admin/"